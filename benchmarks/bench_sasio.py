@@ -0,0 +1,75 @@
+"""Benchmark the `sasio` profile parsers.
+
+Usage:
+
+    python benchmarks/bench_sasio.py [n_points] [n_files]
+"""
+from __future__ import print_function, division
+
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from sasdash.saslib import sasio  # noqa: E402
+from sasdash.saslib.measurement import SASM  # noqa: E402
+from sasdash.cache import ProfileDiskCache  # noqa: E402
+
+
+def write_primus_dat(filepath, n_points):
+    q = np.linspace(1e-3, 0.5, n_points)
+    intensity = np.exp(-q**2 * 30.0**2 / 3.0) * 1e3
+    err = np.sqrt(intensity) * 1e-2
+    with open(filepath, 'w') as fstream:
+        fstream.write('### HEADER:\n\n{"filename": "%s"}\n\n### DATA:\n\n'
+                      % os.path.basename(filepath))
+        fstream.write('         Q               I(Q)            Error\n')
+        for row in zip(q, intensity, err):
+            fstream.write('%.8E   %.8E   %.8E\n' % row)
+
+
+def load_dat_lines(filepath):
+    return SASM(*sasio._load_dat_lines(filepath),
+                filename=os.path.basename(filepath))
+
+
+def bench(label, func, files, repeat=5):
+    best = min(timeit.repeat(lambda: [func(f) for f in files],
+                             number=1, repeat=repeat))
+    print('{:<24s} {:10.3f} ms'.format(label, best * 1e3))
+    return best
+
+
+def main(n_points=1000, n_files=100):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        files = [os.path.join(tmp_dir, 'frame_%05d.dat' % i)
+                 for i in range(n_files)]
+        for f in files:
+            write_primus_dat(f, n_points)
+
+        for f in files:
+            fast, slow = sasio.load_dat(f), load_dat_lines(f)
+            assert np.array_equal(np.asarray(fast), np.asarray(slow))
+
+        print('{} files x {} points'.format(n_files, n_points))
+        t_slow = bench('regex line parser', load_dat_lines, files)
+        t_fast = bench('load_dat', sasio.load_dat, files)
+        print('speedup: {:.1f}x'.format(t_slow / t_fast))
+
+        disk_cache = ProfileDiskCache(os.path.join(tmp_dir, 'cache'))
+        disk_cache.load(files, sasio.load_dat)  # fill the cache
+        t_cache = bench('ProfileDiskCache.load',
+                        lambda f: disk_cache.load(f, sasio.load_dat), [files])
+        print('speedup: {:.1f}x'.format(t_slow / t_cache))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -5,6 +5,7 @@ REGISTERED_LAYOUTS = {
     'cormap_heatmap': 'CorMap Heatmap',
     'series_analysis': 'Series Analysis',
     'guinier': 'Guinier Fitting',
+    'guinier_series': 'Rg/I0 Time Course',
     'gnom': 'Pair-wise Distribution (GNOM)',
     'mw': 'Molecular Weight',
     'colormap': 'Colormap and Crossline',
@@ -27,6 +28,7 @@ LAYOUT_OPTIONS = (
     ('cormap_heatmap', 'CorMap Heatmap'),
     ('series_analysis', 'Series Analysis'),
     ('guinier', 'Guinier Analysis'),
+    ('guinier_series', 'Rg/I0 Time Course'),
     ('gnom', 'GNOM'),
     ('mw', 'Molecular Weight (NotImplemented)'),
     ('colormap', 'Colormap and Crossline'),
@@ -39,9 +41,10 @@ LYAOUT_SEQUENCE = {
     'cormap': 4,
     'cormap_heatmap': 5,
     'guinier': 6,
-    'gnom': 7,
-    'colormap': 8,
-    'mw': 9,
+    'guinier_series': 7,
+    'gnom': 8,
+    'colormap': 9,
+    'mw': 10,
 }
 
 sort_seq = lambda key: LYAOUT_SEQUENCE.get(key, 1000)
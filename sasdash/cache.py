@@ -0,0 +1,685 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import hashlib
+import time
+import shutil
+import tempfile
+import glob
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, image stores are not shared there
+    fcntl = None
+
+import numpy as np
+
+from sasdash.saslib.measurement import SASM, IFTM, ProfileSeries
+
+DEFAULT_CACHE_DIRNAME = '.sasdash_cache'
+DEFAULT_MEMORY_BUDGET = 1 << 30  # 1 GiB
+
+_MEASUREMENT_FIELDS = {
+    'SASM': ('q', 'i', 'err'),
+    'IFTM': ('r', 'pr', 'error', 'q_orig', 'i_orig', 'err_orig', 'i_fit',
+             'q_extrap', 'i_extrap'),
+}
+
+
+def _to_measurement(kind, arrays, parameters):
+    if kind == 'SASM':
+        return SASM(*arrays, **parameters)
+    elif kind == 'IFTM':
+        return IFTM(*arrays, params=parameters)
+    else:
+        raise ValueError('Unknown measurement type: %s' % kind)
+
+
+def _atomic_write(filepath, write_func):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath))
+    try:
+        with os.fdopen(fd, 'wb') as fstream:
+            write_func(fstream)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def cache_path(file_dir, cache_dir=None, suffix=''):
+    """Return base path of cache files for a data directory.
+
+    Parameters
+    ----------
+    file_dir : str
+        data directory, e.g. `run/Subtracted`
+    cache_dir : str, optional
+        central cache directory (the default is None, which is a
+        `.sasdash_cache` directory next to `file_dir`, e.g.
+        `run/.sasdash_cache/Subtracted`)
+    suffix : str, optional
+        appended to the base name, e.g. to tell apart different caches of
+        the same directory.
+    """
+    file_dir = os.path.abspath(file_dir)
+    if cache_dir is None:
+        parent_dir, subdir = os.path.split(file_dir)
+        return os.path.join(parent_dir, DEFAULT_CACHE_DIRNAME, subdir + suffix)
+    else:
+        digest = hashlib.sha1(file_dir.encode('utf-8')).hexdigest()
+        return os.path.join(cache_dir, digest[:16] + suffix)
+
+
+def file_state(filepath):
+    """Return (mtime_ns, size) of file used to detect changes."""
+    stat = os.stat(filepath)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _PackWriter(object):
+    """Write a pack of `ProfileDiskCache` one measurement at a time, holding
+    only the index in memory. Arrays are spooled to a temporary file and
+    copied into the `.npy` file on `close`.
+
+    Every write creates a new `.npy` file with a unique name, which the
+    `.json` index refers to. The index is replaced only after its data is
+    complete, so a crash in between leaves the old index pointing to the
+    old data instead of an index with offsets into other data."""
+
+    def __init__(self, pack_path):
+        self._pack_path = pack_path
+        self._entries = {}
+        self._offset = 0
+        self._spool = tempfile.TemporaryFile()
+
+    def add(self, filepath, state, measurement):
+        kind = type(measurement).__name__
+        slices = []
+        for field in _MEASUREMENT_FIELDS[kind]:
+            array = np.asarray(getattr(measurement, field), dtype='<f8')
+            self._spool.write(array.tobytes())
+            slices.append((self._offset, self._offset + array.size))
+            self._offset += array.size
+        self._entries[filepath] = {
+            'mtime': state[0],
+            'size': state[1],
+            'kind': kind,
+            'slices': slices,
+            'parameters': measurement.parameters,
+        }
+
+    def _write_data(self, fstream):
+        np.lib.format.write_array_header_1_0(fstream, {
+            'descr': '<f8',
+            'fortran_order': False,
+            'shape': (self._offset,),
+        })
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, fstream)
+
+    def close(self):
+        data_file = '{}.{}.npy'.format(
+            os.path.basename(self._pack_path), uuid.uuid4().hex)
+        data_path = os.path.join(os.path.dirname(self._pack_path), data_file)
+        index = {
+            'data_file': data_file,
+            'size': self._offset,
+            'entries': self._entries,
+        }
+        try:
+            os.makedirs(os.path.dirname(self._pack_path), exist_ok=True)
+            _atomic_write(data_path, self._write_data)
+            _atomic_write(self._pack_path + '.json',
+                          lambda f: f.write(json.dumps(index).encode('utf-8')))
+        except (OSError, TypeError):
+            # read-only data directory or unserializable parameters, the
+            # cache is only an accelerator.
+            if os.path.exists(data_path):
+                os.remove(data_path)
+        else:
+            # data of previous (or interrupted) writes
+            stale = glob.glob(glob.escape(self._pack_path) + '.*.npy')
+            stale.append(self._pack_path + '.npy')  # older format
+            for each in stale:
+                if each != data_path and os.path.exists(each):
+                    try:
+                        os.remove(each)
+                    except OSError:
+                        pass
+        finally:
+            self.abort()
+
+    def abort(self):
+        self._spool.close()
+
+
+class ProfileDiskCache(object):
+    """Persistent cache of parsed SASM/IFTM.
+
+    All measurements parsed from one directory (e.g. `run/Subtracted`) are
+    packed into a single pack: one flat float64 `.npy` array, which is
+    memory-mapped on load, and one `.json` index holding (path, mtime, size),
+    parameters and array offsets of every file, and the name of the `.npy`
+    file. Files whose mtime or size
+    changed are reparsed and the pack is rewritten.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        directory for all packs. (the default is None, which stores packs
+        in a `.sasdash_cache` directory next to the source directory, e.g.
+        `run/.sasdash_cache/Subtracted.json`)
+    """
+
+    def __init__(self, cache_dir=None):
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def _read_pack(self, pack_path):
+        try:
+            with open(pack_path + '.json', 'r') as fstream:
+                index = json.load(fstream)
+            data = np.load(
+                os.path.join(os.path.dirname(pack_path), index['data_file']),
+                mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return {}, None
+        if data.size != index.get('size'):  # corrupted data
+            return {}, None
+        return index['entries'], data
+
+    def _write_pack(self, pack_path, items):
+        writer = _PackWriter(pack_path)
+        for filepath, state, measurement in items:
+            writer.add(filepath, state, measurement)
+        writer.close()
+
+    def load(self, filepaths, loader):
+        """Return measurements of `filepaths`, parsing by `loader` only the
+        files which are not cached yet or changed since.
+
+        Parameters
+        ----------
+        filepaths : list of str
+            path of source files, usually all files of one directory
+        loader : callable
+            parser for source file, e.g. `sasio.load_dat`
+
+        Returns
+        -------
+        list :
+            measurements in the same order of `filepaths`
+        """
+        groups = OrderedDict()
+        for filepath in filepaths:
+            filepath = os.path.abspath(filepath)
+            groups.setdefault(os.path.dirname(filepath), []).append(filepath)
+
+        measurements = {}
+        for file_dir, group in groups.items():
+            pack_path = cache_path(file_dir, self._cache_dir)
+            entries, data = self._read_pack(pack_path)
+            items = []
+            changed = set(entries) != set(group)
+            for filepath in group:
+                state = file_state(filepath)
+                entry = entries.get(filepath)
+                if entry and (entry['mtime'], entry['size']) == state:
+                    measurement = _to_measurement(
+                        entry['kind'],
+                        (data[start:stop] for start, stop in entry['slices']),
+                        entry['parameters'],
+                    )
+                else:
+                    measurement = loader(filepath)
+                    changed = True
+                measurements[filepath] = measurement
+                items.append((filepath, state, measurement))
+            if changed:
+                self._write_pack(pack_path, items)
+
+        return [measurements[os.path.abspath(f)] for f in filepaths]
+
+    def iter_load(self, filepaths, loader, chunk_size=256, start=0):
+        """Like `load`, but yield measurements in lists of at most
+        `chunk_size`, so that memory is bounded by one chunk instead of all
+        files. Changed files are parsed while iterating and packs are
+        rewritten once the iteration is exhausted. Measurements of the
+        first `start` files are not yielded, e.g. if they are known already.
+        """
+        filepaths = [os.path.abspath(f) for f in filepaths]
+        packs = {}
+        writers = {}
+        states = {}
+        for file_dir in OrderedDict.fromkeys(map(os.path.dirname, filepaths)):
+            pack_path = cache_path(file_dir, self._cache_dir)
+            packs[file_dir] = self._read_pack(pack_path)
+        for filepath in filepaths:
+            states[filepath] = file_state(filepath)
+        for file_dir, (entries, _) in packs.items():
+            group = [f for f in filepaths if os.path.dirname(f) == file_dir]
+            if set(entries) != set(group) or any(
+                    (entries[f]['mtime'], entries[f]['size']) != states[f]
+                    for f in group):
+                writers[file_dir] = _PackWriter(
+                    cache_path(file_dir, self._cache_dir))
+
+        try:
+            for begin in range(0, len(filepaths), chunk_size):
+                chunk = []
+                end = min(begin + chunk_size, len(filepaths))
+                for idx in range(begin, end):
+                    filepath = filepaths[idx]
+                    file_dir = os.path.dirname(filepath)
+                    if idx < start and file_dir not in writers:
+                        continue
+                    entries, data = packs[file_dir]
+                    entry = entries.get(filepath)
+                    state = states[filepath]
+                    if entry and (entry['mtime'], entry['size']) == state:
+                        arrays = (data[begin:end]
+                                  for begin, end in entry['slices'])
+                        measurement = _to_measurement(
+                            entry['kind'], arrays, entry['parameters'])
+                    else:
+                        measurement = loader(filepath)
+                    if file_dir in writers:
+                        writers[file_dir].add(filepath, state, measurement)
+                    if idx >= start:
+                        chunk.append(measurement)
+                if chunk:
+                    yield chunk
+        except GeneratorExit:
+            for writer in writers.values():
+                writer.abort()
+            raise
+        for writer in writers.values():
+            writer.close()
+
+
+class ImageStore(object):
+    """Memory-mapped store of processed 2D images of one run.
+
+    Images are decoded and processed once by `loader` and appended to a
+    float32 stack file (`<base>.<id>.images`). Following lookups return
+    read-only views of the memory-mapped stack. A `.json` index maps each
+    source file to its slot together with (mtime, size) of the file and
+    statistics of the image, which are served without touching pixels.
+
+    Where `fcntl` is available, the store can be shared by processes, e.g.
+    workers of a web server: slots are never overwritten, a new one is
+    allocated from the size of the stack file while holding an exclusive
+    lock on `<base>.lock`, and index updates are merged into the index on
+    disk under the same lock. A lookup missing a file reads the index
+    again if another process changed it. Otherwise the store is only safe
+    within one process.
+
+    Parameters
+    ----------
+    base_path : str
+        base path of store files, see `cache_path`
+    tag : str, optional
+        description of the processing (e.g. mask and center). The store is
+        reset when it differs from the stored one.
+    stats_func : callable, optional
+        return JSON serializable statistics of a processed image (the
+        default is None, which stores no statistics).
+    """
+
+    _INDEX_INTERVAL = 1.0  # seconds between index writes
+    _INDEX_FORMAT = 3
+
+    def __init__(self, base_path, tag='', stats_func=None):
+        self._base_path = base_path
+        self._tag = tag
+        self._stats_func = stats_func
+        self._lock = threading.RLock()
+        self._stack = None
+        self._index_mtime = None
+        self._index = self._read_index()
+        self._pending = {}  # entries not written to the index file yet
+        self._index_time = 0.0
+
+    @property
+    def tag(self):
+        return self._tag
+
+    def _stack_file(self, stack_id):
+        return '{}.{}.images'.format(self._base_path, stack_id)
+
+    @property
+    def _index_file(self):
+        return self._base_path + '.json'
+
+    @property
+    def _lock_file(self):
+        return self._base_path + '.lock'
+
+    def __len__(self):
+        return len(self._index['entries'])
+
+    def _empty_index(self):
+        return {
+            'format': self._INDEX_FORMAT,
+            'tag': self._tag,
+            'shape': None,
+            'stack_id': None,
+            'entries': {},
+        }
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold exclusive lock of the store files shared with other
+        processes."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self._lock_file), exist_ok=True)
+        with open(self._lock_file, 'a') as fstream:
+            fcntl.flock(fstream.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fstream.fileno(), fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            self._index_mtime = os.stat(self._index_file).st_mtime_ns
+            with open(self._index_file, 'r') as fstream:
+                index = json.load(fstream)
+        except (OSError, ValueError):
+            return self._empty_index()
+        if (index.get('format') != self._INDEX_FORMAT
+                or index.get('tag') != self._tag
+                or index.get('stack_id') is None
+                or not os.path.exists(self._stack_file(index['stack_id']))):
+            return self._empty_index()
+        return index
+
+    def _refresh(self):
+        """Read index again if another process changed it. Return whether
+        it changed."""
+        try:
+            mtime = os.stat(self._index_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._index_mtime:
+            return False
+        index = self._read_index()
+        if index['stack_id'] == self._index['stack_id']:
+            index['entries'].update(self._pending)
+        else:
+            # reset by another process, slots of pending entries are gone
+            self._pending = {}
+            self._stack = None
+        self._index = index
+        return True
+
+    def _write_index(self, force=False):
+        now = time.time()
+        if not self._pending or (
+                not force and now - self._index_time < self._INDEX_INTERVAL):
+            return
+        self._index_time = now
+        try:
+            with self._file_lock():
+                self._refresh()
+                self._save_index()
+        except OSError:
+            pass
+
+    def _save_index(self):
+        """Write index, the file lock must be held."""
+        _atomic_write(
+            self._index_file,
+            lambda f: f.write(json.dumps(self._index).encode('utf-8')))
+        self._index_mtime = os.stat(self._index_file).st_mtime_ns
+        self._pending = {}
+
+    def _reset(self, shape):
+        """Start a new stack for images of `shape`, the file lock must be
+        held."""
+        self._index = self._empty_index()
+        self._index['shape'] = list(shape)
+        self._index['stack_id'] = uuid.uuid4().hex
+        self._pending = {}
+        self._stack = None
+        stack_file = self._stack_file(self._index['stack_id'])
+        os.makedirs(os.path.dirname(stack_file), exist_ok=True)
+        open(stack_file, 'wb').close()
+        self._save_index()
+        # other processes keep their maps of removed stacks until they
+        # notice the new index
+        old_files = glob.glob(glob.escape(self._base_path) + '.*.images')
+        old_files.append(self._base_path + '.images')  # format 2
+        for old_file in old_files:
+            stack_id = old_file[len(self._base_path) + 1:-len('.images')]
+            if old_file != stack_file and len(stack_id) in (0, 32):
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+
+    def _view(self, slot):
+        if self._stack is None or slot >= self._stack.shape[0]:
+            # map stack again to see slots appended since
+            shape = tuple(self._index['shape'])
+            stack_file = self._stack_file(self._index['stack_id'])
+            n_slots = os.path.getsize(stack_file) // (int(np.prod(shape)) * 4)
+            if slot >= n_slots:
+                raise ValueError('Slot {} is not written'.format(slot))
+            self._stack = np.memmap(stack_file, dtype=np.float32, mode='r',
+                                    shape=(n_slots,) + shape)
+        image = np.asarray(self._stack[slot])
+        image.flags.writeable = False
+        return image
+
+    def get(self, filepath, loader):
+        """Return processed image of `filepath`, calling `loader(filepath)`
+        only if it is not stored yet or the file changed since."""
+        filepath = os.path.abspath(filepath)
+        state = file_state(filepath)
+        with self._lock:
+            entry = self._lookup(filepath, state)
+            if entry is None and self._refresh():
+                entry = self._lookup(filepath, state)
+            if entry is not None:
+                try:
+                    return self._view(entry['slot'])
+                except (OSError, ValueError):
+                    pass  # stack removed by another process, load again
+
+        image = np.asarray(loader(filepath), dtype=np.float32)
+        stats = self._stats_func(image) if self._stats_func else None
+        try:
+            return self._put(filepath, state, image, stats)
+        except OSError:  # e.g. read-only data directory
+            return image
+
+    def get_stats(self, filepath, loader):
+        """Return statistics of processed image of `filepath`, decoding the
+        image only if it is not stored yet or the file changed since."""
+        filepath = os.path.abspath(filepath)
+        with self._lock:
+            entry = self._lookup(filepath, file_state(filepath))
+            if entry is not None and entry['stats'] is not None:
+                return entry['stats']
+        image = self.get(filepath, loader)
+        with self._lock:
+            entry = self._index['entries'].get(filepath)
+            if entry is not None and entry['stats'] is not None:
+                return entry['stats']
+        # not stored, e.g. read-only data directory
+        return self._stats_func(image) if self._stats_func else None
+
+    def _lookup(self, filepath, state):
+        entry = self._index['entries'].get(filepath)
+        if entry is not None and (entry['mtime'], entry['size']) == state:
+            return entry
+        return None
+
+    def _put(self, filepath, state, image, stats):
+        with self._lock:
+            with self._file_lock():
+                self._refresh()
+                if (self._index['stack_id'] is None
+                        or self._index['shape'] != list(image.shape)):
+                    # first image or another geometry: start a new stack
+                    self._reset(image.shape)
+                # append, slots read by other processes are never reused
+                nbytes = image.nbytes
+                stack_file = self._stack_file(self._index['stack_id'])
+                with open(stack_file, 'r+b') as fstream:
+                    fstream.seek(0, os.SEEK_END)
+                    slot = -(-fstream.tell() // nbytes)
+                    fstream.seek(slot * nbytes)
+                    fstream.write(image.tobytes())
+            entry = {
+                'slot': slot,
+                'mtime': state[0],
+                'size': state[1],
+                'stats': stats,
+            }
+            self._index['entries'][filepath] = entry
+            self._pending[filepath] = entry
+            self._write_index(force=len(self._index['entries']) == 1)
+            image.flags.writeable = False
+            return image
+
+    def flush(self):
+        """Write index to disk."""
+        with self._lock:
+            self._write_index(force=True)
+
+
+def sizeof(obj, _seen=None):
+    """Estimate memory held by `obj` in bytes, counting numpy arrays of
+    measurements and containers recursively. Shared objects count once."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (SASM, IFTM, ProfileSeries)):
+        return sum(sizeof(val, _seen) for val in vars(obj).values())
+    elif isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            sizeof(key, _seen) + sizeof(val, _seen)
+            for key, val in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(each, _seen) for each in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        return sys.getsizeof(obj) + sizeof(vars(obj), _seen)
+    else:
+        return sys.getsizeof(obj)
+
+
+class MemoryCache(object):
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Every entry carries a `version` (e.g. mtime of the directory its data
+    comes from). Looking up an entry with another version drops it, so
+    stale data is never served.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        memory budget in bytes (the default is `DEFAULT_MEMORY_BUDGET`).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # key: (value, version, nbytes)
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self._counters = dict.fromkeys(
+            ('hits', 'misses', 'evictions', 'invalidations'), 0)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        """Return dict of hits, misses, evictions, invalidations, number of
+        entries, used and maximum bytes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(
+                entries=len(self._entries),
+                nbytes=self._nbytes,
+                max_bytes=self._max_bytes,
+            )
+        return stats
+
+    def _pop(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self._nbytes -= nbytes
+
+    def get(self, key, version=None, default=None):
+        with self._lock:
+            if key in self._entries:
+                value, curr_version, _ = self._entries[key]
+                if curr_version == version:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return value
+                self._pop(key)
+                self._counters['invalidations'] += 1
+            self._counters['misses'] += 1
+            return default
+
+    def put(self, key, value, version=None, nbytes=None):
+        """Store `value`, evicting least recently used entries until it
+        fits. Values larger than the whole budget are not stored."""
+        if nbytes is None:
+            nbytes = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            if nbytes > self._max_bytes:
+                return
+            while self._nbytes + nbytes > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+                self._counters['evictions'] += 1
+            self._entries[key] = (value, version, nbytes)
+            self._nbytes += nbytes
+
+    def get_or_compute(self, key, func, version=None):
+        """Return cached value of `key`, or call `func()` and cache it."""
+        sentinel = object()
+        value = self.get(key, version, sentinel)
+        if value is sentinel:
+            value = func()
+            self.put(key, value, version)
+        return value
+
+    def invalidate(self, match=None):
+        """Drop entries whose key satisfies `match(key)`, or all entries if
+        `match` is None."""
+        with self._lock:
+            keys = [key for key in self._entries if match is None or match(key)]
+            for key in keys:
+                self._pop(key)
+            self._counters['invalidations'] += len(keys)
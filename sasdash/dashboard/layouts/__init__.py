@@ -5,6 +5,7 @@ from .sasprofile import get_sasprofile
 from .cormap_heatmap import get_cormap_heatmap
 from .series_analysis import get_series_analysis
 from .guinier import get_guinier
+from .guinier_series import get_guinier_series
 from .colormap import get_colormap
 from .gnom import get_gnom
 
@@ -14,6 +15,7 @@ LAYOUT_OPTIONS = (
     ('cormap', 'CorMap Analysis'),
     ('series_analysis', 'Series Analysis'),
     ('guinier', 'Guinier Analysis'),
+    ('guinier_series', 'Rg/I0 Time Course'),
     ('gnom', 'GNOM'),
     ('colormap', 'Colormap and Crossline'),
 )
@@ -25,6 +27,7 @@ registered_layouts = {
     'cormap_heatmap': get_cormap_heatmap,
     'series_analysis': get_series_analysis,
     'guinier': get_guinier,
+    'guinier_series': get_guinier_series,
     'gnom': get_gnom,
     'colormap': get_colormap,
 }
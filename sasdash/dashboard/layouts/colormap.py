@@ -2,7 +2,7 @@ from __future__ import print_function, division
 
 import json
 
-from numpy import log10, asarray
+from numpy import log10, arange
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
@@ -10,8 +10,11 @@ from dash.dependencies import Input, Output, State
 from ..base import dash_app
 from .style import GRAPH_GLOBAL_CONFIG, INLINE_LABEL_STYLE
 from .style import YLABEL, LINE_STYLE
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 
 from sasdash.datamodel import warehouse
+from sasdash.saslib.measurement import DataNotCompatible
 
 _PLOT_OPTIONS = [{
     'label': 'Profile colormap',
@@ -71,21 +74,30 @@ def get_colormap():
     return _DEFAULT_LAYOUT
 
 
+def _message_figure(message):
+    return {
+        'data': [],
+        'layout': {'title': message},
+    }
+
+
 def _get_figure(info, plot_type, profile_type, q_idx):
     per_dict = {key: info[key] for key in ('project', 'experiment', 'run')}
-    sasm_list = warehouse.get_sasprofile(**per_dict)
+    kind = 'i' if profile_type == 'intensity' else 'err'
+    try:
+        series = warehouse.get_profile_series(**per_dict)
+    except DataNotCompatible:
+        return _message_figure('Profiles of run have different q vectors.')
+    if not series.n_frames:
+        return _message_figure('No profiles in run.')
 
-    # TODO: Fix length of q vector. Use new SASM method.
     if plot_type == 'colormap':
-        if profile_type == 'intensity':
-            image = [each.i[0:100] for each in sasm_list]
-        elif profile_type == 'error':
-            image = [each.err[0:100] for each in sasm_list]
-        curr_q = sasm_list[0].q[100]
+        image = getattr(series, kind)[:, 0:100]
+        curr_q = series.q[min(100, series.n_q - 1)]
         return {
             'data': [{
                 'type': 'heatmap',
-                'z': log10(asarray(image)),
+                'z': log10(image),
                 # 'zmin': colorbar_range[0],
                 # 'zmax': colorbar_range[1],
                 'colorscale': 'Jet',
@@ -99,11 +111,9 @@ def _get_figure(info, plot_type, profile_type, q_idx):
         }  # yapf: disable
 
     elif plot_type == 'crossline':
-        if profile_type == 'intensity':
-            profile = [sasm.i[q_idx] for sasm in sasm_list]
-        elif profile_type == 'error':
-            profile = [sasm.err[q_idx] for sasm in sasm_list]
-        curr_q = sasm_list[0].q[q_idx]
+        q_idx = min(q_idx, series.n_q - 1)
+        profile = series.crossline(q_idx, kind)
+        curr_q = series.q[q_idx]
 
         xaxis = dict(title='Index for sas profile')
         if profile_type == 'intensity':
@@ -113,7 +123,7 @@ def _get_figure(info, plot_type, profile_type, q_idx):
 
         return {
             'data': [{
-                'x': list(range(len(profile))),
+                'x': arange(profile.size),
                 'y': profile,
                 'type': 'line',
                 'line': LINE_STYLE,
@@ -138,11 +148,12 @@ def _get_figure(info, plot_type, profile_type, q_idx):
         Input('page-info', 'children'),
     ],
 )
+@memoize_figure
 def _update_graph(plot_type, profile_type, q_idx, info_json):
     assert info_json, 'False'
     assert info_json is not None, 'info json is None'
     info = json.loads(info_json)
-    return _get_figure(info, plot_type, profile_type, q_idx)
+    return encode_figure(_get_figure(info, plot_type, profile_type, q_idx))
 
 
 @dash_app.callback(
@@ -7,9 +7,12 @@ import dash_html_components as html
 from dash.dependencies import Input, Output
 
 from .style import GRAPH_GLOBAL_CONFIG, INLINE_LABEL_STYLE
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 from sasdash.datamodel import warehouse
+from sasdash.saslib.measurement import DataNotCompatible
 
 _PLOT_OPTIONS = [{
     'label': 'Adj Pr(>C) value',
@@ -48,6 +51,13 @@ _DEFAULT_FIGURE_LAYOUT = {
 }
 
 
+def _message_figure(message):
+    return {
+        'data': [],
+        'layout': {'title': message},
+    }
+
+
 @dash_app.callback(
     Output('cormap-heatmap-graph', 'figure'),
     [
@@ -55,10 +65,14 @@ _DEFAULT_FIGURE_LAYOUT = {
         Input('page-info', 'children'),
     ],
 )
+@memoize_figure
 def _update_figure(plot_type, info_json):
     info = json.loads(info_json)
     info_tuple = info['project'], info['experiment'], info['run']
-    cormap_heatmap = warehouse.get_cormap_heatmap(*info_tuple, plot_type)
+    try:
+        cormap_heatmap = warehouse.get_cormap_heatmap(*info_tuple, plot_type)
+    except DataNotCompatible:
+        return _message_figure('Profiles of run have different q vectors.')
 
     if plot_type == 'C':
         colorscale = 'Jet'
@@ -81,7 +95,7 @@ def _update_figure(plot_type, info_json):
                 'adj Pr(>C) == 1',
             ),
         )
-    return {
+    return encode_figure({
         'data': [{
             'type': 'heatmap',
             'z': cormap_heatmap,
@@ -89,4 +103,4 @@ def _update_figure(plot_type, info_json):
             'colorbar': colorbar,
         }],
         'layout': _DEFAULT_FIGURE_LAYOUT,
-    } # yapf: disable
+    }) # yapf: disable
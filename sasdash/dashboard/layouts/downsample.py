@@ -0,0 +1,218 @@
+from __future__ import print_function, division
+
+import numpy as np
+
+# maximum number of points sent to browser for one figure
+DEFAULT_POINT_BUDGET = 100000
+# maximum number of frames plotted as curves, the others are only
+# represented by the envelope band of all frames
+DEFAULT_MAX_FRAMES = 100
+
+
+def _window(x, xlim):
+    """Return [start, stop) indices of sorted `x` within `xlim`, including
+    one more point on each side to keep curves continuous."""
+    if not xlim:
+        return 0, x.size
+    start = max(np.searchsorted(x, xlim[0], side='left') - 1, 0)
+    stop = min(np.searchsorted(x, xlim[1], side='right') + 1, x.size)
+    return start, stop
+
+
+def _bucket_edges(x, start, stop, n_buckets, log_x=False):
+    """Split [start, stop) into at most `n_buckets` buckets of equal width
+    in x (or log10(x))."""
+    xs = x[start:stop]
+    if log_x and np.any(xs > 0):
+        # non-positive x are not shown on log axis
+        xs = np.log10(np.maximum(xs, np.min(xs[xs > 0])))
+    bounds = np.linspace(xs[0], xs[-1], n_buckets + 1)
+    edges = np.searchsorted(xs, bounds[1:-1]) + start
+    return np.unique(np.concatenate(([start], edges, [stop])))
+
+
+def minmax_indices(x, y, n_buckets, start=0, stop=None, log_x=False):
+    """Return indices of minimum and maximum of each bucket of x for every
+    row of `y`, which keeps peaks and spikes of curves.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        sorted 1D array shared by all rows of `y`
+    y : numpy.ndarray
+        2D array with one curve per row
+    n_buckets : int
+        number of buckets, at most 2 * `n_buckets` points are kept
+    start, stop : int, optional
+        only points in [start, stop) are considered.
+    log_x : bool, optional
+        buckets are of equal width in log10(x) for log axis.
+
+    Returns
+    -------
+    numpy.ndarray
+        2D array of sorted indices, one row per row of `y`.
+    """
+    stop = x.size if stop is None else stop
+    edges = _bucket_edges(x, start, stop, n_buckets, log_x)
+    # NaN (e.g. log of negative) is never picked unless the bucket is all NaN
+    y_low = np.where(np.isnan(y), np.inf, y)
+    y_high = np.where(np.isnan(y), -np.inf, y)
+    indices = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        indices.append(np.argmin(y_low[:, lo:hi], axis=1) + lo)
+        indices.append(np.argmax(y_high[:, lo:hi], axis=1) + lo)
+    return np.sort(np.stack(indices, axis=1), axis=1)
+
+
+def envelope_traces(envelope, n_frames, line_style=None):
+    """Return lower and upper traces of filled envelope band."""
+    x, lower, upper = envelope
+    line = dict(line_style or {}, color='rgba(150, 150, 150, 0.5)')
+    return [{
+        'x': x,
+        'y': lower,
+        'type': 'line',
+        'line': line,
+        'showlegend': False,
+        'hoverinfo': 'skip',
+        'name': 'lower envelope',
+    }, {
+        'x': x,
+        'y': upper,
+        'type': 'line',
+        'line': line,
+        'fill': 'tonexty',
+        'fillcolor': 'rgba(150, 150, 150, 0.3)',
+        'name': 'envelope of {} frames'.format(n_frames),
+    }]
+
+
+def _select_frames(n_frames, max_frames):
+    """Return indices of at most `max_frames` evenly spaced frames."""
+    if n_frames > max_frames:
+        return np.unique(
+            np.round(np.linspace(0, n_frames - 1, max_frames)).astype(int))
+    return np.arange(n_frames)
+
+
+def downsample_series(x, y, err=None, xlim=None, log_x=False,
+                      budget=DEFAULT_POINT_BUDGET,
+                      max_frames=DEFAULT_MAX_FRAMES):
+    """Reduce curves sharing `x` to a bounded number of points for plotting.
+
+    Only points within `xlim` are kept. If there are more than
+    `max_frames` curves, evenly spaced frames are kept and the envelope
+    (minimum and maximum over all frames) is returned as well. Each curve
+    is reduced by `minmax_indices` if needed, so that the figure has at
+    most about `budget` points. Zooming in (narrower `xlim`) thus shows
+    more detail, down to full resolution.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        sorted 1D array shared by all curves
+    y : numpy.ndarray
+        2D array with one curve per row
+    err : numpy.ndarray, optional
+        errors of `y`, reduced with the same indices.
+    xlim : tuple of float, optional
+        (min, max) of shown x range (the default is None, which is all x).
+    log_x : bool, optional
+        whether x axis is in log scale.
+    budget : int, optional
+        maximum number of points of figure.
+    max_frames : int, optional
+        maximum number of curves.
+
+    Returns
+    -------
+    dict
+        'frames' (indices of kept curves), 'x', 'y' and 'err' (lists of
+        arrays, one per kept curve, 'err' is None without `err`) and
+        'envelope' ((x, lower, upper) or None).
+    """
+    y = np.atleast_2d(y)
+    n_frames = y.shape[0]
+    if n_frames == 0 or x.size == 0:
+        # e.g. no frames reduced yet during beamtime
+        return {
+            'frames': np.arange(0),
+            'x': [],
+            'y': [],
+            'err': None if err is None else [],
+            'envelope': None,
+        }
+    start, stop = _window(x, xlim)
+
+    frames = _select_frames(n_frames, max_frames)
+    if n_frames > max_frames:
+        n_curves = frames.size + 2  # with lower and upper envelope
+    else:
+        n_curves = frames.size
+    per_curve = max(budget // n_curves, 4)
+
+    sub_y = y[frames]
+    sub_err = None if err is None else np.atleast_2d(err)[frames]
+    if stop - start <= per_curve:
+        indices = np.broadcast_to(np.arange(start, stop),
+                                  (frames.size, stop - start))
+    else:
+        indices = minmax_indices(x, sub_y, per_curve // 2, start, stop,
+                                 log_x)
+
+    envelope = None
+    if n_frames > max_frames:
+        # one point (lowest or highest of all frames) per bucket
+        edges = _bucket_edges(x, start, stop, per_curve, log_x)[:-1]
+        lower = np.fmin.reduce(y[:, start:stop], axis=0)
+        upper = np.fmax.reduce(y[:, start:stop], axis=0)
+        envelope = (
+            x[edges],
+            np.fmin.reduceat(lower, edges - start),
+            np.fmax.reduceat(upper, edges - start),
+        )
+
+    return {
+        'frames': frames,
+        'x': [x[idx] for idx in indices],
+        'y': list(np.take_along_axis(sub_y, indices, axis=1)),
+        'err': (None if sub_err is None else
+                list(np.take_along_axis(sub_err, indices, axis=1))),
+        'envelope': envelope,
+    }
+
+
+def downsample_curves(x_list, y_list, err_list=None, xlim=None, log_x=False,
+                      budget=DEFAULT_POINT_BUDGET,
+                      max_frames=DEFAULT_MAX_FRAMES):
+    """Like `downsample_series`, for curves which do not share x, e.g.
+    profiles on different q grids. Each curve is reduced on its own and no
+    envelope is returned.
+
+    Parameters
+    ----------
+    x_list, y_list : list of numpy.ndarray
+        x (sorted) and y of each curve
+    err_list : list of numpy.ndarray, optional
+        errors of each curve.
+    """
+    frames = _select_frames(len(y_list), max_frames)
+    per_curve = max(budget // max(frames.size, 1), 4)
+    reduced = {'frames': frames, 'x': [], 'y': [],
+               'err': None if err_list is None else [], 'envelope': None}
+    for frame in frames:
+        curve = downsample_series(
+            np.asarray(x_list[frame]),
+            np.asarray(y_list[frame]),
+            None if err_list is None else np.asarray(err_list[frame]),
+            xlim=xlim,
+            log_x=log_x,
+            budget=per_curve,
+            max_frames=1,
+        )
+        reduced['x'].append(curve['x'][0])
+        reduced['y'].append(curve['y'][0])
+        if err_list is not None:
+            reduced['err'].append(curve['err'][0])
+    return reduced
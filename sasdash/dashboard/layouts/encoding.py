@@ -0,0 +1,167 @@
+from __future__ import print_function, division
+
+import os
+import re
+import glob
+import base64
+from functools import lru_cache
+
+import numpy as np
+
+# Send large numeric arrays as base64 typed arrays instead of JSON lists of
+# decimals. Typed arrays are only decoded by plotly.js >= 2.28, so they are
+# used only if the plotly.js bundled with dash core components is recent
+# enough, see `binary_arrays_enabled`.
+BINARY_ARRAYS = False
+MIN_PLOTLYJS_VERSION = (2, 28)
+# smaller arrays are left as they are
+MIN_BINARY_SIZE = 64
+# quantize float heatmaps to 256 levels of the color range (lossy)
+QUANTIZE_HEATMAPS = False
+
+_INT_DTYPES = ('u1', 'i1', 'u2', 'i2', 'u4', 'i4')
+# e.g. plotly-1.58.4.min.js or header '* plotly.js v2.35.2'
+_PLOTLYJS_FILE_VERSION = re.compile(r'plotly-(\d+)\.(\d+)')
+_PLOTLYJS_HEADER_VERSION = re.compile(r'plotly\.js v(\d+)\.(\d+)')
+
+
+@lru_cache()
+def get_plotlyjs_version():
+    """Return (major, minor) version of plotly.js bundled with dash core
+    components, or None if it is not found."""
+    try:
+        import dash_core_components as dcc
+    except ImportError:
+        try:
+            from dash import dcc
+        except ImportError:
+            return None
+    pkg_dir = os.path.dirname(dcc.__file__)
+    for path in sorted(glob.glob(os.path.join(pkg_dir, 'plotly*.js'))):
+        match = _PLOTLYJS_FILE_VERSION.match(os.path.basename(path))
+        if match is None:
+            with open(path, 'rb') as fstream:
+                header = fstream.read(1024).decode('latin-1')
+            match = _PLOTLYJS_HEADER_VERSION.search(header)
+        if match is not None:
+            return int(match.group(1)), int(match.group(2))
+    return None
+
+
+def binary_arrays_enabled():
+    """Return whether figures are sent with typed arrays: `BINARY_ARRAYS`
+    is set and bundled plotly.js is at least `MIN_PLOTLYJS_VERSION`."""
+    if not BINARY_ARRAYS:
+        return False
+    version = get_plotlyjs_version()
+    return version is not None and version >= MIN_PLOTLYJS_VERSION
+
+
+def _smallest_dtype(array):
+    """Return smallest typed array dtype for `array` without loss: an
+    integer type if all values are integers, otherwise float32."""
+    if array.dtype.kind in 'iub' or (
+            array.dtype.kind == 'f' and array.size
+            and np.all(np.isfinite(array))
+            and np.array_equal(array, np.round(array))):
+        low, high = array.min(), array.max()
+        for dtype in _INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return dtype
+    return 'f4'
+
+
+def encode_array(array, dtype=None):
+    """Return plotly typed array spec of numeric `array`.
+
+    Parameters
+    ----------
+    array : array_like
+        numeric array of any dimension
+    dtype : str, optional
+        typed array dtype, e.g. 'f4' or 'u1' (the default is None, which
+        is the smallest dtype representing values without loss, float32
+        for non-integer values).
+
+    Returns
+    -------
+    dict
+        {'dtype', 'bdata', 'shape'} understood by plotly.js.
+    """
+    array = np.asarray(array)
+    if dtype is None:
+        dtype = _smallest_dtype(array)
+    data = np.ascontiguousarray(array, dtype='<' + dtype)
+    return {
+        'dtype': dtype,
+        'bdata': base64.b64encode(data.tobytes()).decode('ascii'),
+        'shape': ','.join(map(str, array.shape)),
+    }
+
+
+def quantize_heatmap(trace, levels=256):
+    """Quantize 'z' of a heatmap trace to uint8 within its color range
+    ('zmin', 'zmax', or range of finite values), and label the colorbar
+    with the original values."""
+    z = np.asarray(trace['z'], dtype=float)
+    finite = z[np.isfinite(z)]
+    if not finite.size:
+        return trace
+    zmin = trace.get('zmin', finite.min())
+    zmax = trace.get('zmax', finite.max())
+    if zmax <= zmin:
+        return trace
+    scale = (levels - 1) / (zmax - zmin)
+    quantized = np.round((np.clip(np.nan_to_num(z, nan=zmin), zmin, zmax)
+                          - zmin) * scale).astype(np.uint8)
+    tickvals = np.linspace(0, levels - 1, 6)
+    colorbar = dict(trace.get('colorbar') or {})
+    colorbar.setdefault('tickmode', 'array')
+    colorbar.setdefault('tickvals', list(tickvals))
+    colorbar.setdefault(
+        'ticktext', ['{:.4g}'.format(zmin + val / scale) for val in tickvals])
+    trace = dict(trace, z=quantized, zmin=0, zmax=levels - 1,
+                 colorbar=colorbar)
+    return trace
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'iufb' and value.size >= MIN_BINARY_SIZE:
+            return encode_array(value)
+        return value
+    elif isinstance(value, dict):
+        return {key: _encode(val) for key, val in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [_encode(each) for each in value]
+    return value
+
+
+def encode_figure(figure, quantize=None):
+    """Return copy of figure (dict or plotly Figure) whose numpy arrays
+    are replaced by typed arrays, see `encode_array`, if
+    `binary_arrays_enabled`. Otherwise the figure is returned as is and
+    arrays are sent as JSON lists. All layouts pass their figures through
+    it before returning them to Dash.
+
+    Parameters
+    ----------
+    figure : dict or plotly.graph_objs.Figure
+    quantize : bool, optional
+        quantize heatmaps by `quantize_heatmap` (the default is None, which
+        is `QUANTIZE_HEATMAPS`).
+    """
+    if hasattr(figure, 'to_plotly_json'):
+        figure = figure.to_plotly_json()
+    if not binary_arrays_enabled():
+        return figure
+    quantize = QUANTIZE_HEATMAPS if quantize is None else quantize
+    data = []
+    for trace in figure.get('data', ()):
+        if (quantize and isinstance(trace, dict)
+                and trace.get('type') == 'heatmap' and 'z' in trace
+                and np.asarray(trace['z']).dtype.kind == 'f'):
+            trace = quantize_heatmap(trace)
+        data.append(_encode(trace))
+    return dict(figure, data=data)
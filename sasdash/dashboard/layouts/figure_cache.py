@@ -0,0 +1,69 @@
+from __future__ import print_function, division
+
+import json
+import functools
+
+from sasdash.cache import MemoryCache
+from sasdash.datamodel import warehouse
+
+# memory budget of cached figures in bytes
+DEFAULT_FIGURE_BUDGET = 256 << 20  # 256 MiB
+
+_figure_cache = MemoryCache(DEFAULT_FIGURE_BUDGET)
+
+
+def memoize_figure(func):
+    """Cache figures returned by a layout callback.
+
+    The callback must take the JSON of page info (project, experiment and
+    run) as its last argument. Figures are keyed by callback, run and the
+    other arguments (control values), and are recomputed once data of the
+    run changes, see `Experiment.get_run_version`. Subtracted files
+    rewritten in place leave the mtime of their directory unchanged, so
+    their states (see `Experiment.get_file_states`), which incremental
+    stores are keyed by, are part of the version as well. Apply it below
+    `dash_app.callback`.
+    """
+    name = '{}.{}'.format(func.__module__, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        info = json.loads(args[-1])
+        run_key = info['project'], info['experiment'], info['run']
+        controls = json.dumps(args[:-1], sort_keys=True, default=str)
+        return _figure_cache.get_or_compute(
+            (name, run_key, controls),
+            lambda: func(*args),
+            version=(
+                warehouse.get_run_version(*run_key),
+                tuple(warehouse.get_file_states(
+                    info['project'], info['experiment'], info['run'],
+                    'subtracted_files')),
+            ),
+        )
+
+    return wrapper
+
+
+def get_figure_cache_stats():
+    """Return hits, misses, evictions, invalidations, number of entries,
+    used and maximum bytes of figure cache."""
+    return _figure_cache.stats()
+
+
+def clear_figure_cache(project=None, experiment=None, run=None):
+    """Drop cached figures of a run, or all figures if run is not given."""
+    if run is None:
+        _figure_cache.invalidate()
+    else:
+        _figure_cache.invalidate(
+            lambda key: key[1] == (project, experiment, run))
+
+
+def _on_run_changed(project, experiment, event):
+    _, run, _ = event
+    clear_figure_cache(project, experiment, run)
+
+
+# drop figures of runs changed on disk, see `Warehouse.watch`
+warehouse.add_listener(_on_run_changed)
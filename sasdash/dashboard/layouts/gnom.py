@@ -1,6 +1,5 @@
 from __future__ import print_function, division
 
-import os.path
 import json
 
 import dash_core_components as dcc
@@ -11,6 +10,8 @@ from sasdash.datamodel import warehouse
 
 from .style import XLABEL, YLABEL, TITLE, INLINE_LABEL_STYLE
 from .style import GRAPH_GLOBAL_CONFIG
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 _PLOT_OPTIONS = [{
@@ -69,9 +70,9 @@ def get_gnom():
 def _update_file_selection(info_json):
     info = json.loads(info_json)
     project, experiment, run = info['project'], info['experiment'], info['run']
-    file_list = warehouse.get_files(project, experiment, run, 'gnom_files')
-    file_basename = (os.path.basename(each) for each in file_list)
-    if file_list:
+    file_basename = warehouse.get_file_names(project, experiment, run,
+                                             'gnom_files')
+    if file_basename:
         return [{
             'label': each,
             'value': i,
@@ -91,6 +92,7 @@ def _update_file_selection(info_json):
         Input('page-info', 'children'),
     ],
 )
+@memoize_figure
 def _update_figure(plot_type, iftm_index, info_json):
     info = json.loads(info_json)
     project, experiment, run = info['project'], info['experiment'], info['run']
@@ -117,10 +119,10 @@ def _update_figure(plot_type, iftm_index, info_json):
                 'name': 'fitting result',
             }]
 
-        return {
+        return encode_figure({
             'data': data,
             'layout': _DEFAULT_FIGURE_LAYOUT[plot_type],
-        }
+        })
     else:
         return {
             'layout': {
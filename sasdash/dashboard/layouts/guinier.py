@@ -1,10 +1,8 @@
 from __future__ import print_function, division
 
-import os.path
 import json
 
 import numpy as np
-from scipy.optimize import curve_fit
 
 from plotly import tools
 import dash_core_components as dcc
@@ -12,9 +10,12 @@ import dash_html_components as html
 from dash.dependencies import Input, Output, State
 
 from sasdash.datamodel import warehouse
+from sasdash.saslib.guinier import autorg, fit_guinier
 
 from .style import XLABEL, YLABEL, TITLE, LINE_STYLE
 from .style import GRAPH_GLOBAL_CONFIG
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 _PLOT_OPTIONS = [{
@@ -31,7 +32,7 @@ _DEFAULT_LAYOUT = html.Div(children=[
         figure={'data': ()},
         config=GRAPH_GLOBAL_CONFIG,
     ),
-    html.Button('Auto RG (not available for now)', id='guinier-autorg'),
+    html.Button('Auto RG', id='guinier-autorg'),
     html.Label('Select gnom file to plot'),
     dcc.Dropdown(
         id='guinier-file-selection',
@@ -52,31 +53,9 @@ _DEFAULT_LAYOUT = html.Div(children=[
 
 
 def fit_rg(sasm, qmin_idx, qmax_idx):
-    rg_slice = slice(qmin_idx, qmax_idx)
-    q = sasm.q
-    intensity = sasm.i
-    # err = sasm.err
-
-    q_square = np.square(q)[rg_slice]
-    ln_intensity = np.log(intensity)[rg_slice]
-
-    func = lambda x, b, k: k * x + b
-
-    opt, cov = curve_fit(func, q_square, ln_intensity)
-    # print('opt:', opt)
-    # print('cov:', cov)
-    rg = np.sqrt(-3.0 * opt[1])
-    i0 = np.exp(opt[0])
-
-    rg_err = np.absolute(0.5 * (np.sqrt(-3.0 / opt[1]))) * np.sqrt(
-        np.absolute(cov[1, 1]))
-    i0_err = i0 * np.sqrt(np.absolute(cov[0, 0]))
-    # FIXME: rg_err and i0_err are probably not correct!
-
-    qRg_min = q[qmin_idx] * rg
-    qRg_max = q[qmax_idx] * rg
-
-    return rg, rg_err, i0, i0_err, qRg_min, qRg_max
+    result = fit_guinier(sasm.q, sasm.i, sasm.err, qmin_idx, qmax_idx)
+    return (result['rg'], result['rg_err'], result['i0'], result['i0_err'],
+            result['qrg_min'], result['qrg_max'])
 
 
 def get_guinier():
@@ -89,10 +68,9 @@ def get_guinier():
 def _update_file_selection(info_json):
     info = json.loads(info_json)
     project, experiment, run = info['project'], info['experiment'], info['run']
-    file_list = warehouse.get_files(project, experiment, run,
-                                    'subtracted_files')
-    file_basename = (os.path.basename(each) for each in file_list)
-    if file_list:
+    file_basename = warehouse.get_file_names(project, experiment, run,
+                                             'subtracted_files')
+    if file_basename:
         return [{
             'label': each,
             'value': i,
@@ -104,6 +82,28 @@ def _update_file_selection(info_json):
         }]
 
 
+@dash_app.callback(
+    Output('guinier-q-range', 'value'),
+    [Input('guinier-autorg', 'n_clicks')],
+    [
+        State('guinier-file-selection', 'value'),
+        State('guinier-q-range', 'value'),
+        State('guinier-q-range', 'max'),
+        State('page-info', 'children'),
+    ],
+)
+def _set_autorg_range(n_clicks, sasm_idx, q_range, q_range_max, info_json):
+    if not n_clicks:
+        return q_range
+    info = json.loads(info_json)
+    project, experiment, run = info['project'], info['experiment'], info['run']
+    sasm = warehouse.get_sasprofile(project, experiment, run)[sasm_idx]
+    result = autorg(sasm.q, sasm.i, sasm.err, max_points=q_range_max)
+    if result is None:
+        return q_range
+    return [result['qmin_idx'], result['qmax_idx']]
+
+
 @dash_app.callback(
     Output('guinier-graph', 'figure'),
     [
@@ -112,11 +112,12 @@ def _update_file_selection(info_json):
         Input('page-info', 'children'),
     ],
 )
+@memoize_figure
 def _update_figure(sasm_idx, q_range, info_json):
     info = json.loads(info_json)
     project, experiment, run = info['project'], info['experiment'], info['run']
     sasm = warehouse.get_sasprofile(project, experiment, run)[sasm_idx]
-    rg, _, i0, _, qRg_min, qRg_max = fit_rg(sasm, *q_range)
+    rg, rg_err, i0, i0_err, qRg_min, qRg_max = fit_rg(sasm, *q_range)
 
     q = sasm.q
     intensity = sasm.i
@@ -158,10 +159,10 @@ def _update_figure(sasm_idx, q_range, info_json):
         'yaxis': 'y2',
     })
 
-    rg_res = 'Rg={:.4f}, I0={:.4f}, curr index(qRg limits): ({}, {})({:.4f}, {:.4f})'.format(
-        rg, i0, q_range[0], q_range[1], qRg_min, qRg_max)
+    rg_res = 'Rg={:.4f}\u00b1{:.4f}, I0={:.4f}\u00b1{:.4f}, curr index(qRg limits): ({}, {})({:.4f}, {:.4f})'.format(
+        rg, rg_err, i0, i0_err, q_range[0], q_range[1], qRg_min, qRg_max)
     figure['layout'].update(dict(title=rg_res, height=500))
     figure['layout']['xaxis2'].update({'title': XLABEL['guinier']})
     figure['layout']['yaxis1'].update({'title': YLABEL['guinier']})
     figure['layout']['yaxis2'].update({'title': 'Residual'})
-    return figure
+    return encode_figure(figure)
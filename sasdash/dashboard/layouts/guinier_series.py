@@ -0,0 +1,95 @@
+from __future__ import print_function, division
+
+import json
+
+import numpy as np
+
+from plotly import tools
+import dash_core_components as dcc
+import dash_html_components as html
+from dash.dependencies import Input, Output
+
+from sasdash.datamodel import warehouse
+from sasdash.saslib.measurement import DataNotCompatible
+
+from .style import LINE_STYLE, ERRORBAR_OPTIONS
+from .style import INLINE_LABEL_STYLE, GRAPH_GLOBAL_CONFIG
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
+from ..base import dash_app
+
+_DEFAULT_LAYOUT = html.Div(children=[
+    dcc.Graph(
+        id='guinier-series-graph',
+        figure={'data': ()},
+        config=GRAPH_GLOBAL_CONFIG,
+    ),
+    html.Label('Show error bars'),
+    dcc.RadioItems(
+        id='guinier-series-errorbar',
+        options=ERRORBAR_OPTIONS,
+        value=False,
+        labelStyle=INLINE_LABEL_STYLE,
+    ),
+])
+
+
+def get_guinier_series():
+    return _DEFAULT_LAYOUT
+
+
+@dash_app.callback(
+    Output('guinier-series-graph', 'figure'),
+    [
+        Input('guinier-series-errorbar', 'value'),
+        Input('page-info', 'children'),
+    ],
+)
+@memoize_figure
+def _update_figure(errorbar_visible, info_json):
+    info = json.loads(info_json)
+    project, experiment, run = info['project'], info['experiment'], info['run']
+    try:
+        results = warehouse.get_guinier_series(project, experiment, run)
+    except DataNotCompatible:
+        # frames of a series are fitted over the same q range
+        return {
+            'data': [],
+            'layout': {'title': 'Profiles of run have different q vectors.'},
+        }
+    frames = np.arange(len(results['keys']))
+
+    figure = tools.make_subplots(
+        rows=3, cols=1, shared_xaxes=True, print_grid=False)
+    for row, (name, err_name) in enumerate(
+            (('rg', 'rg_err'), ('i0', 'i0_err'), ('total_intensity', None)),
+            start=1):
+        trace = {
+            'x': frames,
+            'y': results[name],
+            'mode': 'markers',
+            'marker': {'size': 4},
+            'line': LINE_STYLE,
+            'name': name,
+            'text': results['keys'],
+        }
+        if err_name is not None:
+            trace['error_y'] = {
+                'type': 'data',
+                'array': results[err_name],
+                'visible': errorbar_visible,
+            }
+        figure.append_trace(trace, row, 1)
+
+    q_range = results['q_range']
+    if q_range is not None:
+        title = 'Rg and I0 of each frame (q index range: [{}, {}))'.format(
+            *q_range)
+    else:
+        title = 'Rg and I0 of each frame (no valid Guinier range)'
+    figure['layout'].update(dict(title=title, height=700, showlegend=False))
+    figure['layout']['xaxis1'].update({'title': 'Frames'})
+    figure['layout']['yaxis1'].update({'title': 'Rg'})
+    figure['layout']['yaxis2'].update({'title': 'I0'})
+    figure['layout']['yaxis3'].update({'title': 'Integrated intensity'})
+    return encode_figure(figure)
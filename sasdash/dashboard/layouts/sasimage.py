@@ -1,16 +1,17 @@
 from __future__ import print_function, division
 
-import os.path
 import json
 
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_core_components as dcc
 import dash_html_components as html
 
-from sasdash.saslib.image import subtract_radial_average
 from sasdash.datamodel import warehouse
 
 from .style import GRAPH_GLOBAL_CONFIG, INLINE_LABEL_STYLE
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 _PLOT_OPTIONS = [{
@@ -120,8 +121,7 @@ def _update_file_selction_1(info_json, useless):
     info = json.loads(info_json)
     per_dict = {key: info[key] for key in ('project', 'experiment', 'run')}
     per_dict['file_type'] = 'image_files'
-    file_list = warehouse.get_files(**per_dict)
-    file_basename = (os.path.basename(i) for i in file_list)
+    file_basename = warehouse.get_file_names(**per_dict)
     file_options = [{'label': i, 'value': i} for i in file_basename]
     return file_options
 
@@ -151,17 +151,41 @@ def _update_selction_value_2(file_options):
     return None
 
 
+def _get_stats(info_json, *image_fnames):
+    """Return statistics of selected images, see `get_image_stats`.
+    Unselected images and images without statistics are left out."""
+    info = json.loads(info_json)
+    project, experiment, run = info['project'], info['experiment'], info['run']
+    stats = (
+        warehouse.get_image_stats(project, experiment, run, fname)
+        for fname in image_fnames if fname is not None
+    )
+    return [each for each in stats if each is not None]
+
+
+def _percentile(stats, level):
+    levels, values = stats['percentiles']
+    if values is None or level not in levels:
+        return None
+    return values[levels.index(level)]
+
+
+def _bound(values, func):
+    # slider is kept as is if no image has the statistic
+    values = [each for each in values if each is not None]
+    if not values:
+        raise PreventUpdate
+    return func(values)
+
+
 @dash_app.callback(
     Output('sasimage-colorbar-slider', 'min'), [
         Input('sasimage-file-selection-1', 'value'),
         Input('sasimage-file-selection-2', 'value'),
     ], [State('page-info', 'children')])
-def _set_colorbar_range(image_fname_1, image_fname_2, info_json):
-    info = json.loads(info_json)
-    project, experiment, run = info['project'], info['experiment'], info['run']
-    image_1 = warehouse.get_sasimage(project, experiment, run, image_fname_1)
-    image_2 = warehouse.get_sasimage(project, experiment, run, image_fname_2)
-    return min(image_1.min(), image_2.min())
+def _set_colorbar_min(image_fname_1, image_fname_2, info_json):
+    stats = _get_stats(info_json, image_fname_1, image_fname_2)
+    return _bound((each['min'] for each in stats), min)
 
 
 @dash_app.callback(
@@ -169,29 +193,26 @@ def _set_colorbar_range(image_fname_1, image_fname_2, info_json):
         Input('sasimage-file-selection-1', 'value'),
         Input('sasimage-file-selection-2', 'value'),
     ], [State('page-info', 'children')])
-def _set_colorbar_range(image_fname_1, image_fname_2, info_json):
-    info = json.loads(info_json)
-    project, experiment, run = info['project'], info['experiment'], info['run']
-    image_1 = warehouse.get_sasimage(project, experiment, run, image_fname_1)
-    image_2 = warehouse.get_sasimage(project, experiment, run, image_fname_2)
-    return max(image_1.max(), image_2.max())
-
-
-# @dash_app.callback(
-#     Output('sasimage-colorbar-slider', 'value'), [
-#         Input('sasimage-file-selection-1', 'value'),
-#         Input('sasimage-file-selection-2', 'value'),
-#     ], [State('page-info', 'children')])
-# def _set_colorbar_range(image_fname_1, image_fname_2, info_json):
-#     info = json.loads(info_json)
-#     project, experiment, run = info['project'], info['experiment'], info['run']
-#     image_1 = warehouse.get_sasimage(exp, image_fname_1)
-#     image_2 = warehouse.get_sasimage(exp, image_fname_2)
-#     lower_bound = min(image_1.min(), image_2.min())
-#     upper_bound = max(image_1.max(), image_2.max())
-#     return [lower_bound, upper_bound]
+def _set_colorbar_max(image_fname_1, image_fname_2, info_json):
+    stats = _get_stats(info_json, image_fname_1, image_fname_2)
+    return _bound((each['max'] for each in stats), max)
+
+
+@dash_app.callback(
+    Output('sasimage-colorbar-slider', 'value'), [
+        Input('sasimage-file-selection-1', 'value'),
+        Input('sasimage-file-selection-2', 'value'),
+    ], [State('page-info', 'children')])
+def _set_colorbar_value(image_fname_1, image_fname_2, info_json):
+    # 1st to 99th percentile of valid pixels, robust against hot pixels
+    stats = _get_stats(info_json, image_fname_1, image_fname_2)
+    return [
+        _bound((_percentile(each, 1) for each in stats), min),
+        _bound((_percentile(each, 99) for each in stats), max),
+    ]
 
 
+@memoize_figure
 def _update_image(
         plot_type,
         image_fname,
@@ -229,13 +250,13 @@ def _update_image(
 
     if plot_type == 'subtraction':
         plot_type = 'heatmap'
-        mask = warehouse.get_raw_cfg_param(project, experiment, run, 'boxed_mask')
         # subtract_average_image
-        image = subtract_radial_average(image, boxed_rc_center, mask)
+        integrator = warehouse.get_radial_integrator(project, experiment, run)
+        image = integrator.subtract(image)
         colorbar_range[0] = image.min()
         colorbar_range[1] = image.max()
 
-    return {
+    return encode_figure({
         'data': [{
             'type': plot_type,
             'z': image,
@@ -245,7 +266,7 @@ def _update_image(
             'ncontours': 5,
         }],
         'layout': figure_layout,
-    }  # yapf: disable
+    })  # yapf: disable
 
 
 @dash_app.callback(
@@ -8,10 +8,15 @@ import dash_html_components as html
 from dash.dependencies import Input, Output, State
 
 from sasdash.datamodel import warehouse
+from sasdash.saslib.measurement import ProfileSeries, DataNotCompatible
 
 from .style import XLABEL, YLABEL, TITLE, LINE_STYLE
 from .style import ERRORBAR_OPTIONS
 from .style import INLINE_LABEL_STYLE, GRAPH_GLOBAL_CONFIG
+from .downsample import downsample_series, downsample_curves
+from .downsample import envelope_traces
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 # axis scale for (yaxis, xaxis)
@@ -23,6 +28,10 @@ _LIN_LOG = 'linear-log'
 _XLIM_MAX = 0.20
 _SLIDER_POINTS = 200
 
+# points and curves sent to browser, see `downsample_series`
+_POINT_BUDGET = 100000
+_MAX_FRAMES = 100
+
 _PLOT_OPTIONS = [{
     'label': 'Linear-Linear',
     'value': _LIN_LIN,
@@ -46,6 +55,16 @@ _PLOT_OPTIONS = [{
     'value': 'porod',
 }]
 
+# subtracted profiles reduced by RAW, or profiles integrated from raw
+# images, e.g. during beamtime before the reduction
+_SOURCE_OPTIONS = [{
+    'label': 'Subtracted',
+    'value': 'subtracted',
+}, {
+    'label': 'Integrated from images',
+    'value': 'integrated',
+}]
+
 _CALC_FUNCTION = {
     'sasprofile': {
         'q': lambda q: q,
@@ -98,6 +117,13 @@ _DEFAULT_LAYOUT = html.Div(children=[
         html.Summary('Label of the item'),
         html.Div(children=_line_style_table),
     ]),
+    html.Label('Profiles'),
+    dcc.RadioItems(
+        id='sasprofile-source',
+        options=_SOURCE_OPTIONS,
+        value='subtracted',
+        labelStyle=INLINE_LABEL_STYLE,
+    ),
     html.Label('Plot type'),
     dcc.RadioItems(
         id='sasprofile-plot-type',
@@ -139,7 +165,8 @@ def get_sasprofile():
     return _DEFAULT_LAYOUT
 
 
-def _get_figure(info, plot_type, errorbar_visible, xlim=None):
+def _get_figure(info, plot_type, errorbar_visible, xlim=None,
+                source='subtracted'):
     profile_name = plot_type if '-' not in plot_type else 'sasprofile'
 
     if profile_name == 'sasprofile':
@@ -164,23 +191,69 @@ def _get_figure(info, plot_type, errorbar_visible, xlim=None):
             type=ylabel,
         )
     if xlim:
-        xaxis['range'] = xlim
+        if xlabel != 'log':
+            xaxis['range'] = xlim
+        elif xlim[0] > 0:
+            xaxis['range'] = list(log10(xlim))  # range of log axis is in log10
 
     per_dict = {key: info[key] for key in ('project', 'experiment', 'run')}
-    sasm_list = warehouse.get_sasprofile(**per_dict)
-
+    calc_q = _CALC_FUNCTION[profile_name]['q']
+    calc_i = _CALC_FUNCTION[profile_name]['i']
+    if source == 'integrated':
+        try:
+            integrated = warehouse.get_integrated_profiles(**per_dict)
+        except ValueError as err:
+            # geometry of integration missing in raw_cfg
+            return {'data': [], 'layout': {'title': str(err)}}
+    # only send a bounded number of points of the shown range
+    try:
+        if source == 'integrated':
+            # same integrator, hence the same q, for all images
+            series = ProfileSeries.from_sasm_list(integrated)
+        else:
+            series = warehouse.get_profile_series(**per_dict)
+    except DataNotCompatible:
+        # profiles on different q grids are reduced one by one
+        sasm_list = warehouse.get_sasprofile(**per_dict)
+        reduced = downsample_curves(
+            [calc_q(sasm.q) for sasm in sasm_list],
+            [calc_i(sasm.q, sasm.i) for sasm in sasm_list],
+            [sasm.err for sasm in sasm_list],
+            xlim=xlim,
+            log_x=xlabel == 'log',
+            budget=_POINT_BUDGET,
+            max_frames=_MAX_FRAMES,
+        )
+        filenames = [sasm.get_parameter('filename') for sasm in sasm_list]
+        n_frames = len(sasm_list)
+    else:
+        reduced = downsample_series(
+            calc_q(series.q),
+            calc_i(series.q, series.i),
+            series.err,
+            xlim=xlim,
+            log_x=xlabel == 'log',
+            budget=_POINT_BUDGET,
+            max_frames=_MAX_FRAMES,
+        )
+        filenames = series.filenames
+        n_frames = series.n_frames
     data = [{
-        'x': _CALC_FUNCTION[profile_name]['q'](each_sasm.q),
-        'y': _CALC_FUNCTION[profile_name]['i'](each_sasm.q, each_sasm.i),
+        'x': each_x,
+        'y': each_y,
         'error_y': {
             'type': 'data',
-            'array': each_sasm.err,
+            'array': each_err,
             'visible': errorbar_visible,
         },
         'type': 'line',
         'line': LINE_STYLE,
-        'name': each_sasm.get_parameter('filename'),
-    } for each_sasm in sasm_list]
+        'name': filenames[frame],
+    } for frame, each_x, each_y, each_err in zip(
+        reduced['frames'], reduced['x'], reduced['y'], reduced['err'])]
+    if reduced['envelope'] is not None:
+        data = envelope_traces(reduced['envelope'], n_frames,
+                               LINE_STYLE) + data
 
     return {
         'data': data,
@@ -259,9 +332,13 @@ def _get_figure(info, plot_type, errorbar_visible, xlim=None):
         Input('sasprofile-plot-type', 'value'),
         Input('sasprofile-errorbar', 'value'),
         Input('sasprofile-xlim', 'value'),
+        Input('sasprofile-source', 'value'),
         Input('page-info', 'children'),
     ],
 )
-def _update_graph(plot_type, errorbar_visible, curr_xlim, info_json):
+@memoize_figure
+def _update_graph(plot_type, errorbar_visible, curr_xlim, source, info_json):
     info_dict = json.loads(info_json)
-    return _get_figure(info_dict, plot_type, errorbar_visible, curr_xlim)
+    return encode_figure(
+        _get_figure(info_dict, plot_type, errorbar_visible, curr_xlim,
+                    source))
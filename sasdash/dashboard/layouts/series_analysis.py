@@ -1,17 +1,23 @@
 from __future__ import print_function, division
 
-import os
 import json
 
+import numpy as np
+
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
 
 from sasdash.datamodel import warehouse
+from sasdash.saslib.measurement import DataNotCompatible
 
 from .style import XLABEL, YLABEL, TITLE, LINE_STYLE
 from .style import AXIS_OPTIONS
 from .style import INLINE_LABEL_STYLE, GRAPH_GLOBAL_CONFIG
+from .downsample import downsample_series, downsample_curves
+from .downsample import envelope_traces
+from .encoding import encode_figure
+from .figure_cache import memoize_figure
 from ..base import dash_app
 
 _DIFF_OPTIONS = [{
@@ -28,15 +34,38 @@ _DIFF_OPTIONS = [{
     'value': 'error_relative_diff',
 }]
 
+# calculate (n_frames, n_q) matrix from ProfileSeries and reference index
 _CALC_FUNCTION = {
-    'relative_diff': lambda x, ref: (x.i - ref.i) / ref.i * 100.0,
-    'absolute_diff': lambda x, ref: x.i - ref.i,
+    'relative_diff': lambda s, ref: s.difference(ref, 'i', relative=True),
+    'absolute_diff': lambda s, ref: s.difference(ref, 'i'),
+    'error': lambda s, ref: s.err,
+    'error_relative_diff': lambda s, ref: s.difference(ref, 'err', relative=True),
+}
+
+
+def _diff(sasm, ref, kind, relative=False):
+    """Difference of SASM against reference interpolated on its q."""
+    ref_val = np.interp(sasm.q, ref.q, getattr(ref, kind))
+    diff = getattr(sasm, kind) - ref_val
+    if relative:
+        diff = diff / ref_val * 100.0
+    return diff
+
+
+# the same for single SASM, if profiles are on different q grids
+_CALC_FUNCTION_SASM = {
+    'relative_diff': lambda x, ref: _diff(x, ref, 'i', relative=True),
+    'absolute_diff': lambda x, ref: _diff(x, ref, 'i'),
     'error': lambda x, ref: x.err,
-    'error_relative_diff': lambda x, ref: (x.err - ref.err) / ref.err * 100.0,
+    'error_relative_diff': lambda x, ref: _diff(x, ref, 'err', relative=True),
 }
 
 _DEFAULT_PLOT_TYPE = 'relative_diff'
 
+# points and curves sent to browser, see `downsample_series`
+_POINT_BUDGET = 100000
+_MAX_FRAMES = 100
+
 _DEFAULT_LAYOUT = html.Div(children=[
     dcc.Graph(
         id='difference-graph',
@@ -101,26 +130,56 @@ def get_series_analysis():
 
 def _get_figure(info, plot_type, ref_idx, xaxis_scale, xlim=None, ylim=None):
     per_dict = {key: info[key] for key in ('project', 'experiment', 'run')}
-    sasm_list = warehouse.get_sasprofile(**per_dict)
-    if 'diff' in plot_type.lower():
-        ref_sasm = sasm_list[ref_idx]
-    else:
-        ref_sasm = None
 
     xaxis = dict(title=XLABEL[xaxis_scale], type=xaxis_scale)
     yaxis = dict(title=YLABEL[plot_type])
     if xlim:
-        xaxis['range'] = xlim
+        if xaxis_scale != 'log':
+            xaxis['range'] = xlim
+        elif xlim[0] > 0:
+            xaxis['range'] = list(np.log10(xlim))  # range of log axis is in log10
     if ylim:
         yaxis['range'] = ylim
 
+    try:
+        series = warehouse.get_profile_series(**per_dict)
+    except DataNotCompatible:
+        # profiles on different q grids are compared one by one
+        sasm_list = warehouse.get_sasprofile(**per_dict)
+        ref_sasm = sasm_list[ref_idx]
+        reduced = downsample_curves(
+            [sasm.q for sasm in sasm_list],
+            [_CALC_FUNCTION_SASM[plot_type](sasm, ref_sasm)
+             for sasm in sasm_list],
+            xlim=xlim,
+            log_x=xaxis_scale == 'log',
+            budget=_POINT_BUDGET,
+            max_frames=_MAX_FRAMES,
+        )
+        filenames = [sasm.get_parameter('filename') for sasm in sasm_list]
+        n_frames = len(sasm_list)
+    else:
+        reduced = downsample_series(
+            series.q,
+            _CALC_FUNCTION[plot_type](series, ref_idx),
+            xlim=xlim,
+            log_x=xaxis_scale == 'log',
+            budget=_POINT_BUDGET,
+            max_frames=_MAX_FRAMES,
+        )
+        filenames = series.filenames
+        n_frames = series.n_frames
     data = [{
-        'x': each_sasm.q,
-        'y': _CALC_FUNCTION[plot_type](each_sasm, ref_sasm),
+        'x': each_x,
+        'y': each_row,
         'type': 'line',
         'line': LINE_STYLE,
-        'name': each_sasm.get_parameter('filename'),
-    } for each_sasm in sasm_list]
+        'name': filenames[frame],
+    } for frame, each_x, each_row in zip(reduced['frames'], reduced['x'],
+                                         reduced['y'])]
+    if reduced['envelope'] is not None:
+        data = envelope_traces(reduced['envelope'], n_frames,
+                               LINE_STYLE) + data
 
     return {
         'data': data,
@@ -145,9 +204,11 @@ def _get_figure(info, plot_type, ref_idx, xaxis_scale, xlim=None, ylim=None):
         Input('page-info', 'children'),
     ],
 )
+@memoize_figure
 def _update_figure(plot_type, ref_idx, xaxis_scale, xlim, ylim, info_json):
     info_dict = json.loads(info_json)
-    return _get_figure(info_dict, plot_type, ref_idx, xaxis_scale, xlim, ylim)
+    return encode_figure(
+        _get_figure(info_dict, plot_type, ref_idx, xaxis_scale, xlim, ylim))
 
 
 @dash_app.callback(
@@ -156,9 +217,9 @@ def _update_figure(plot_type, ref_idx, xaxis_scale, xlim, ylim, info_json):
 def _set_ref_options(info_json):
     info = json.loads(info_json)
     project, experiment, run = info['project'], info['experiment'], info['run']
-    file_list = warehouse.get_files(project, experiment, run,
-                                    'subtracted_files')
+    file_basename = warehouse.get_file_names(project, experiment, run,
+                                             'subtracted_files')
     return [{
-        'label': os.path.basename(each),
+        'label': each,
         'value': i,
-    } for i, each in enumerate(file_list)]
+    } for i, each in enumerate(file_basename)]
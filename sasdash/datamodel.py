@@ -1,15 +1,56 @@
 from __future__ import print_function, division, absolute_import
 
 import os
-import glob
+import threading
 from copy import deepcopy
 from functools import lru_cache
 from collections import Iterable
 
 import numpy as np
 
-from sasdash.saslib import sasio, image, cormap
-from sasdash.utils import parse_yaml, to_basic_type
+from sasdash.saslib import sasio, image, cormap, guinier
+from sasdash.saslib.measurement import SASM, ProfileSeries
+from sasdash.utils import parse_yaml, dump_yaml, to_basic_type
+from sasdash.utils import get_process_pool
+from sasdash.cache import ProfileDiskCache, MemoryCache, ImageStore
+from sasdash.cache import DEFAULT_MEMORY_BUDGET, DEFAULT_CACHE_DIRNAME
+from sasdash.cache import cache_path, file_state
+from sasdash.prefetch import Prefetcher, DEFAULT_PREFETCH_RUNS
+from sasdash.watcher import DirectoryWatcher, DEFAULT_POLL_INTERVAL
+from sasdash.watcher import is_network_filesystem
+from sasdash import discovery
+
+# data directory (file type) of each kind of in-memory cached data
+CACHED_FILE_TYPES = {
+    'sasprofile': 'subtracted_files',
+    'profile_series': 'subtracted_files',
+    'gnom': 'gnom_files',
+    'integrated': 'image_files',
+}
+
+# settings in raw_cfg (named as in RAW) needed to integrate images, as
+# {key: (argument of `image.AzimuthalIntegrator`, description)}
+INTEGRATION_PARAMETERS = {
+    'SampleDistance': ('sample_distance', 'sample-detector distance in mm'),
+    'WaveLength': ('wavelength', 'wavelength in angstrom'),
+    'DetectorPixelSize': ('pixel_size', 'detector pixel size in micrometer'),
+}
+
+# artifacts warmed in background for each layout listed in config.yml of a
+# run, as (priority, method, arguments); lower priorities run first
+PREFETCH_TASKS = {
+    'sasprofile': ((0, 'get_profile_series', ()),),
+    'series_analysis': ((0, 'get_profile_series', ()),),
+    'guinier': ((0, 'get_sasprofile', ()),),
+    'cormap_heatmap': (
+        (0, 'get_profile_series', ()),
+        (1, 'get_cormap_heatmap', ()),
+    ),
+    'guinier_series': ((1, 'get_guinier_series', ()),),
+    'colormap': ((0, 'get_profile_series', ()),),
+    'gnom': ((1, 'get_gnom', ()),),
+    'sasimage': ((2, 'get_image_stats', ()),),
+}
 
 
 class Experiment(object):
@@ -41,26 +82,132 @@ class Experiment(object):
             'gnom_files': '.out',
         }
 
+        # parsed profiles are cached on disk, next to each run by default
+        self._disk_cache = ProfileDiskCache(self._config.get('cache_dir'))
+        # and in memory within a budget (in bytes)
+        self._memory_cache = MemoryCache(
+            self._config.get('memory_cache_size', DEFAULT_MEMORY_BUDGET))
+        # sorted file lists of each run and file type, see `get_files`,
+        # also updated by the watcher thread
+        self._file_index = {}
+        self._file_index_lock = threading.Lock()
+        # incremental stores (CorMap, Guinier) are updated by page requests
+        # and background prefetching, on a copy, see `_swap_store`
+        self._store_locks = {}
+
         # search root_path
         self._root_path = self._config['root_path']
         self._registered_setup = {}
         self._registered_dir = {}
+        # directories searched for runs, see `get_watch_dirs`
+        self._tree_dirs = set()
+        self.refresh_runs()
+
+    def _search_run_dir(self, dir_path, registered_setup, registered_dir):
+        # data directories are pruned and unchanged directories are taken
+        # from the directory index of the last search, kept in the cache
+        # directory (pruned as well) inside the root by default
+        cache_dir = self._config.get('cache_dir')
+        if cache_dir is None:
+            index_file = os.path.join(dir_path, DEFAULT_CACHE_DIRNAME,
+                                      'dirindex.json')
+        else:
+            index_file = cache_path(dir_path, cache_dir,
+                                    suffix='.dirindex.json')
+        index = discovery.scan_tree(
+            dir_path,
+            prune=discovery.PRUNED_DIRS | set(self._file_subdir.values()),
+            index_file=index_file,
+            max_workers=self._config.get(
+                'discovery_workers', discovery.DEFAULT_DISCOVERY_WORKERS),
+        )
+        for path, setup_file in discovery.setup_files(index):
+            dir_name = os.path.basename(path)
+            registered_setup[dir_name] = setup_file
+            registered_dir[dir_name] = path
+        return index.keys()
 
+    def refresh_runs(self):
+        """Search root_path for runs again.
+
+        Returns
+        -------
+        tuple of list
+            names of added (or moved) and removed runs.
+        """
+        registered_setup, registered_dir, tree_dirs = {}, {}, set()
         if isinstance(self._root_path, str):
-            self._search_run_dir(self._root_path)
+            roots = (self._root_path, )
         elif isinstance(self._root_path, Iterable):
-            for each in self._root_path:
-                self._search_run_dir(each)
-
-    def _search_run_dir(self, dir_path):
-        # TODO: improve this if os.walk() costs too much time.
-        for path, _, files in os.walk(dir_path):
-            for each_file in files:
-                if each_file.lower() == 'setup.yml':
-                    dir_name = os.path.basename(path)
-                    setup_file = os.path.join(path, each_file)
-                    self._registered_setup[dir_name] = setup_file
-                    self._registered_dir[dir_name] = path
+            roots = self._root_path
+        else:
+            roots = ()
+        for each in roots:
+            tree_dirs.update(self._search_run_dir(each, registered_setup,
+                                                  registered_dir))
+        added = sorted(run for run, path in registered_dir.items()
+                       if self._registered_dir.get(run) != path)
+        removed = sorted(set(self._registered_dir) - set(registered_dir))
+        self._registered_setup = registered_setup
+        self._registered_dir = registered_dir
+        self._tree_dirs = tree_dirs
+        return added, removed
+
+    def get_watch_dirs(self):
+        """Return {dir_path: (run, file_type)} of directories to watch:
+        data directories of runs, and directories searched for runs with
+        (None, None)."""
+        watch_dirs = dict.fromkeys(self._tree_dirs, (None, None))
+        for run, run_dir in self._registered_dir.items():
+            for file_type, subdir in self._file_subdir.items():
+                watch_dirs[os.path.join(run_dir, subdir)] = (run, file_type)
+        return watch_dirs
+
+    def update(self, changed_dirs=None):
+        """Apply changes of watched directories (see `get_watch_dirs`):
+        search runs again if directories of runs changed, and drop cached
+        data of changed data directories.
+
+        Parameters
+        ----------
+        changed_dirs : set of str, optional
+            changed directories (the default is None, which means any
+            directory may have changed).
+
+        Returns
+        -------
+        list of tuple
+            events as (kind, run, file_type). kind is 'added' or 'removed'
+            (file_type is None), or 'changed'.
+        """
+        watch_dirs = self.get_watch_dirs()
+        if changed_dirs is None:
+            changed_dirs = set(watch_dirs)
+        events = []
+        changed = set()
+        if any(watch_dirs.get(path) == (None, None) for path in changed_dirs):
+            added, removed = self.refresh_runs()
+            for run in removed:
+                self.invalidate_cache(run)
+                events.append(('removed', run, None))
+            events.extend(('added', run, None) for run in added)
+            # data directories may be created or replaced
+            run_dirs = {
+                path: run for run, path in self._registered_dir.items()}
+            for path in changed_dirs:
+                run = run_dirs.get(path)
+                if run is not None and run not in added:
+                    changed.update((run, ft) for ft in self._file_subdir)
+        for path in changed_dirs:
+            run, file_type = watch_dirs.get(path, (None, None))
+            if file_type is not None and run in self._registered_dir:
+                changed.add((run, file_type))
+        for run, file_type in sorted(changed):
+            # entries of changed files in incremental stores are replaced
+            # on their next update, see `invalidate_cache`
+            self.invalidate_cache(run, file_type)
+            events.append(('changed', run, file_type))
+        return events
 
     @property
     def name(self):
@@ -85,10 +232,75 @@ class Experiment(object):
         setup_dict = parse_yaml(setup)
         return setup_dict.get(key, None)
 
-    @lru_cache()
+    def set_setup(self, run, setup):
+        """Write setup.yml of run."""
+        dump_yaml(setup, self.registered_setup[run])
+
+    def query_runs(self, filters=None, sort_by=None, descending=False,
+                   offset=0, limit=None):
+        """Return a page of runs with their setup, filtered and sorted by
+        setup fields.
+
+        Only setup.yml of runs shown in the page are read (see
+        `parse_yaml`, which caches them) unless runs are filtered or sorted
+        by setup fields.
+
+        Parameters
+        ----------
+        filters : dict, optional
+            {field: text} of setup fields (or 'run' for run name), runs
+            whose field contains text (case insensitive) are kept.
+        sort_by : str, optional
+            setup field (the default is None, which sorts by run name).
+            Runs without the field come last.
+        descending : bool, optional
+        offset : int, optional
+            number of skipped runs.
+        limit : int, optional
+            maximum number of returned runs (the default is None, which
+            returns all runs).
+
+        Returns
+        -------
+        tuple
+            total number of matched runs, and list of setup dicts of
+            runs in page with 'run' key of run name.
+        """
+        setups = {}
+
+        def get_setup(run):
+            if run not in setups:
+                setups[run] = parse_yaml(self._registered_setup[run])
+            return setups[run]
+
+        runs = sorted(self._registered_setup, reverse=descending)
+        for field, text in (filters or {}).items():
+            text = str(text).lower()
+            if field == 'run':
+                runs = [run for run in runs if text in run.lower()]
+            else:
+                runs = [
+                    run for run in runs
+                    if text in str(get_setup(run).get(field, '')).lower()
+                ]
+        if sort_by not in (None, 'run'):
+            values = {run: get_setup(run).get(sort_by) for run in runs}
+            # numbers and text are sorted apart, missing fields last
+            runs = sorted(
+                (run for run in runs if values[run] is not None),
+                key=lambda run: (
+                    not isinstance(values[run], (int, float)),
+                    values[run] if isinstance(values[run], (int, float))
+                    else str(values[run]).lower()),
+                reverse=descending,
+            ) + [run for run in runs if values[run] is None]
+        stop = None if limit is None else offset + limit
+        page = [dict(get_setup(run), run=run)
+                for run in runs[offset:stop]]
+        return len(runs), page
+
     def get_prev_next(self, run_name):
-        all_run = list(self._registered_dir.keys())
-        all_run.sort()
+        all_run = sorted(self._registered_dir)
         idx = all_run.index(run_name)
         if idx == 0:
             return None, all_run[1]
@@ -104,6 +316,43 @@ class Experiment(object):
         return self._config.get(key)
 
     # ==================== Data function ============================ #
+    def _list_files(self, run_name, file_type):
+        dir_path = os.path.join(self._registered_dir[run_name],
+                                self._file_subdir[file_type])
+        ext = self._file_ext[file_type]
+        try:
+            with os.scandir(dir_path) as entries:
+                # same files as glob('*.ext'), hidden files are ignored
+                names = [
+                    entry.name for entry in entries
+                    if entry.name.endswith(ext)
+                    and not entry.name.startswith('.')
+                ]
+        except OSError:
+            names = []
+        names.sort()
+        files = [os.path.join(dir_path, name) for name in names]
+        # remove buffer file
+        if 'image' in file_type:
+            keep = ['buffer' not in each.lower() for each in files]
+            files = [each for each, k in zip(files, keep) if k]
+            names = [each for each, k in zip(names, keep) if k]
+        return tuple(files), tuple(names)
+
+    def _get_file_index(self, run_name, file_type):
+        """Return (files, names) of run from the file index, listed again
+        only once the data directory changed."""
+        key = (run_name, file_type)
+        version = self.get_data_version(run_name, file_type)
+        with self._file_index_lock:
+            entry = self._file_index.get(key)
+        if entry is None or entry[0] != version or version is None:
+            # listed without lock, the entry is replaced as a whole
+            entry = (version, ) + self._list_files(run_name, file_type)
+            with self._file_index_lock:
+                self._file_index[key] = entry
+        return entry[1:]
+
     def get_files(self, run_name, file_type):
         """Return full path of files as a list.
 
@@ -119,41 +368,179 @@ class Experiment(object):
         list :
             path of files
         """
-        pattern = os.path.join(
-            self._registered_dir[run_name],
-            self._file_subdir[file_type],
-            '*{}'.format(self._file_ext[file_type]),
-        )
-        files = glob.glob(pattern)
-        files.sort()
-        # remove buffer file
-        if 'image' in file_type:
-            for each in reversed(files):
-                if 'buffer' in each.lower():
-                    files.remove(each)
         # FIXME: do something (warn or raise error) if file list is empty.
         # if not files:
         #     raise ValueError('No files found.')
-        return files
+        return list(self._get_file_index(run_name, file_type)[0])
+
+    def get_file_names(self, run_name, file_type):
+        """Return base names of files (in the same order as `get_files`)
+        as a list."""
+        return list(self._get_file_index(run_name, file_type)[1])
+
+    def get_file_states(self, run_name, file_type):
+        """Return (name, mtime_ns, size) of files (in the same order as
+        `get_files`), which identify the content of each file. Size and
+        mtime of removed files are None."""
+        states = []
+        for filepath, name in zip(*self._get_file_index(run_name, file_type)):
+            try:
+                states.append((name, ) + file_state(filepath))
+            except OSError:
+                states.append((name, None, None))
+        return states
+
+    def _get_frame_keys(self, run_name, known_keys):
+        """Return (name, mtime_ns, size) of subtracted files of run as
+        keys of incremental stores. Files rewritten in place leave the
+        mtime of the directory unchanged, so loaded profiles of run are
+        dropped if a frame in `known_keys` changed."""
+        keys = self.get_file_states(run_name, 'subtracted_files')
+        known = {key[0]: key for key in known_keys}
+        if any(known.get(key[0], key) != key for key in keys):
+            self.invalidate_cache(run_name, 'subtracted_files')
+        return {key[0]: key for key in keys}
+
+    # =============== Cache ========================================= #
+    def get_data_version(self, run_name, file_type):
+        """Return version of data directory of run, which changes whenever
+        a file is added, removed or renamed in it."""
+        dir_path = os.path.join(self._registered_dir[run_name],
+                                self._file_subdir[file_type])
+        try:
+            return os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get_run_version(self, run_name):
+        """Return versions of all data directories of run, which change
+        whenever data of run changes."""
+        return tuple(
+            self.get_data_version(run_name, file_type)
+            for file_type in sorted(self._file_subdir))
+
+    def invalidate_cache(self, run_name=None, file_type=None):
+        """Drop in-memory data of a run (or of all runs), only data loaded
+        from `file_type` if given. Incremental stores (CorMap, Guinier)
+        are kept unless `file_type` is None: their frames are keyed by
+        (name, mtime_ns, size), so on the next update only frames of new
+        or changed files are computed and those of removed files are
+        dropped."""
+        def match(key):
+            if run_name is not None and key[1] != run_name:
+                return False
+            return (file_type is None
+                    or CACHED_FILE_TYPES.get(key[0]) == file_type)
+
+        self._memory_cache.invalidate(match)
+        with self._file_index_lock:
+            for key in list(self._file_index):
+                if (run_name in (None, key[0])
+                        and file_type in (None, key[1])):
+                    del self._file_index[key]
+
+    def get_cache_stats(self):
+        """Return hit/miss/eviction counters of in-memory cache."""
+        return self._memory_cache.stats()
+
+    def _cached(self, kind, run_name, file_type, func):
+        return self._memory_cache.get_or_compute(
+            (kind, run_name),
+            func,
+            version=self.get_data_version(run_name, file_type),
+        )
 
     # =============== 1D Profile ==================================== #
-    @lru_cache()
     def get_sasprofile(self, run_name):
-        pattern = os.path.join(self._registered_dir[run_name],
-                               self._file_subdir['subtracted_files'],
-                               '*%s' % self._file_ext['subtracted_files'])
-        profile_files = glob.glob(pattern)
-        profile_files.sort()
-        return [sasio.load_dat(f) for f in profile_files]  # sasm_list
+        def load():
+            profile_files = self.get_files(run_name, 'subtracted_files')
+            return self._disk_cache.load(profile_files, sasio.load_dat)
+
+        return self._cached('sasprofile', run_name, 'subtracted_files',
+                            load)  # sasm_list
+
+    def get_profile_series(self, run_name):
+        """Return all subtracted profiles of run stacked as ProfileSeries."""
+        def load():
+            profile_files = self.get_files(run_name, 'subtracted_files')
+            return ProfileSeries.from_sasm_list(
+                self._disk_cache.load(profile_files, sasio.load_dat))
+
+        return self._cached('profile_series', run_name, 'subtracted_files',
+                            load)
+
+    def iter_profiles(self, run_name, chunk=256, start=0):
+        """Yield subtracted profiles of run as ProfileSeries of at most
+        `chunk` frames, so that reductions over long runs (e.g. SEC-SAXS)
+        keep only one chunk in memory. The first `start` frames are
+        skipped."""
+        profile_files = self.get_files(run_name, 'subtracted_files')
+        for sasm_list in self._disk_cache.iter_load(
+                profile_files, sasio.load_dat, chunk_size=chunk, start=start):
+            yield ProfileSeries.from_sasm_list(sasm_list)
+
+    def get_guinier_series(self, run_name, q_range=None):
+        """Return Rg, I0, their errors and integrated intensity of every
+        frame of run, see `guinier.GuinierSeries.get_results`. 'keys' are
+        file names of frames.
+
+        Fits are kept per run and only new frames are fitted on later
+        calls.
+
+        Parameters
+        ----------
+        run_name : str
+            registered directory name of run
+        q_range : tuple of int, optional
+            (qmin_idx, qmax_idx) of fits (the default is None, which uses
+            range found by AutoRG on the strongest frame).
+        """
+        q_range = tuple(q_range) if q_range is not None else None
+        key = ('guinier_series', run_name, q_range)
+        base = self._memory_cache.get(key)
+        # frames are keyed by (name, mtime_ns, size)
+        frame_keys = self._get_frame_keys(
+            run_name, base.keys if base is not None else ())
+        keys = [
+            frame_keys[name]
+            for name in self.get_file_names(run_name, 'subtracted_files')
+        ]
+        if base is None or base.keys != keys[:len(base)]:
+            # new run or frames changed
+            store = guinier.GuinierSeries(*(q_range or ()))
+        else:
+            store = base.copy()
+        n_new = 0
+        for series in self.iter_profiles(run_name, start=len(store)):
+            n_new += store.update(
+                series.q, series.i, series.err, [
+                    frame_keys.get(name, (name, None, None))
+                    for name in series.filenames
+                ])
+        if n_new or base is None:
+            self._swap_store(key, base, store)
+        results = store.get_results()
+        results['keys'] = [name for name, _, _ in results['keys']]
+        return results
+
+    def _swap_store(self, key, base, store):
+        """Put `store`, updated from a copy of `base`, in memory cache.
+
+        Stores are updated without lock, so page requests and prefetching
+        can read `base` meanwhile. The lock of `key` is only held to swap
+        in the result, which is dropped if another thread has already
+        replaced `base`.
+        """
+        with self._store_locks.setdefault(key, threading.Lock()):
+            if self._memory_cache.get(key) is base:
+                self._memory_cache.put(key, store)  # update size of store
 
-    @lru_cache()
     def get_gnom(self, run_name):
-        pattern = os.path.join(self._registered_dir[run_name],
-                               self._file_subdir['gnom_files'],
-                               '*%s' % self._file_ext['gnom_files'])
-        gnom_files = glob.glob(pattern)
-        gnom_files.sort()
-        return [sasio.load_out(f) for f in gnom_files]  # sasm_list
+        def load():
+            gnom_files = self.get_files(run_name, 'gnom_files')
+            return self._disk_cache.load(gnom_files, sasio.load_out)
+
+        return self._cached('gnom', run_name, 'gnom_files', load)  # iftm_list
 
     # ============== Image related ================================== #
     @lru_cache()
@@ -179,17 +566,108 @@ class Experiment(object):
         np.ndarray
             2D matrix of CorMap heatmap
         """
-        filelist = self.get_files(run_name, 'subtracted_files')
-        heatmap = cormap.calc_cormap_heatmap(filelist)
-        return heatmap[heatmap_type]
+        if self._config.get('cormap_engine') == 'datcmp':
+            filelist = self.get_files(run_name, 'subtracted_files')
+            heatmap = cormap.calc_datcmp_heatmap(filelist)
+            return heatmap[heatmap_type]
+
+        # the store lives across data versions and only compares new frames
+        key = ('cormap', run_name)
+        # compare frames in parallel if `cormap_workers` is set
+        n_workers = self._config.get('cormap_workers')
+        executor = get_process_pool(n_workers) if n_workers else None
+        base = self._memory_cache.get(key)
+        if base is None:
+            store = cormap.CorMapStore(
+                adjust=self._config.get('cormap_adjust', 'bonferroni'))
+        else:
+            store = base.copy()
+        # frames are keyed by (name, mtime_ns, size), changed frames are
+        # compared again
+        frame_keys = self._get_frame_keys(run_name, store.keys)
+        series = self.get_profile_series(run_name)
+        keys = [
+            frame_keys.get(name, (name, None, None))
+            for name in series.filenames
+        ]
+        if store.update(series.i, keys, executor=executor) or base is None:
+            self._swap_store(key, base, store)
+        else:
+            store = base
+        return store.get_heatmap(heatmap_type)
+
+    # =============== Prefetch ====================================== #
+    def get_layouts(self, run_name):
+        """Return layouts selected in config.yml of run."""
+        config_file = os.path.join(self._registered_dir[run_name],
+                                   'config.yml')
+        if not os.path.exists(config_file):
+            return ()
+        return tuple(parse_yaml(config_file).get('layouts') or ())
+
+    def prefetch(self, prefetcher, run_name=None):
+        """Submit loading and analysis of runs to `prefetcher` according
+        to their layouts, see `PREFETCH_TASKS`. Only the `prefetch_runs`
+        (see `DEFAULT_PREFETCH_RUNS`) most recently modified runs are
+        submitted, oldest first, so that the newest runs are the most
+        recently used ones in memory cache. Disabled by `prefetch: false`
+        in experiment config.
+
+        Parameters
+        ----------
+        prefetcher : sasdash.prefetch.Prefetcher
+        run_name : str, optional
+            registered directory name of run (the default is None, which
+            submits the most recent runs).
+
+        Returns
+        -------
+        int
+            number of submitted tasks.
+        """
+        if not self._config.get('prefetch', True):
+            return 0
+        if run_name is not None:
+            runs = [run_name]
+        else:
+            def mtime(run):
+                try:
+                    return os.stat(self._registered_dir[run]).st_mtime_ns
+                except OSError:
+                    return 0
+
+            n_runs = self._config.get('prefetch_runs', DEFAULT_PREFETCH_RUNS)
+            runs = sorted(self._registered_dir, key=mtime)
+            runs = runs[max(len(runs) - n_runs, 0):]
+        n_tasks = 0
+        for run in runs:
+            for layout in self.get_layouts(run):
+                for priority, method, args in PREFETCH_TASKS.get(layout, ()):
+                    func = getattr(self, method, None)
+                    if func is None:
+                        continue
+                    # experiments of different projects (or without
+                    # name) may share names of runs
+                    prefetcher.submit(
+                        (id(self), run, method),
+                        lambda func=func, run=run, args=args: func(run, *args),
+                        priority,
+                    )
+                    n_tasks += 1
+        return n_tasks
 
 
 class PrimusExperiment(Experiment):
     def __init__(self, config, name=None, **kwargs):
-        super(PrimusExperiment, self).__init__(config, **kwargs)
+        super(PrimusExperiment, self).__init__(config, name=name, **kwargs)
 
         # general config (image center)
         self._default_box_radius = 150
+        # processed images of each run, see `get_sasimage`
+        self._image_stores = {}
+        # radial geometry of each raw_cfg, see `get_radial_integrator`
+        self._radial_integrators = {}
+        self._azimuthal_integrators = {}
 
         # generate cfg settings
         # TODO: if raw_cfg is missing?
@@ -223,8 +701,9 @@ class PrimusExperiment(Experiment):
                     cfg_dict['Xcenter']
                 )
 
+                cfg_dict['mask'] = np.load(cfg_dict['mask_npy'])
                 cfg_dict['boxed_mask'] = image.boxslice(
-                    np.load(cfg_dict['mask_npy']),
+                    cfg_dict['mask'],
                     cfg_dict['rc_center'],
                     self._default_box_radius,
                 )
@@ -258,23 +737,22 @@ class PrimusExperiment(Experiment):
         #         'BeamStopMask']
         # self.boxed_mask = image.boxslice(mask, self.center, self.radius)
 
-    def get_raw_cfg(self, run_name):
+    def get_raw_cfg_name(self, run_name):
         raw_cfg_name = self.get_setup_parameter(run_name, 'raw_cfg')
         if raw_cfg_name is not None:
-            raw_cfg_name = os.path.basename(os.path.splitext(raw_cfg_name)[0])
+            return os.path.basename(os.path.splitext(raw_cfg_name)[0])
         else:
-            raw_cfg_name = self._default_raw_cfg
-        return self._raw_cfg[raw_cfg_name]
+            return self._default_raw_cfg
+
+    def get_raw_cfg(self, run_name):
+        return self._raw_cfg[self.get_raw_cfg_name(run_name)]
 
     @lru_cache()
     def get_raw_cfg_param(self, run_name, key):
         raw_cfg = self.get_raw_cfg(run_name)
         return raw_cfg.get(key)
 
-    def get_sasimage(self, run, image_fname):
-        image_filepath = os.path.join(self._root_path, run,
-                                      self._ImageFileDir, image_fname)
-
+    def _load_sasimage(self, run, image_filepath):
         rc_center = self.get_raw_cfg_param(run, 'rc_center')
 
         img = image.boxslice(
@@ -285,6 +763,128 @@ class PrimusExperiment(Experiment):
 
         return img
 
+    def _get_image_store(self, run):
+        raw_cfg = self.get_raw_cfg(run)
+        tag = '{}|{}|{}'.format(
+            raw_cfg.get('mask_npy'),
+            raw_cfg.get('rc_center'),
+            self._default_box_radius,
+        )
+        store = self._image_stores.get(run)
+        if store is None or store.tag != tag:
+            image_dir = os.path.join(self._registered_dir[run],
+                                     self._ImageFileDir)
+            boxed_mask = self.get_raw_cfg_param(run, 'boxed_mask')
+            store = ImageStore(
+                cache_path(image_dir, self._config.get('cache_dir')),
+                tag,
+                stats_func=lambda img: image.image_statistics(img, boxed_mask),
+            )
+            self._image_stores[run] = store
+        return store
+
+    def get_sasimage(self, run, image_fname):
+        """Return boxed and masked image, decoded only once and kept in a
+        memory-mapped store of the run."""
+        image_filepath = os.path.join(self._registered_dir[run],
+                                      self._ImageFileDir, image_fname)
+        return self._get_image_store(run).get(
+            image_filepath, lambda f: self._load_sasimage(run, f))
+
+    def get_radial_integrator(self, run):
+        """Return `RadialIntegrator` of boxed images of run. Runs sharing
+        a raw_cfg share one integrator."""
+        raw_cfg_name = self.get_raw_cfg_name(run)
+        integrator = self._radial_integrators.get(raw_cfg_name)
+        if integrator is None:
+            boxed_mask = self.get_raw_cfg_param(run, 'boxed_mask')
+            integrator = image.RadialIntegrator(
+                boxed_mask.shape,
+                self.get_raw_cfg_param(run, 'boxed_rc_center'),
+                boxed_mask,
+            )
+            self._radial_integrators[raw_cfg_name] = integrator
+        return integrator
+
+    def get_azimuthal_integrator(self, run):
+        """Return `AzimuthalIntegrator` of full images of run. The geometry
+        is read from raw_cfg of run, see `INTEGRATION_PARAMETERS`."""
+        raw_cfg_name = self.get_raw_cfg_name(run)
+        integrator = self._azimuthal_integrators.get(raw_cfg_name)
+        if integrator is None:
+            raw_cfg = self.get_raw_cfg(run)
+            missing = [
+                '{} ({})'.format(key, description)
+                for key, (_, description) in INTEGRATION_PARAMETERS.items()
+                if raw_cfg.get(key) is None
+            ]
+            if missing:
+                raise ValueError(
+                    'Images of run {} can not be integrated, {} '
+                    'configuration lacks {}.'.format(
+                        run, raw_cfg_name, ', '.join(missing)))
+            integrator = image.AzimuthalIntegrator(
+                raw_cfg['mask'].shape,
+                raw_cfg['rc_center'],
+                raw_cfg['mask'],
+                **{
+                    arg: float(raw_cfg[key])
+                    for key, (arg, _) in INTEGRATION_PARAMETERS.items()
+                })
+            self._azimuthal_integrators[raw_cfg_name] = integrator
+        return integrator
+
+    def get_integrated_profiles(self, run):
+        """Return 1D profiles integrated from raw images of run as a list of
+        SASM, e.g. to inspect a run before it is reduced by RAW.
+
+        Images are integrated chunk by chunk, by `integration_workers`
+        processes if set in experiment config.
+        """
+        def integrate():
+            integrator = self.get_azimuthal_integrator(run)
+            image_files = self.get_files(run, 'image_files')
+            profiles = image.integrate_files(
+                image_files,
+                integrator,
+                sasio.load_pilatus_image,
+                max_workers=self._config.get('integration_workers'),
+            )
+            return [
+                SASM(q, i, err, filename=os.path.basename(filepath))
+                for filepath, (q, i, err) in zip(image_files, profiles)
+            ]
+
+        return self._cached('integrated', run, 'image_files', integrate)
+
+    def get_image_stats(self, run, image_fname=None):
+        """Return statistics (min, max, percentiles, total counts and number
+        of masked pixels) of boxed and masked image. They are kept in the
+        index of the image store, so images are decoded only once.
+
+        Parameters
+        ----------
+        run : str
+            registered directory name of run
+        image_fname : str, optional
+            file name of image (the default is None, which returns a dict
+            of statistics of all images of run keyed by file name).
+        """
+        store = self._get_image_store(run)
+        image_dir = os.path.join(self._registered_dir[run], self._ImageFileDir)
+
+        def stats_of(fname):
+            return store.get_stats(
+                os.path.join(image_dir, fname),
+                lambda f: self._load_sasimage(run, f))
+
+        if image_fname is not None:
+            return stats_of(image_fname)
+        return {
+            fname: stats_of(fname)
+            for fname in self.get_file_names(run, 'image_files')
+        }
+
 
 class Playground(Experiment):
     def __init__(self):
@@ -323,6 +923,7 @@ class Project(object):
         else:
             name = os.path.basename(os.path.splitext(config_file)[0])
         self._exp_instance[name] = PrimusExperiment(config, name=name)
+        return name
 
     def get_all_setup(self, experiment):
         return self.get(experiment).registered_setup.values()
@@ -336,6 +937,12 @@ class Warehouse(object):
         playground_save_dir = './'
         self._exp_instance = {'playground': Playground()}
         self._prj_instance = {}
+        # warms caches of runs in background
+        self._prefetcher = Prefetcher()
+        # follow new runs and files of experiments, see `watch`
+        self._watchers = {}
+        self._watch_dirs = {}
+        self._listeners = []
 
     def get(self, project=None):
         if project is None:  # FIXME: remove this
@@ -358,11 +965,82 @@ class Warehouse(object):
             self._prj_instance[name] = Project(name)
 
     def append_experiment(self, project, config_file, name=None):
-        self.get(project).append_experiment(config_file, name)
+        name = self.get(project).append_experiment(config_file, name)
+        self.watch(project, name)
+        self.prefetch(project, name)
+
+    def add_listener(self, func):
+        """Call `func(project, experiment, event)` on every change found by
+        watchers, see `Experiment.update` for events."""
+        self._listeners.append(func)
+
+    def watch(self, project, experiment):
+        """Watch runs and data files of experiment in background, so new
+        runs are registered, caches of changed data are dropped and
+        prefetched again. Disabled by `watch: false` in experiment config.
+        Directories are polled every `watch_interval` seconds instead of
+        using inotify if the root is on a network filesystem, where inotify
+        misses writes of other hosts, or if `watch_polling` is true
+        (`watch_polling: false` forces inotify)."""
+        exp = self.get(project).get(experiment)
+        key = (project, experiment)
+        if not exp.config.get('watch', True) or key in self._watchers:
+            return
+        polling = exp.config.get('watch_polling')
+        if polling is None:
+            polling = is_network_filesystem(exp.config['root_path'])
+        watcher = DirectoryWatcher(
+            lambda changed: self._apply_changes(project, experiment, changed),
+            poll_interval=exp.config.get('watch_interval',
+                                         DEFAULT_POLL_INTERVAL),
+            use_inotify=not polling,
+        )
+        self._watchers[key] = watcher
+        self._watch_dirs[key] = set(exp.get_watch_dirs())
+        watcher.watch(self._watch_dirs[key])
+        watcher.start()
+
+    def unwatch(self, project, experiment):
+        watcher = self._watchers.pop((project, experiment), None)
+        if watcher is not None:
+            watcher.stop()
+            self._watch_dirs.pop((project, experiment), None)
+
+    def _apply_changes(self, project, experiment, changed_dirs):
+        exp = self.get(project).get(experiment)
+        key = (project, experiment)
+        events = exp.update(changed_dirs)
+        if any(kind != 'changed' for kind, _, _ in events):
+            watch_dirs = set(exp.get_watch_dirs())
+            self._watchers[key].unwatch(self._watch_dirs[key] - watch_dirs)
+            self._watch_dirs[key] = watch_dirs
+        # recreated directories are watched again
+        self._watchers[key].watch(self._watch_dirs[key])
+        for event in events:
+            for listener in self._listeners:
+                listener(project, experiment, event)
+        runs = {run for kind, run, _ in events if kind != 'removed'}
+        for run in sorted(runs):
+            exp.prefetch(self._prefetcher, run)
+
+    def prefetch(self, project, experiment, run=None):
+        return self.get(project).get(experiment).prefetch(
+            self._prefetcher, run)
+
+    def get_prefetch_stats(self):
+        return self._prefetcher.stats()
 
     def get_prev_next(self, project, experiment, run):
         return self.get(project).get_prev_next(experiment, run)
 
+    def query_runs(self, project, experiment, filters=None, sort_by=None,
+                   descending=False, offset=0, limit=None):
+        return self.get(project).get(experiment).query_runs(
+            filters, sort_by, descending, offset, limit)
+
+    def set_setup(self, project, experiment, run, setup):
+        return self.get(project).get(experiment).set_setup(run, setup)
+
     def get_all_setup(self, project, experiment):
         return self.get(project).get_all_setup(experiment)
 
@@ -373,20 +1051,50 @@ class Warehouse(object):
     def get_sasprofile(self, project, experiment, run):
         return self.get(project).get(experiment).get_sasprofile(run)
 
+    def get_profile_series(self, project, experiment, run):
+        return self.get(project).get(experiment).get_profile_series(run)
+
+    def iter_profiles(self, project, experiment, run, chunk=256, start=0):
+        return self.get(project).get(experiment).iter_profiles(run, chunk, start)
+
+    def get_guinier_series(self, project, experiment, run, q_range=None):
+        return self.get(project).get(experiment).get_guinier_series(run, q_range)
+
     def get_gnom(self, project, experiment, run):
         return self.get(project).get(experiment).get_gnom(run)
 
     def get_raw_cfg_param(self, project, experiment, run, key):
         return self.get(project).get(experiment).get_raw_cfg_param(run, key)
 
+    def get_radial_integrator(self, project, experiment, run):
+        return self.get(project).get(experiment).get_radial_integrator(run)
+
     def get_files(self, project, experiment, run, file_type):
         return self.get(project).get(experiment).get_files(run, file_type)
 
+    def get_file_names(self, project, experiment, run, file_type):
+        return self.get(project).get(experiment).get_file_names(run, file_type)
+
+    def get_file_states(self, project, experiment, run, file_type):
+        return self.get(project).get(experiment).get_file_states(run, file_type)
+
     def get_sasimage(self, project, experiment, run, image_fname):
         return self.get(project).get(experiment).get_sasimage(run, image_fname)
 
+    def get_integrated_profiles(self, project, experiment, run):
+        return self.get(project).get(experiment).get_integrated_profiles(run)
+
+    def get_image_stats(self, project, experiment, run, image_fname=None):
+        return self.get(project).get(experiment).get_image_stats(run, image_fname)
+
     def get_cormap_heatmap(self, project, experiment, run, heatmap_type):
         return self.get(project).get(experiment).get_cormap_heatmap(run, heatmap_type)
 
+    def get_run_version(self, project, experiment, run):
+        return self.get(project).get(experiment).get_run_version(run)
+
+    def get_cache_stats(self, project, experiment):
+        return self.get(project).get(experiment).get_cache_stats()
+
 
 warehouse = Warehouse()
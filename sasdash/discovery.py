@@ -0,0 +1,161 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from sasdash.cache import DEFAULT_CACHE_DIRNAME, _atomic_write
+
+SETUP_FILENAME = 'setup.yml'
+# data directories of runs never hold runs, so they are not scanned
+PRUNED_DIRS = frozenset(('Data', 'Subtracted', 'GNOM', DEFAULT_CACHE_DIRNAME))
+# number of threads scanning top-level directories of a root
+DEFAULT_DISCOVERY_WORKERS = 8
+
+_INDEX_FORMAT = 1
+
+
+def _read_index(index_file):
+    """Return {dir_path: [mtime_ns, setup file name or None, subdirs]}."""
+    if index_file is None:
+        return {}
+    try:
+        with open(index_file, 'r') as fstream:
+            index = json.load(fstream)
+    except (OSError, ValueError):
+        return {}
+    if index.get('format') != _INDEX_FORMAT:
+        return {}
+    return index['dirs']
+
+
+def _write_index(index_file, dirs):
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        _atomic_write(
+            index_file,
+            lambda f: f.write(json.dumps({
+                'format': _INDEX_FORMAT,
+                'dirs': dirs,
+            }).encode('utf-8')))
+    except OSError as err:
+        # read-only root, scan again next time
+        print('Failed to save directory index {}: {}'.format(index_file, err))
+
+
+def _list_dir(dir_path, prune):
+    """Return setup file name (or None) and subdirectories to descend."""
+    setup = None
+    subdirs = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                # symbolic links to directories are not followed, as os.walk
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name not in prune:
+                    subdirs.append(entry.name)
+            elif entry.name.lower() == SETUP_FILENAME:
+                setup = entry.name
+    subdirs.sort()
+    return setup, subdirs
+
+
+def _scan_tree(top, prune, old_index, new_index):
+    """Scan `top` depth first, listing only directories whose mtime
+    differs from `old_index`, and record them in `new_index`. Return
+    number of listed directories."""
+    n_listed = 0
+    stack = [top]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+            entry = old_index.get(dir_path)
+            if entry is not None and entry[0] == mtime:
+                _, setup, subdirs = entry
+            else:
+                setup, subdirs = _list_dir(dir_path, prune)
+                n_listed += 1
+        except OSError:
+            continue  # removed while scanning or not readable
+        new_index[dir_path] = [mtime, setup, subdirs]
+        stack.extend(
+            os.path.join(dir_path, name) for name in reversed(subdirs))
+    return n_listed
+
+
+def scan_tree(root_path, prune=PRUNED_DIRS, index_file=None,
+              max_workers=DEFAULT_DISCOVERY_WORKERS):
+    """Return directory index of `root_path`.
+
+    Directories named in `prune` are skipped. Top-level directories are
+    scanned in parallel. If `index_file` is given, the index is kept in
+    it, and only directories whose mtime changed since are listed again,
+    the others are only stat-ed.
+
+    Parameters
+    ----------
+    root_path : str
+        root directory of experiment
+    prune : set of str, optional
+        names of directories which are not scanned (the default is
+        `PRUNED_DIRS`).
+    index_file : str, optional
+        path of persistent directory index (the default is None, which
+        scans the whole tree).
+    max_workers : int, optional
+        number of scanning threads.
+
+    Returns
+    -------
+    dict
+        {dir_path: [mtime_ns, setup file name or None, subdirectories]}
+        of all scanned directories.
+    """
+    root_path = os.path.abspath(root_path)
+    old_index = _read_index(index_file)
+    new_index = {}
+    n_listed = 0
+    try:
+        mtime = os.stat(root_path).st_mtime_ns
+        entry = old_index.get(root_path)
+        if entry is not None and entry[0] == mtime:
+            _, setup, subdirs = entry
+        else:
+            setup, subdirs = _list_dir(root_path, prune)
+            n_listed += 1
+    except OSError:
+        return {}
+    new_index[root_path] = [mtime, setup, subdirs]
+
+    tops = [os.path.join(root_path, name) for name in subdirs]
+    sub_indices = [{} for _ in tops]
+    with ThreadPoolExecutor(max(1, min(max_workers, len(tops)))) as executor:
+        n_listed += sum(executor.map(
+            lambda args: _scan_tree(args[0], prune, old_index, args[1]),
+            zip(tops, sub_indices)))
+    for sub_index in sub_indices:
+        new_index.update(sub_index)
+
+    if index_file is not None and (n_listed or new_index != old_index):
+        _write_index(index_file, new_index)
+    return new_index
+
+
+def find_setup_files(root_path, prune=PRUNED_DIRS, index_file=None,
+                     max_workers=DEFAULT_DISCOVERY_WORKERS):
+    """Return sorted (dir_path, setup_file) pairs of directories under
+    `root_path` holding a setup.yml, see `scan_tree` for parameters."""
+    return setup_files(
+        scan_tree(root_path, prune, index_file, max_workers))
+
+
+def setup_files(index):
+    """Return sorted (dir_path, setup_file) pairs of directory index."""
+    return sorted(
+        (dir_path, os.path.join(dir_path, setup))
+        for dir_path, (_, setup, _) in index.items()
+        if setup is not None)
@@ -0,0 +1,105 @@
+from __future__ import print_function, division, absolute_import
+
+import queue
+import itertools
+import threading
+
+# number of background threads warming caches
+DEFAULT_PREFETCH_WORKERS = 2
+# maximum number of pending tasks, further tasks are dropped
+DEFAULT_PREFETCH_QUEUE_SIZE = 1024
+# number of most recently modified runs of an experiment prefetched
+DEFAULT_PREFETCH_RUNS = 8
+
+
+class Prefetcher(object):
+    """Bounded priority queue of background tasks run by daemon threads.
+
+    Tasks with lower priority numbers run first, tasks of same priority in
+    submission order. A task whose key is already pending is not queued
+    again, and tasks submitted to a full queue are dropped: prefetching
+    only warms caches, so the page loads what is missing on demand.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        number of worker threads (the default is
+        `DEFAULT_PREFETCH_WORKERS`).
+    max_queue_size : int, optional
+        maximum number of pending tasks (the default is
+        `DEFAULT_PREFETCH_QUEUE_SIZE`).
+    """
+
+    def __init__(self, max_workers=DEFAULT_PREFETCH_WORKERS,
+                 max_queue_size=DEFAULT_PREFETCH_QUEUE_SIZE):
+        self._max_workers = max_workers
+        self._queue = queue.PriorityQueue(max_queue_size)
+        self._counter = itertools.count()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._counters = dict.fromkeys(
+            ('submitted', 'dropped', 'done', 'failed'), 0)
+
+    def _start_workers(self):
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name='sasdash-prefetch-{}'.format(len(self._workers)),
+            )
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            _, _, key, func = self._queue.get()
+            result = None
+            try:
+                func()
+            except Exception as err:
+                print('Prefetching {} failed: {}'.format(key, err))
+                result = 'failed'
+            else:
+                result = 'done'
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                    if result is not None:
+                        self._counters[result] += 1
+                self._queue.task_done()
+
+    def submit(self, key, func, priority=0):
+        """Queue `func()` under hashable `key`.
+
+        Returns
+        -------
+        bool
+            True if the task is queued or already pending, False if it is
+            dropped because the queue is full.
+        """
+        with self._lock:
+            if key in self._pending:
+                return True
+            try:
+                self._queue.put_nowait(
+                    (priority, next(self._counter), key, func))
+            except queue.Full:
+                self._counters['dropped'] += 1
+                return False
+            self._pending.add(key)
+            self._counters['submitted'] += 1
+            self._start_workers()
+        return True
+
+    def join(self):
+        """Block until all queued tasks are done."""
+        self._queue.join()
+
+    def stats(self):
+        """Return dict of submitted, dropped, done, failed and pending
+        tasks."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        return stats
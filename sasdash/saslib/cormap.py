@@ -1,7 +1,12 @@
 from __future__ import print_function, division, absolute_import
 
+import os
 import os.path
 import re
+import copy
+import tempfile
+import threading
+from functools import lru_cache
 
 import numpy as np
 from scipy.spatial.distance import squareform
@@ -38,6 +43,12 @@ def get_datcmp_info(scattering_curve_files):
     cmd = r'datcmp {}'.format(scattering_curve_files)
 
     log = run_system_command(cmd, shell=True)
+    return parse_datcmp_log(log)
+
+
+def parse_datcmp_log(log):
+    """Return (pair_frames, C, Pr(>C), adj Pr(>C)) of DATCMP output, see
+    `get_datcmp_info`."""
     # define a dictionary to store the data produced from DATCMP - this
     # value will be overwritten.
     pair_frames = []
@@ -63,7 +74,8 @@ def get_datcmp_info(scattering_curve_files):
     )
 
 
-def calc_cormap_heatmap(file_list):
+def calc_datcmp_heatmap(file_list):
+    """Return CorMap heatmaps computed by ATSAS `datcmp`."""
     # heatmap_type options: 'C', 'Pr(>C)', 'adj Pr(>C)'
     # file_list = self.get_files(exp, 'subtracted_files')
     file_pattern = common_prefix(file_list)
@@ -78,3 +90,295 @@ def calc_cormap_heatmap(file_list):
     cormap_heatmap['Pr(>C)'] = squareform(p_values) + eye_matrix
     cormap_heatmap['adj Pr(>C)'] = squareform(adjp_values) + eye_matrix
     return cormap_heatmap
+
+
+# ====================== Native CorMap ========================== #
+# Correlation Map test, see Franke, Jeffries & Svergun (2015),
+# Nature Methods 12, 419-422. The probability of the longest run follows
+# Schilling (1990), The College Mathematics Journal 21(3), 196-207.
+
+# Longer runs than log2(n) + _MAX_EXTRA_RUN have Pr < 2**-60, taken as 0.
+_MAX_EXTRA_RUN = 64
+
+
+@lru_cache()
+def longest_run_pvalues(n):
+    """Return Pr(>C) for C = 0..n, i.e. probability of the longest run of
+    either heads or tails in `n` fair coin tosses being at least C long.
+
+    Parameters
+    ----------
+    n : int
+        number of tosses (points in profile)
+
+    Returns
+    -------
+    numpy.ndarray
+        read-only array of length n + 1
+    """
+    # q[m, c]: probability of a head run longer than c in m tosses, by
+    # Schilling's recursion on the counts A(m, c) = 2A(m-1, c) - A(m-c-2, c)
+    # written for q = 1 - A / 2**m.
+    n_toss = max(n - 1, 0)
+    n_run = int(min(n_toss, np.log2(max(n, 1)) + _MAX_EXTRA_RUN)) + 1
+    c = np.arange(n_run)
+    weight = 0.5**(c + 2)
+    q = np.zeros((n_toss + 1, n_run))
+    for m in range(1, n_toss + 1):
+        lag = m - c - 2
+        valid = lag >= 0
+        q[m, valid] = q[m - 1, valid] + (
+            1.0 - q[lag[valid], c[valid]]) * weight[valid]
+        first = lag == -1  # m == c + 1
+        q[m, first] = 2.0 * weight[first]
+
+    # longest run of either kind in n tosses is at least C
+    # <=> head run longer than C - 2 in the n - 1 "same as previous" tosses
+    pvalues = np.zeros(n + 1)
+    pvalues[:2] = 1.0
+    upper = min(n + 1, n_run + 2)
+    pvalues[2:upper] = q[n_toss, :upper - 2]
+    pvalues.flags.writeable = False
+    return pvalues
+
+
+def longest_run(diff):
+    """Return length of the longest run of the same sign along last axis.
+
+    Parameters
+    ----------
+    diff : numpy.ndarray
+        (..., n) array, e.g. difference between profiles
+
+    Returns
+    -------
+    numpy.ndarray
+        int array with shape (...)
+    """
+    positive = np.asarray(diff) > 0
+    n = positive.shape[-1]
+    if n == 0:
+        return np.zeros(positive.shape[:-1], dtype=int)
+    position = np.arange(n)
+    run_start = np.empty(positive.shape, dtype=bool)
+    run_start[..., 0] = True
+    run_start[..., 1:] = positive[..., 1:] != positive[..., :-1]
+    last_start = np.maximum.accumulate(
+        np.where(run_start, position, 0), axis=-1)
+    return (position - last_start + 1).max(axis=-1)
+
+
+def adjust_pvalues(pvalues, method='bonferroni'):
+    """Correct p-values of multiple comparisons.
+
+    Parameters
+    ----------
+    pvalues : numpy.ndarray
+        1D array of p-values
+    method : str
+        'bonferroni', 'holm' (Holm-Bonferroni) or None for no correction
+    """
+    pvalues = np.asarray(pvalues, dtype=float)
+    n = pvalues.size
+    if method is None or n == 0:
+        return pvalues.copy()
+    elif method == 'bonferroni':
+        return np.minimum(pvalues * n, 1.0)
+    elif method == 'holm':
+        order = np.argsort(pvalues, kind='mergesort')
+        adjusted = np.maximum.accumulate(pvalues[order] * (n - np.arange(n)))
+        result = np.empty(n)
+        result[order] = np.minimum(adjusted, 1.0)
+        return result
+    else:
+        raise ValueError('Unknown adjustment method: %s' % method)
+
+
+def _cormap_rows(intensity, known, new, start, stop):
+    """Return C of new[start:stop] against known frames and later new
+    frames, so that every pair is compared once."""
+    return [
+        longest_run(intensity[np.concatenate((known, new[j + 1:]))] -
+                    intensity[new[j]]) for j in range(start, stop)
+    ]
+
+
+def _cormap_tile(profile_file, known, new, start, stop):
+    """Worker of `_cormap_rows` reading profiles from a memory-mapped
+    `.npy` file, which is shared by all workers through the page cache."""
+    intensity = np.load(profile_file, mmap_mode='r')
+    return _cormap_rows(intensity, known, new, start, stop)
+
+
+def _split_tiles(known, new, n_tiles):
+    """Split rows of new frames into tiles with similar number of pairs."""
+    n_pairs = known.size + new.size - 1 - np.arange(new.size)
+    bounds = np.searchsorted(
+        np.cumsum(n_pairs),
+        np.linspace(0, n_pairs.sum(), n_tiles + 1)[1:-1]) + 1
+    bounds = np.unique(np.concatenate(([0], bounds, [new.size])))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def calc_cormap_heatmap(intensity, adjust='bonferroni'):
+    """Return CorMap heatmaps of all frame pairs.
+
+    Parameters
+    ----------
+    intensity : numpy.ndarray
+        (n_frames, n_q) matrix of profiles on the same q grid
+    adjust : str, optional
+        correction of p-values for multiple comparisons, see
+        `adjust_pvalues` (the default is 'bonferroni').
+
+    Returns
+    -------
+    dict
+        (n_frames, n_frames) matrices with keys 'C', 'Pr(>C)' and
+        'adj Pr(>C)'
+    """
+    store = CorMapStore(adjust=adjust)
+    store.update(intensity)
+    return store.get_heatmap()
+
+
+class CorMapStore(object):
+    """Pairwise CorMap results of a growing series of frames.
+
+    Only the frames which were not seen before (identified by `keys`, e.g.
+    (filename, mtime_ns, size) so that a rewritten file is compared again)
+    are compared against the others in `update`, so a new frame costs
+    O(n_frames) comparisons instead of O(n_frames**2). All heatmap types
+    are derived from the same C matrix.
+
+    Parameters
+    ----------
+    adjust : str, optional
+        correction of p-values for multiple comparisons, see
+        `adjust_pvalues` (the default is 'bonferroni').
+    """
+
+    def __init__(self, adjust='bonferroni'):
+        self._adjust = adjust
+        self._keys = []
+        self._n_q = None
+        self._c_matrix = np.zeros((0, 0), dtype=np.int32)
+        self._heatmap = None
+        self._lock = threading.Lock()
+
+    @property
+    def keys(self):
+        return self._keys
+
+    @property
+    def c_matrix(self):
+        return self._c_matrix
+
+    def copy(self):
+        """Return a copy which can be updated while this store is still
+        read. Arrays are shared, `update` never modifies them in place."""
+        with self._lock:
+            other = copy.copy(self)
+        other._lock = threading.Lock()
+        return other
+
+    def update(self, intensity, keys=None, executor=None, n_tiles=None):
+        """Compare new frames in `intensity` against all frames.
+
+        Parameters
+        ----------
+        intensity : numpy.ndarray
+            (n_frames, n_q) matrix of all current frames
+        keys : list, optional
+            unique identifier of each frame and its content (the default
+            is None, which uses frame index, i.e. frames are only ever
+            appended). Rows and columns of frames with a key not seen
+            before are computed again.
+        executor : concurrent.futures.Executor, optional
+            pool to compute tiles of the pair matrix in parallel (the
+            default is None, which computes serially).
+        n_tiles : int, optional
+            number of tiles for `executor` (the default is None, which is
+            four times the number of CPUs).
+
+        Returns
+        -------
+        int
+            number of newly compared frames
+        """
+        intensity = np.asarray(intensity, dtype=float)
+        n_frames, n_q = intensity.shape
+        keys = list(range(n_frames)) if keys is None else list(keys)
+        with self._lock:
+            if keys == self._keys and n_q == self._n_q:
+                return 0
+            if n_q != self._n_q:  # different q grid, nothing to reuse
+                self._keys = []
+            old_idx = {key: i for i, key in enumerate(self._keys)}
+            idx = np.array([old_idx.get(key, -1) for key in keys], dtype=int)
+            known = np.flatnonzero(idx >= 0)
+            new = np.flatnonzero(idx < 0)
+
+            c_matrix = np.zeros((n_frames, n_frames), dtype=np.int32)
+            c_matrix[np.ix_(known, known)] = self._c_matrix[np.ix_(
+                idx[known], idx[known])]
+            if executor is None or new.size < 2:
+                c_rows = _cormap_rows(intensity, known, new, 0, new.size)
+            else:
+                c_rows = self._calc_parallel(intensity, known, new, executor,
+                                             n_tiles or 4 * os.cpu_count())
+            for j, (i, c_values) in enumerate(zip(new, c_rows)):
+                targets = np.concatenate((known, new[j + 1:]))
+                c_matrix[i, targets] = c_values
+                c_matrix[targets, i] = c_values
+
+            self._keys = keys
+            self._n_q = n_q
+            self._c_matrix = c_matrix
+            self._heatmap = None
+            return new.size
+
+    @staticmethod
+    def _calc_parallel(intensity, known, new, executor, n_tiles):
+        # profiles are written once to a memory-mapped file instead of
+        # being pickled for every tile
+        shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        fd, profile_file = tempfile.mkstemp(suffix='.npy', dir=shm_dir)
+        try:
+            with os.fdopen(fd, 'wb') as fstream:
+                np.save(fstream, intensity)
+            futures = [
+                executor.submit(_cormap_tile, profile_file, known, new, start,
+                                stop)
+                for start, stop in _split_tiles(known, new, n_tiles)
+            ]
+            return [c_values for f in futures for c_values in f.result()]
+        finally:
+            os.remove(profile_file)
+
+    def get_heatmap(self, heatmap_type=None):
+        """Return dict of all heatmaps or the one of `heatmap_type`
+        ('C', 'Pr(>C)', 'adj Pr(>C)')."""
+        with self._lock:
+            if self._heatmap is None:
+                self._heatmap = self._calc_heatmap()
+            heatmap = self._heatmap
+        if heatmap_type is None:
+            return heatmap
+        return heatmap[heatmap_type]
+
+    def _calc_heatmap(self):
+        n_frames = self._c_matrix.shape[0]
+        pvalues = longest_run_pvalues(self._n_q or 0)
+        upper = np.triu_indices(n_frames, k=1)
+        adjp_values = adjust_pvalues(
+            pvalues[self._c_matrix[upper]], self._adjust)
+        adjp_matrix = np.zeros((n_frames, n_frames))
+        adjp_matrix[upper] = adjp_values
+        adjp_matrix += adjp_matrix.T
+        eye_matrix = np.eye(n_frames)
+        return {
+            'C': self._c_matrix,
+            'Pr(>C)': pvalues[self._c_matrix] * (1.0 - eye_matrix) + eye_matrix,
+            'adj Pr(>C)': adjp_matrix + eye_matrix,
+        }
@@ -0,0 +1,388 @@
+from __future__ import print_function, division, absolute_import
+
+import copy
+
+import numpy as np
+
+from .measurement import DataNotCompatible
+
+# constraints of Guinier approximation for globular particles
+DEFAULT_QRG_MIN = 1.0  # upper limit of qmin * Rg
+DEFAULT_QRG_MAX = 1.3  # upper limit of qmax * Rg
+
+_SERIES_FIELDS = ('rg', 'rg_err', 'i0', 'i0_err', 'r_squared')
+
+
+def _guinier_data(q, intensity, err=None):
+    """Return x = q^2, y = ln(I) and weights 1 / sigma_y^2 of Guinier plot,
+    where sigma_y = err / I (unit weights if `err` is None). Points with
+    non-positive intensity or error get zero weight."""
+    q = np.asarray(q, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    valid = (intensity > 0) & np.isfinite(intensity)
+    if err is not None:
+        err = np.broadcast_to(np.asarray(err, dtype=float), intensity.shape)
+        valid &= (err > 0) & np.isfinite(err)
+    x = np.square(q)
+    y = np.zeros_like(intensity)
+    weight = np.zeros_like(intensity)
+    y[valid] = np.log(intensity[valid])
+    if err is not None:
+        weight[valid] = np.square(intensity[valid] / err[valid])
+    else:
+        weight[valid] = 1.0
+    return x, y, weight
+
+
+def _cumulative_sums(x, y, weight):
+    """Return cumulative sums (along last axis, with a leading 0) of w, w*x,
+    w*y, w*x^2, w*x*y, w*y^2 and number of points, with x scaled by
+    `x_scale` and y shifted by `y_shift` for numerical stability."""
+    x_scale = np.max(x) if np.max(x) > 0 else 1.0
+    # ln(I) of first valid point of each profile
+    first = np.argmax(weight > 0, axis=-1)[..., None]
+    y_shift = np.take_along_axis(y, first, axis=-1)
+    xs = np.broadcast_to(x / x_scale, y.shape)
+    ys = np.where(weight > 0, y - y_shift, 0.0)
+    zeros = np.zeros(y.shape[:-1] + (1,))
+    sums = [
+        np.concatenate((zeros, np.cumsum(values, axis=-1)), axis=-1)
+        for values in (weight, weight * xs, weight * ys, weight * xs * xs,
+                       weight * xs * ys, weight * ys * ys, weight > 0)
+    ]
+    return sums, x_scale, y_shift[..., 0]
+
+
+def _solve(sw, sx, sy, sxx, sxy, syy):
+    """Weighted least squares of y = b + k * x from weighted sums.
+
+    All arguments are arrays of the same shape, one element per fit, so
+    any number of fits are solved at once. Returns (k, b, var_k, var_b,
+    chi2) with variances from the weights.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = sw * sxx - sx * sx
+        k = (sw * sxy - sx * sy) / delta
+        b = (sxx * sy - sx * sxy) / delta
+        var_k = sw / delta
+        var_b = sxx / delta
+        chi2 = (syy - 2.0 * b * sy - 2.0 * k * sxy + b * b * sw +
+                2.0 * b * k * sx + k * k * sxx)
+    return k, b, var_k, var_b, np.maximum(chi2, 0.0)
+
+
+def _fit_windows(sums, x_scale, y_shift, start, stop, absolute_sigma=True):
+    """Fit windows [start, stop) of cumulative sums. Returns dict of arrays
+    of Rg, I0, their errors, R^2, reduced chi^2, number of points and the
+    slope of Guinier plot."""
+    def window_sum(c):
+        c = np.broadcast_to(c, start.shape + c.shape[-1:])
+        return (np.take_along_axis(c, stop[..., None], axis=-1) -
+                np.take_along_axis(c, start[..., None], axis=-1))[..., 0]
+
+    sw, sx, sy, sxx, sxy, syy, count = map(window_sum, sums)
+    k, b, var_k, var_b, chi2 = _solve(sw, sx, sy, sxx, sxy, syy)
+    # rounding leaves delta slightly off zero for less than 2 points
+    k, b, var_k, var_b = (np.where(count < 2, np.nan, val)
+                          for val in (k, b, var_k, var_b))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduced_chi2 = chi2 / (count - 2)
+        if not absolute_sigma:
+            # unknown errors: estimate them from residuals
+            var_k = var_k * reduced_chi2
+            var_b = var_b * reduced_chi2
+        r_squared = 1.0 - chi2 / (syy - sy * sy / sw)
+        rg = np.sqrt(-3.0 * k / x_scale)
+        rg_err = 1.5 / rg * np.sqrt(var_k) / x_scale
+        i0 = np.exp(b + y_shift)
+        i0_err = i0 * np.sqrt(var_b)
+    return {
+        'rg': rg,
+        'rg_err': rg_err,
+        'i0': i0,
+        'i0_err': i0_err,
+        'r_squared': r_squared,
+        'reduced_chi2': reduced_chi2,
+        'n_points': count.astype(int),
+        'slope': k / x_scale,
+    }
+
+
+def fit_guinier(q, intensity, err=None, qmin_idx=0, qmax_idx=None):
+    """Weighted linear fit of Guinier plot, ln(I) = ln(I0) - Rg^2 / 3 q^2,
+    over q range [qmin_idx, qmax_idx).
+
+    The fit is solved in closed form from weighted sums, with weights
+    (I / err)^2 from error propagation of ln(I). Errors of Rg and I0 are
+    propagated from the covariance of the fit. Many profiles and ranges
+    are fitted at once by broadcasting `intensity` (n_profiles, n_q),
+    `err`, `qmin_idx` and `qmax_idx`.
+
+    Parameters
+    ----------
+    q : numpy.ndarray
+        1D array of q shared by all profiles
+    intensity : numpy.ndarray
+        intensity, 1D or 2D with one profile per row
+    err : numpy.ndarray, optional
+        errors of intensity (the default is None, which fits with unit
+        weights and estimates errors from residuals).
+    qmin_idx, qmax_idx : int or array of int, optional
+        q range of fits, `qmax_idx` is exclusive (the default is the whole
+        profile).
+
+    Returns
+    -------
+    dict
+        'rg', 'rg_err', 'i0', 'i0_err', 'qrg_min', 'qrg_max', 'r_squared',
+        'reduced_chi2' and 'n_points', as float for a single fit or as
+        arrays for many. Rg is NaN if the slope is positive.
+    """
+    q = np.asarray(q, dtype=float)
+    intensity = np.asarray(intensity, dtype=float)
+    if qmax_idx is None:
+        qmax_idx = q.size
+    shape = np.broadcast_shapes(intensity.shape[:-1], np.shape(qmin_idx),
+                                np.shape(qmax_idx))
+    start = np.broadcast_to(np.asarray(qmin_idx, dtype=int), shape)
+    stop = np.broadcast_to(np.asarray(qmax_idx, dtype=int), shape)
+    if np.any(start < 0) or np.any(stop > q.size) or np.any(stop <= start):
+        raise ValueError('Invalid q range.')
+
+    # points beyond all ranges are not needed
+    n_points = int(np.max(stop))
+    if err is not None:
+        err = np.asarray(err, dtype=float)[..., :n_points]
+    x, y, weight = _guinier_data(q[:n_points], intensity[..., :n_points], err)
+    sums, x_scale, y_shift = _cumulative_sums(x, y, weight)
+    y_shift = np.broadcast_to(y_shift, shape)
+    result = _fit_windows(sums, x_scale, y_shift, start, stop,
+                          absolute_sigma=err is not None)
+    del result['slope']
+    result['qrg_min'] = q[start] * result['rg']
+    result['qrg_max'] = q[stop - 1] * result['rg']
+    if not shape:
+        return {key: val.item() for key, val in result.items()}
+    return result
+
+
+def autorg(q, intensity, err, min_points=10, max_points=200,
+           qrg_min=DEFAULT_QRG_MIN, qrg_max=DEFAULT_QRG_MAX):
+    """Search the best Guinier range of a profile automatically.
+
+    Every window [qmin_idx, qmax_idx) within the first `max_points` points
+    is fitted at once: sums needed by weighted linear regression of ln(I)
+    against q^2 are differences of cumulative sums. Windows are kept if
+    Rg is real, qmin * Rg < `qrg_min` and qmax * Rg < `qrg_max`, then
+    scored like RAW's autorg by qmax * Rg, qmin * Rg, relative errors of Rg
+    and I0, R^2 and number of points.
+
+    Parameters
+    ----------
+    q, intensity, err : numpy.ndarray
+        1D profile
+    min_points : int, optional
+        minimum number of points in a window (the default is 10).
+    max_points : int, optional
+        only windows within the first `max_points` points are searched
+        (the default is 200).
+    qrg_min, qrg_max : float, optional
+        upper limits of qmin * Rg and qmax * Rg.
+
+    Returns
+    -------
+    dict or None
+        'rg', 'rg_err', 'i0', 'i0_err', 'qmin_idx', 'qmax_idx' (exclusive),
+        'qrg_min', 'qrg_max', 'r_squared' and 'quality' of the best window,
+        or None if no window satisfies the constraints.
+    """
+    n_points = min(len(q), max_points)
+    if n_points < min_points:
+        return None
+    q = np.asarray(q, dtype=float)[:n_points]
+    x, y, weight = _guinier_data(q, intensity[:n_points], err[:n_points])
+    sums, x_scale, y_shift = _cumulative_sums(x, y, weight)
+    start, stop = np.triu_indices(n_points + 1, k=min_points)
+    fit = _fit_windows(sums, x_scale, y_shift, start, stop)
+    rg, rg_err, i0, i0_err = fit['rg'], fit['rg_err'], fit['i0'], fit['i0_err']
+    r_squared, count = fit['r_squared'], fit['n_points']
+
+    qrg_lo = q[start] * rg
+    qrg_hi = q[stop - 1] * rg
+    with np.errstate(invalid='ignore'):
+        candidate = ((count >= min_points) & (fit['slope'] < 0)
+                     & np.isfinite(rg_err) & np.isfinite(i0_err)
+                     & (qrg_lo < qrg_min) & (qrg_hi < qrg_max))
+    if not np.any(candidate):
+        return None
+
+    idx = np.flatnonzero(candidate)
+    quality = (
+        (1.0 - np.abs(qrg_hi[idx] - qrg_max) / qrg_max)
+        + (1.0 - qrg_lo[idx])
+        + np.clip(1.0 - rg_err[idx] / rg[idx], 0.0, 1.0)
+        + np.clip(1.0 - i0_err[idx] / i0[idx], 0.0, 1.0)
+        + np.clip(r_squared[idx], 0.0, 1.0)**4
+        + count[idx] / n_points
+    ) / 6.0
+    best = idx[np.argmax(quality)]
+    return {
+        'rg': float(rg[best]),
+        'rg_err': float(rg_err[best]),
+        'i0': float(i0[best]),
+        'i0_err': float(i0_err[best]),
+        'qmin_idx': int(start[best]),
+        'qmax_idx': int(stop[best]),
+        'qrg_min': float(qrg_lo[best]),
+        'qrg_max': float(qrg_hi[best]),
+        'r_squared': float(r_squared[best]),
+        'quality': float(np.max(quality)),
+    }
+
+
+class GuinierSeries(object):
+    """Rg, I0, their errors and integrated intensity of every frame of a
+    run, e.g. along the elution of SEC-SAXS, updated as frames arrive.
+
+    All frames are fitted over the same q range. Unless given, the range
+    is found by `autorg` on the frame of highest integrated intensity and
+    all frames are refitted when that range changes. Only the first
+    `max_points` points of each frame are kept for refitting.
+
+    Parameters
+    ----------
+    qmin_idx, qmax_idx : int, optional
+        fixed q range, `qmax_idx` is exclusive (the default is None, which
+        uses range found by `autorg`). `qmax_idx` is clipped to the
+        points kept of each frame.
+    max_points : int, optional
+        number of points kept from each frame (the default is 200).
+    """
+
+    def __init__(self, qmin_idx=None, qmax_idx=None, max_points=200):
+        if (qmin_idx is None) != (qmax_idx is None):
+            raise ValueError('Both qmin_idx and qmax_idx are required.')
+        self._fixed_range = qmax_idx is not None
+        self._q_range = None
+        self._max_points = max_points
+        if self._fixed_range:
+            self._q_range = self._clip_range(qmin_idx, qmax_idx, max_points)
+        self._keys = []
+        self._q = None
+        self._intensity = np.empty((0, 0))
+        self._err = np.empty((0, 0))
+        self._total = np.empty(0)
+        self._ref_idx = None
+        self._fits = {key: np.empty(0) for key in _SERIES_FIELDS}
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _clip_range(qmin_idx, qmax_idx, n_points):
+        """Clip fixed q range to the `n_points` points kept of frames."""
+        qmax_idx = min(qmax_idx, n_points)
+        if qmax_idx - qmin_idx < 2:
+            raise ValueError(
+                'q range [{}, {}) needs at least 2 of the first {} points '
+                'kept of each frame.'.format(qmin_idx, qmax_idx, n_points))
+        return qmin_idx, qmax_idx
+
+    @property
+    def keys(self):
+        return list(self._keys)
+
+    def copy(self):
+        """Return a copy which can be updated while this series is still
+        read. Arrays are shared, `update` never modifies them in place."""
+        other = copy.copy(self)
+        other._keys = list(self._keys)
+        other._fits = dict(self._fits)
+        return other
+
+    @property
+    def q_range(self):
+        """(qmin_idx, qmax_idx) of fits, or None if not found yet."""
+        return self._q_range
+
+    def update(self, q, intensity, err, keys=None):
+        """Append frames and fit them.
+
+        Parameters
+        ----------
+        q : numpy.ndarray
+            1D array of q, the same for all frames of the run
+        intensity, err : numpy.ndarray
+            2D arrays with one frame per row
+        keys : list, optional
+            identity of frames, e.g. (file name, mtime_ns, size) so that
+            rewritten files can be told apart
+
+        Returns
+        -------
+        int
+            number of frames appended
+        """
+        intensity = np.atleast_2d(np.asarray(intensity, dtype=float))
+        err = np.atleast_2d(np.asarray(err, dtype=float))
+        n_new = intensity.shape[0]
+        if not n_new:
+            return 0
+        n_points = min(len(q), self._max_points)
+        if self._q is None:
+            self._q = np.array(q[:n_points], dtype=float)
+            self._intensity = np.empty((0, n_points))
+            self._err = np.empty((0, n_points))
+            if self._fixed_range:
+                self._q_range = self._clip_range(self._q_range[0],
+                                                 self._q_range[1], n_points)
+        elif (n_points != self._q.size
+              or not np.allclose(q[:n_points], self._q)):
+            raise DataNotCompatible('q of frames is not the same.')
+        if keys is None:
+            keys = range(len(self._keys), len(self._keys) + n_new)
+
+        self._keys.extend(keys)
+        self._intensity = np.concatenate(
+            (self._intensity, intensity[:, :n_points]))
+        self._err = np.concatenate((self._err, err[:, :n_points]))
+        # trapezoidal integration over q
+        total = 0.5 * np.sum((intensity[:, 1:] + intensity[:, :-1]) *
+                             np.diff(q), axis=-1)
+        self._total = np.concatenate((self._total, total))
+
+        refit = False
+        if not self._fixed_range:
+            ref_idx = int(np.argmax(self._total))
+            if ref_idx != self._ref_idx:
+                self._ref_idx = ref_idx
+                result = autorg(self._q, self._intensity[ref_idx],
+                                self._err[ref_idx])
+                if result is not None:
+                    q_range = (result['qmin_idx'], result['qmax_idx'])
+                    refit = q_range != self._q_range
+                    self._q_range = q_range
+        if refit:
+            self._fits = self._fit(self._intensity, self._err)
+        else:
+            fits = self._fit(intensity[:, :n_points], err[:, :n_points])
+            for key, val in fits.items():
+                self._fits[key] = np.concatenate((self._fits[key], val))
+        return n_new
+
+    def _fit(self, intensity, err):
+        if self._q_range is None:
+            nan = np.full(intensity.shape[0], np.nan)
+            return {key: nan for key in _SERIES_FIELDS}
+        result = fit_guinier(self._q, intensity, err, *self._q_range)
+        return {key: result[key] for key in _SERIES_FIELDS}
+
+    def get_results(self):
+        """Return dict of 'rg', 'rg_err', 'i0', 'i0_err', 'r_squared' and
+        'total_intensity' (integrated over q) arrays with one element per
+        frame, as well as 'keys' and 'q_range' of fits."""
+        results = dict(self._fits)
+        results['total_intensity'] = self._total
+        results['keys'] = self.keys
+        results['q_range'] = self._q_range
+        return results
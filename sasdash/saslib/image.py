@@ -1,6 +1,11 @@
 from __future__ import print_function, division, absolute_import
 
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from scipy import sparse
+
+from sasdash.utils import get_mp_context
 
 
 def boxsize(array_shape, center, radius=150):
@@ -52,6 +57,247 @@ def boxslice(array, center, radius=150):
     return array[slicer]
 
 
+class RadialIntegrator(object):
+    """Radial average of images sharing one geometry.
+
+    Integer radius of every pixel, the flat index of valid pixels and the
+    number of valid pixels in each radius bin are computed once, so that
+    averaging an image only costs one weighted `bincount`.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        shape of 2D image
+    rc_center : tuple of int
+        (row, col) center of image matrix
+    mask : numpy.ndarray, optional
+        mask for image. 1 means valid area, 0 means masked area.
+        (the default is None, which is no mask.)
+    """
+
+    def __init__(self, shape, rc_center, mask=None):
+        if len(shape) != 2:
+            raise ValueError('Wrong dimension for image.')
+        if len(rc_center) != 2:
+            raise ValueError('Wrong dimension for center.')
+        self._shape = tuple(shape)
+        rc_center = np.round(rc_center)
+        rows, cols = np.ogrid[:shape[0], :shape[1]]
+        # eq: r = sqrt( (x - x_center)**2 + (y - y_center)**2 )
+        radius = np.sqrt((rows - rc_center[0])**2 + (cols - rc_center[1])**2)
+        self._radius = np.round(radius).astype(np.intp).ravel()
+        self._n_bins = int(self._radius.max()) + 1
+
+        if mask is not None:
+            if mask.shape != self._shape:
+                raise ValueError('Shape of mask does not match image.')
+            self._mask = np.asarray(mask, dtype=float)
+            self._flat_index = np.flatnonzero(self._mask)
+            self._weights = self._mask.ravel()[self._flat_index]
+            if np.all(self._weights == 1.0):
+                self._weights = None
+        else:
+            self._mask = None
+            self._flat_index = None
+            self._weights = None
+        valid_radius = self._valid(self._radius)
+        self._valid_radius = valid_radius
+        self._counts = np.bincount(valid_radius, minlength=self._n_bins)
+        self._nonzero = self._counts > 0
+        self._average_matrix = None
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def n_bins(self):
+        return self._n_bins
+
+    @property
+    def counts(self):
+        """Number of valid pixels in each radius bin."""
+        return self._counts
+
+    def _valid(self, flat):
+        if self._flat_index is None:
+            return flat
+        return flat[..., self._flat_index]
+
+    def _weighted(self, values):
+        if self._weights is None:
+            return values
+        return values * self._weights
+
+    def integrate(self, img):
+        """Return radial average of `img` for radius 0, 1, ... in pixels.
+        Bins without valid pixels are 0."""
+        img = np.asarray(img)
+        if img.shape != self._shape:
+            raise ValueError('Shape of image does not match integrator.')
+        total = np.bincount(
+            self._valid_radius,
+            self._weighted(self._valid(img.ravel())),
+            minlength=self._n_bins,
+        )
+        profile = np.zeros(self._n_bins)
+        profile[self._nonzero] = total[self._nonzero] / self._counts[self._nonzero]
+        return profile
+
+    def _get_average_matrix(self):
+        """Return sparse (n_bins, n_pixels) matrix of pixel weights divided
+        by counts of their bin, which averages flat images by radius."""
+        if self._average_matrix is None:
+            n_pixels = self._shape[0] * self._shape[1]
+            pixels = (np.arange(n_pixels) if self._flat_index is None else
+                      self._flat_index)
+            weights = (np.ones(pixels.size) if self._weights is None else
+                       self._weights)
+            self._average_matrix = sparse.csr_matrix(
+                (weights / self._counts[self._valid_radius],
+                 (self._valid_radius, pixels)),
+                shape=(self._n_bins, n_pixels),
+            )
+        return self._average_matrix
+
+    def integrate_stack(self, imgs):
+        """Return radial averages of a stack of images as a 2D array of shape
+        (n_frames, n_bins), computed by one sparse matrix product."""
+        imgs = np.asarray(imgs)
+        if imgs.shape[1:] != self._shape:
+            raise ValueError('Shape of images does not match integrator.')
+        flat = imgs.reshape(imgs.shape[0], -1).T
+        return np.asarray(self._get_average_matrix() @ flat).T
+
+    def subtract(self, img):
+        """Let image subtract its radial average matrix."""
+        img = np.asarray(img)
+        average = self.integrate(img)[self._radius].reshape(self._shape)
+        if self._mask is None:
+            return img - average
+        return (img - average) * self._mask
+
+
+class AzimuthalIntegrator(RadialIntegrator):
+    """Azimuthal integration of detector images into 1D profiles.
+
+    Like RAW, pixels are binned by their integer radius to the beam center
+    and the radius of each bin is converted to q. The radius map is the
+    pixel to q-bin lookup table shared by all frames.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        shape of 2D image
+    rc_center : tuple of int
+        (row, col) center of image matrix
+    mask : numpy.ndarray, optional
+        mask for image. 1 means valid area, 0 means masked area.
+        (the default is None, which is no mask.)
+    sample_distance : float
+        sample to detector distance in mm
+    wavelength : float
+        wavelength in angstrom
+    pixel_size : float
+        detector pixel size in micrometer
+    """
+
+    def __init__(self, shape, rc_center, mask=None, sample_distance=None,
+                 wavelength=None, pixel_size=None):
+        if None in (sample_distance, wavelength, pixel_size):
+            raise ValueError('sample_distance, wavelength and pixel_size '
+                             'are required for q.')
+        super(AzimuthalIntegrator, self).__init__(shape, rc_center, mask)
+        radius_mm = np.arange(self._n_bins) * pixel_size * 1e-3
+        two_theta = np.arctan(radius_mm / sample_distance)
+        q = 4.0 * np.pi * np.sin(two_theta / 2.0) / wavelength
+        # bins without valid pixels are dropped
+        self._q = q[self._nonzero]
+
+    @property
+    def q(self):
+        return self._q
+
+    def integrate_profile(self, img):
+        """Return (q, intensity, error) of `img`. Errors follow counting
+        statistics: sqrt(sum of counts) / number of pixels."""
+        img = np.asarray(img)
+        if img.shape != self._shape:
+            raise ValueError('Shape of image does not match integrator.')
+        total = np.bincount(
+            self._valid_radius,
+            self._weighted(self._valid(img.ravel())),
+            minlength=self._n_bins,
+        )[self._nonzero]
+        counts = self._counts[self._nonzero]
+        intensity = total / counts
+        err = np.sqrt(np.maximum(total, 0.0)) / counts
+        return self._q, intensity, err
+
+
+def _integrate_chunk(integrator, filepaths, loader):
+    return [integrator.integrate_profile(loader(each)) for each in filepaths]
+
+
+# integrator and loader of a worker process of `integrate_files`, sent once
+# to each worker instead of with every chunk
+_worker_args = None
+
+
+def _init_worker(integrator, loader):
+    global _worker_args
+    _worker_args = (integrator, loader)
+
+
+def _integrate_worker_chunk(filepaths):
+    integrator, loader = _worker_args
+    return _integrate_chunk(integrator, filepaths, loader)
+
+
+def integrate_files(filepaths, integrator, loader, chunk_size=16,
+                    max_workers=None):
+    """Integrate image files chunk by chunk, so only one chunk of frames
+    is held in memory (per worker).
+
+    Parameters
+    ----------
+    filepaths : list of str
+        path of image files
+    integrator : AzimuthalIntegrator
+        geometry of images
+    loader : callable
+        return 2D image of a file path, e.g. `sasio.load_pilatus_image`.
+        It must be picklable if `max_workers` is given.
+    chunk_size : int, optional
+        number of frames of each chunk (the default is 16).
+    max_workers : int, optional
+        integrate chunks in a pool of processes (started as those of
+        `utils.get_process_pool`), which receive `integrator` once when
+        they start (the default is None, which integrates in this
+        process).
+
+    Yields
+    ------
+    tuple
+        (q, intensity, error) of each file, in order of `filepaths`.
+    """
+    chunks = [
+        filepaths[start:start + chunk_size]
+        for start in range(0, len(filepaths), chunk_size)
+    ]
+    if not max_workers:
+        for each in chunks:
+            for profile in _integrate_chunk(integrator, each, loader):
+                yield profile
+        return
+    with ProcessPoolExecutor(max_workers, mp_context=get_mp_context(),
+                             initializer=_init_worker,
+                             initargs=(integrator, loader)) as executor:
+        for profiles in executor.map(_integrate_worker_chunk, chunks):
+            for profile in profiles:
+                yield profile
+
+
 def subtract_radial_average(img, rc_center, mask=None):
     """Let image subtract its radial average matrix.
 
@@ -69,32 +315,55 @@ def subtract_radial_average(img, rc_center, mask=None):
     -------
     numpy.ndarray
         return residual image.
+
+    See Also
+    --------
+    RadialIntegrator : reuse geometry for images of the same run.
     """
-    assert img.ndim == 2, 'Wrong dimension for image.'
-    assert len(rc_center) == 2, 'Wrong dimension for center.'
-    if mask is not None:
-        masked_img = img * mask
-    else:
-        masked_img = img
-    rc_center = np.round(rc_center)
-    meshgrids = np.indices(img.shape)  # return (xx, yy)
-    # eq: r = sqrt( (x - x_center)**2 + (y - y_center)**2 + (z - z_center)**2 )
-    r = np.sqrt(sum(((grid - c)**2 for grid, c in zip(meshgrids, rc_center))))
-    r = np.round(r).astype(np.int)
-
-    total_bin = np.bincount(r.ravel(), masked_img.ravel())
-    nr = np.bincount(r.ravel())  # count for each r
+    return RadialIntegrator(img.shape, rc_center, mask).subtract(img)
+
+
+DEFAULT_PERCENTILES = (1, 5, 50, 95, 99)
+
+
+def image_statistics(img, mask=None, percentiles=DEFAULT_PERCENTILES):
+    """Summarize intensity distribution of an image, e.g. to set colorbar
+    range without loading the image again.
+
+    Parameters
+    ----------
+    img : numpy.ndarray
+        2D matrix of input image
+    mask : numpy.ndarray, optional
+        mask for image. 1 means valid area, 0 means masked area.
+        (the default is None, which is no mask.)
+    percentiles : sequence of float, optional
+        percentile levels in [0, 100] of valid pixels to compute.
+
+    Returns
+    -------
+    dict
+        JSON serializable dict with 'min' and 'max' of the whole image,
+        'total' counts and 'percentiles' ([levels, values]) of valid pixels,
+        'n_pixels' and 'n_masked'. Values are None if undefined.
+    """
+    img = np.asarray(img)
     if mask is not None:
-        r_mask = np.zeros(r.shape)
-        r_mask[np.where(mask == 0.0)] = 1
-        nr_mask = np.bincount(r.ravel(), r_mask.ravel())
-        nr = nr - nr_mask
-    radialprofile = np.zeros_like(nr)
-    # r_pixel = np.unique(r.ravel())  # sorted
-    nomaskr = np.where(nr > 0)
-    radialprofile[nomaskr] = total_bin[nomaskr] / nr[nomaskr]
-    if mask is None:
-        residual_img = masked_img - radialprofile[r]  # subtract mean matrix
+        valid = np.asarray(mask, dtype=bool)
+        values = img[valid]
     else:
-        residual_img = masked_img - radialprofile[r] * mask
-    return residual_img
+        values = img.ravel()
+    finite = np.isfinite(img)
+    stats = {
+        'min': float(img[finite].min()) if finite.any() else None,
+        'max': float(img[finite].max()) if finite.any() else None,
+        'n_pixels': int(img.size),
+        'n_masked': int(img.size - values.size),
+        'total': None,
+        'percentiles': [list(percentiles), None],
+    }
+    values = values[np.isfinite(values)]
+    if values.size:
+        stats['total'] = float(values.sum(dtype=np.float64))
+        stats['percentiles'][1] = np.percentile(values, percentiles).tolist()
+    return stats
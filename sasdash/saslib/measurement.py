@@ -111,6 +111,10 @@ class SASM(Base):
         """updates modified intensity after scale, normalization and offset changes"""
         pass
 
+    @property
+    def parameters(self):
+        return self._parameters
+
     def get_parameter(self, key, default=None):
         return self._parameters.get(key, default)
 
@@ -190,6 +194,10 @@ class IFTM(Base):
     def err_orig(self):
         return self._err_orig
 
+    @property
+    def i_fit(self):
+        return self._i_fit
+
     @property
     def q_extrap(self):
         return self._q_extrap
@@ -198,6 +206,10 @@ class IFTM(Base):
     def i_extrap(self):
         return self._i_extrap
 
+    @property
+    def parameters(self):
+        return self._parameters
+
     def get_parameter(self, key, default=None):
         return self._parameters.get(key, default)
 
@@ -219,6 +231,108 @@ class IFTM(Base):
     #     return np.trapz(self.pvals / area, x=d2)
 
 
+class ProfileSeries(Base):
+    """Series of profiles sharing one q vector, e.g. all frames of a run.
+
+    Intensity and error are stored as contiguous (n_frames, n_q) arrays so
+    that crosslines, colormaps and differences are plain slicing.
+    """
+
+    def __init__(self, q, i, err, parameters=None):
+        self._q = np.array(q, dtype=float).reshape(-1)
+        self._i = np.array(i, dtype=float, ndmin=2)
+        self._err = np.array(err, dtype=float, ndmin=2)
+        if not (self._i.shape == self._err.shape
+                and self._i.shape[1] == self._q.size):
+            raise DataNotCompatible(
+                'shape of (q, intensity, error) is not compatible.')
+
+        if parameters is None:
+            parameters = [{} for _ in range(self._i.shape[0])]
+        elif len(parameters) != self._i.shape[0]:
+            raise DataNotCompatible(
+                'length of parameters is not equal to number of frames.')
+        self._parameters = list(parameters)
+
+    @classmethod
+    def from_sasm_list(cls, sasm_list):
+        """Stack SASM list. All profiles must have the same q vector,
+        otherwise `DataNotCompatible` is raised and profiles have to be
+        handled one by one."""
+        if not sasm_list:
+            return cls(np.empty(0), np.empty((0, 0)), np.empty((0, 0)))
+        q = sasm_list[0].q
+        for sasm in sasm_list:
+            if len(sasm.q) != len(q) or not np.allclose(sasm.q, q):
+                raise DataNotCompatible(
+                    'q vector of %s is different from %s.' %
+                    (sasm.get_parameter('filename'),
+                     sasm_list[0].get_parameter('filename')))
+        return cls(
+            q,
+            np.stack([sasm.i for sasm in sasm_list]),
+            np.stack([sasm.err for sasm in sasm_list]),
+            [sasm.parameters for sasm in sasm_list],
+        )
+
+    @property
+    def q(self):
+        return self._q
+
+    @property
+    def i(self):
+        return self._i
+
+    @property
+    def err(self):
+        return self._err
+
+    @property
+    def n_frames(self):
+        return self._i.shape[0]
+
+    @property
+    def n_q(self):
+        return self._q.size
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    @property
+    def filenames(self):
+        return [param.get('filename') for param in self._parameters]
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, frame_idx):
+        """Return single frame as SASM."""
+        return SASM(self._q, self._i[frame_idx], self._err[frame_idx],
+                    **self._parameters[frame_idx])
+
+    def get_parameter(self, frame_idx, key, default=None):
+        return self._parameters[frame_idx].get(key, default)
+
+    def find_closest_q_idx(self, q):
+        return np.abs(self._q - q).argmin()
+
+    def crossline(self, q_idx, kind='i'):
+        """Return intensity (or error with kind='err') of all frames at
+        given q index."""
+        return getattr(self, kind)[:, q_idx]
+
+    def difference(self, ref_idx, kind='i', relative=False):
+        """Return difference of all frames against reference frame, in
+        percentage if `relative`."""
+        matrix = getattr(self, kind)
+        ref = matrix[ref_idx]
+        diff = matrix - ref
+        if relative:
+            diff = diff / ref * 100.0
+        return diff
+
+
 class SECM(Base):
     """SEC-SAS Measurement (SECM)"""
     pass
@@ -3,6 +3,7 @@ from __future__ import print_function, division, absolute_import
 import os
 import re
 import json
+import warnings
 from io import open  # python 2/3
 
 from PIL import Image
@@ -11,147 +12,243 @@ import numpy as np
 from .measurement import SASM, IFTM
 
 
-def load_dat(filepath):
-    """ `Primus` format """
-    filename = os.path.split(filepath)[1]
-    fstream = open(filepath)
+_DAT_FLOAT_PATTERN = re.compile(r'(?:\d+\.)?\d+[eE][-\+]\d+')
 
-    # float_pattern = '\d*[.]\d*[+eE-]*\d+\s'
-    float_pattern = r'(?:\d+\.)?\d+[eE][-\+]\d+'
 
-    counter = 0
-    prog = re.compile(float_pattern)
-    q, i, err = [], [], []
-    for line in fstream:
-        if '### HEADER' in line:
-            exist_primus_header = True
+def _is_dat_data_line(line):
+    return bool(_DAT_FLOAT_PATTERN.match(line)) and len(line.split()) >= 3
 
-        split_line = line.strip().split()
-        if prog.match(line) and len(split_line) >= 3:
-            q.append(float(split_line[0]))
-            i.append(float(split_line[1]))
-            err.append(float(split_line[2]))
-            counter += 1
 
-    if exist_primus_header:
-        pass
+def _find_dat_block(text):
+    """Return (start, stop, ncols) of the numeric block in a `.dat` text.
 
-    fstream.close()
-    return SASM(q, i, err, filename=filename)
+    Only the header (from the top) and the footer (from the bottom) are
+    scanned line by line, the block in between is handed to NumPy as is.
+    """
+    start = 0
+    while start < len(text):
+        stop = text.find('\n', start)
+        if stop < 0:
+            stop = len(text)
+        line = text[start:stop]
+        if _is_dat_data_line(line):
+            ncols = len(line.split())
+            break
+        start = stop + 1
+    else:
+        return None
 
+    stop = len(text)
+    while stop > start:
+        line_start = text.rfind('\n', start, stop - 1) + 1
+        if _is_dat_data_line(text[line_start:stop]):
+            break
+        stop = line_start
+    return start, stop, ncols
 
-def load_out(filepath):
-    """ GNOM format """
-    # Port from RAW
-    five_col_fit = re.compile('\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s*$')
-    three_col_fit = re.compile('\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s*$')
-    two_col_fit = re.compile('\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s*$')
 
-    results_fit = re.compile('\s*Current\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s*\d*[.]?\d*[+eE-]*\d*\s*$')
+_WHITESPACE = np.frombuffer(b' \t\n\r\x0b\x0c', dtype=np.uint8)
 
-    te_fit = re.compile('\s*Total\s+[Ee]stimate\s*:\s+\d*[.]\d+\s*\(?[A-Za-z\s]+\)?\s*$')
-    te_num_fit = re.compile('\d*[.]\d+')
-    te_quality_fit = re.compile('[Aa][A-Za-z\s]+\)?\s*$')
 
-    p_rg_fit = re.compile('\s*Real\s+space\s*\:?\s*Rg\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*\+-\s*\d*[.]\d+[+eE-]*\d*')
-    q_rg_fit = re.compile('\s*Reciprocal\s+space\s*\:?\s*Rg\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*')
+def _count_fields(block):
+    """Return number of whitespace separated fields of each line of
+    `block`. A trailing newline does not start another line."""
+    chars = np.frombuffer(block.encode('utf-8'), dtype=np.uint8)
+    is_space = np.isin(chars, _WHITESPACE)
+    # a field starts at a non-space character following a space
+    starts = ~is_space
+    starts[1:] &= is_space[:-1]
+    n_starts = np.cumsum(starts)
+    line_ends = np.flatnonzero(chars[:-1] == ord('\n'))
+    totals = np.concatenate(([0], n_starts[line_ends], n_starts[-1:]))
+    return np.diff(totals)
 
-    p_i0_fit = re.compile('\s*Real\s+space\s*\:?[A-Za-z0-9\s\.,+-=]*\(0\)\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*\+-\s*\d*[.]\d+[+eE-]*\d*')
-    q_i0_fit = re.compile('\s*Reciprocal\s+space\s*\:?[A-Za-z0-9\s\.,+-=]*\(0\)\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*')
 
-    qfull = []
-    qshort = []
-    Jexp = []
-    Jerr  = []
-    Jreg = []
-    Ireg = []
+def _load_dat_lines(filepath):
+    """Line-by-line `Primus` parser, used as fallback for odd files."""
+    q, i, err = [], [], []
+    with open(filepath) as fstream:
+        for line in fstream:
+            split_line = line.strip().split()
+            if _DAT_FLOAT_PATTERN.match(line) and len(split_line) >= 3:
+                q.append(float(split_line[0]))
+                i.append(float(split_line[1]))
+                err.append(float(split_line[2]))
+    return q, i, err
+
 
-    R = []
-    P = []
-    Perr = []
+def load_dat(filepath):
+    """ `Primus` format """
+    filename = os.path.split(filepath)[1]
+    with open(filepath) as fstream:
+        text = fstream.read()
+
+    block = _find_dat_block(text)
+    if block is None:
+        return SASM([], [], [], filename=filename)
+    start, stop, ncols = block
+
+    try:
+        n_fields = _count_fields(text[start:stop])
+        if np.any(n_fields != ncols):
+            # missing and extra fields of rows may cancel out in total
+            raise ValueError('Ragged rows')
+        with warnings.catch_warnings():
+            # unmatched data only raises a DeprecationWarning in old NumPy
+            warnings.simplefilter('error', DeprecationWarning)
+            data = np.fromstring(text[start:stop], sep=' ')
+        data = data.reshape(n_fields.size, ncols)
+    except (ValueError, DeprecationWarning):
+        # blank lines, comments or ragged rows inside the numeric block
+        q, i, err = _load_dat_lines(filepath)
+    else:
+        q, i, err = data[:, 0], data[:, 1], data[:, 2]
 
-    outfile = []
+    return SASM(q, i, err, filename=filename)
 
+
+# GNOM output regexes (ported from RAW). They are only tried on lines
+# starting with the matching keyword, see `_parse_out_results`.
+_OUT_RESULTS_FIT = re.compile(r'\s*Current\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s+\d*[.]\d*[+eE-]*\d*\s*\d*[.]?\d*[+eE-]*\d*\s*$')
+
+_OUT_TE_FIT = re.compile(r'\s*Total\s+[Ee]stimate\s*:\s+\d*[.]\d+\s*\(?[A-Za-z\s]+\)?\s*$')
+_OUT_TE_NUM_FIT = re.compile(r'\d*[.]\d+')
+_OUT_TE_QUALITY_FIT = re.compile(r'[Aa][A-Za-z\s]+\)?\s*$')
+
+_OUT_P_RG_FIT = re.compile(r'\s*Real\s+space\s*\:?\s*Rg\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*\+-\s*\d*[.]\d+[+eE-]*\d*')
+_OUT_Q_RG_FIT = re.compile(r'\s*Reciprocal\s+space\s*\:?\s*Rg\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*')
+
+_OUT_P_I0_FIT = re.compile(r'\s*Real\s+space\s*\:?[A-Za-z0-9\s\.,+-=]*\(0\)\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*\+-\s*\d*[.]\d+[+eE-]*\d*')
+_OUT_Q_I0_FIT = re.compile(r'\s*Reciprocal\s+space\s*\:?[A-Za-z0-9\s\.,+-=]*\(0\)\:?\s*\=?\s*\d*[.]\d+[+eE-]*\d*\s*')
+
+# sections of a GNOM output file
+_OUT_RESULTS, _OUT_DATA, _OUT_PR = range(3)
+
+
+def _parse_columns(lines, ncols):
+    """Parse numeric lines with the same number of columns at once."""
+    if not lines:
+        return np.empty((0, ncols))
+    return np.fromstring(' '.join(lines), sep=' ').reshape(-1, ncols)
+
+
+def _parse_out_results(line, results):
+    """Update `results` if `line` is one of the GNOM result lines."""
+    keyword = line.lstrip()[:4]
+    if keyword == 'Curr':
+        match = _OUT_RESULTS_FIT.match(line)
+        if match:
+            found = match.group().split()
+            results['chisq'] = float(found[1])
+            results['oscil'] = float(found[2])
+            results['stabil'] = float(found[3])
+            results['sysdev'] = float(found[4])
+            results['positv'] = float(found[5])
+            results['valcen'] = float(found[6])
+            results['smooth'] = float(found[7]) if len(found) == 8 else -1
+
+    elif keyword == 'Tota':
+        if _OUT_TE_FIT.match(line):
+            te_num_search = _OUT_TE_NUM_FIT.search(line)
+            te_quality_search = _OUT_TE_QUALITY_FIT.search(line)
+            results['TE'] = float(te_num_search.group().strip())
+            results['quality'] = te_quality_search.group().strip().rstrip(
+                ')').strip()
+
+    elif keyword == 'Real':
+        match = _OUT_P_RG_FIT.match(line)
+        if match:
+            found = match.group().split()
+            results['rg'] = float(found[-3])
+            results['rger'] = float(found[-1])
+        match = _OUT_P_I0_FIT.match(line)
+        if match:
+            found = match.group().split()
+            results['i0'] = float(found[-3])
+            results['i0er'] = float(found[-1])
+
+    elif keyword == 'Reci':
+        match = _OUT_Q_RG_FIT.match(line)
+        if match:
+            results['q_rg'] = float(match.group().split()[-1])
+        match = _OUT_Q_I0_FIT.match(line)
+        if match:
+            results['q_i0'] = float(match.group().split()[-1])
+
+
+def load_out(filepath, keep_raw=False):
+    """ GNOM format
+
+    The file is read once. Result lines are matched by their keyword, the
+    experimental data and P(r) blocks are collected as text and parsed with
+    one NumPy call per block.
+
+    Parameters
+    ----------
+    filepath : str
+        path of GNOM output file
+    keep_raw : bool, optional
+        keep full contents of the file as `out` parameter (the default is
+        False, which stores None).
+    """
+    # Port from RAW
+    results = {
+        'TE': None,  # Total estimate
+        'rg': None,  # Real space Rg
+        'rger': None,  # Real space rg error
+        'i0': None,  # Real space I0
+        'i0er': None,  # Real space I0 error
+        'q_rg': None,  # Reciprocal space Rg
+        'q_i0': None,  # Reciprocal space I0
+        'quality': None,  # Quality of GNOM out file
+        'chisq': None,  # DISCRIP, chi squared
+        'oscil': None,  # Oscillation of solution
+        'stabil': None,  # Stability of solution
+        'sysdev': None,  # Systematic deviation of solution
+        'positv': None,  # Relative norm of the positive part of P(r)
+        'valcen': None,  # Validity of the chosen interval in real space
+        # Smoothness of the chosen interval? -1 indicates no real value,
+        # for versions of GNOM < 5.0 (ATSAS <2.8)
+        'smooth': None,
+    }
+
+    extrap_lines = []  # q, I REG (q down to q=0)
+    data_lines = []  # S, J EXP, ERROR, J REG, I REG
+    pr_lines = []  # R, P(R), ERROR
+    outfile = [] if keep_raw else None
+
+    section = _OUT_RESULTS
     with open(filepath) as f:
         for line in f:
-            twocol_match = two_col_fit.match(line)
-            threecol_match = three_col_fit.match(line)
-            fivecol_match = five_col_fit.match(line)
-            results_match = results_fit.match(line)
-            te_match = te_fit.match(line)
-            p_rg_match = p_rg_fit.match(line)
-            q_rg_match = q_rg_fit.match(line)
-            p_i0_match = p_i0_fit.match(line)
-            q_i0_match = q_i0_fit.match(line)
-
-            outfile.append(line)
-
-            if twocol_match:
-                # print(line)
-                found = twocol_match.group().split()
-
-                qfull.append(float(found[0]))
-                Ireg.append(float(found[1]))
-
-            elif threecol_match:
-                #print(line)
-                found = threecol_match.group().split()
-
-                R.append(float(found[0]))
-                P.append(float(found[1]))
-                Perr.append(float(found[2]))
-
-            elif fivecol_match:
-                #print(line)
-                found = fivecol_match.group().split()
-
-                qfull.append(float(found[0]))
-                qshort.append(float(found[0]))
-                Jexp.append(float(found[1]))
-                Jerr.append(float(found[2]))
-                Jreg.append(float(found[3]))
-                Ireg.append(float(found[4]))
-
-            elif results_match:
-                found = results_match.group().split()
-                Actual_DISCRP = float(found[1])
-                Actual_OSCILL = float(found[2])
-                Actual_STABIL = float(found[3])
-                Actual_SYSDEV = float(found[4])
-                Actual_POSITV = float(found[5])
-                Actual_VALCEN = float(found[6])
-
-                if len(found) == 8:
-                    Actual_SMOOTH = float(found[7])
-                else:
-                    Actual_SMOOTH = -1
-
-            elif te_match:
-                te_num_search = te_num_fit.search(line)
-                te_quality_search = te_quality_fit.search(line)
-
-                TE_out = float(te_num_search.group().strip())
-                quality = te_quality_search.group().strip().rstrip(')').strip()
-
-
-            if p_rg_match:
-                found = p_rg_match.group().split()
-                rg = float(found[-3])
-                rger = float(found[-1])
-
-            elif q_rg_match:
-                found = q_rg_match.group().split()
-                q_rg = float(found[-1])
-
-            if p_i0_match:
-                found = p_i0_match.group().split()
-                i0 = float(found[-3])
-                i0er = float(found[-1])
-
-            elif q_i0_match:
-                found = q_i0_match.group().split()
-                q_i0 = float(found[-1])
-
+            if keep_raw:
+                outfile.append(line)
+
+            stripped = line.strip()
+            if section != _OUT_RESULTS:
+                if not stripped:
+                    continue
+                if stripped[0] in '0123456789.-':
+                    ncols = len(stripped.split())
+                    if section == _OUT_PR and ncols == 3:
+                        pr_lines.append(stripped)
+                    elif section == _OUT_DATA and ncols == 5:
+                        data_lines.append(stripped)
+                    elif section == _OUT_DATA and ncols == 2:
+                        extrap_lines.append(stripped)
+                    continue
+                # any other text closes the numeric block
+                section = _OUT_RESULTS
+
+            if stripped.startswith('S ') and 'J EXP' in stripped:
+                section = _OUT_DATA
+            elif stripped.startswith('R ') and 'P(R)' in stripped:
+                section = _OUT_PR
+            else:
+                _parse_out_results(line, results)
+
+    extrap = _parse_columns(extrap_lines, 2)
+    data = _parse_columns(data_lines, 5)
+    pr = _parse_columns(pr_lines, 3)
 
     # Output variables not in the results file:
     #             'r'         : R,            #R, note R[-1] == Dmax
@@ -163,30 +260,17 @@ def load_out(filepath):
     #             'jerr'      : Jerr,         #Experimental errors
     #             'jreg'      : Jreg,         #Experimental intensities from P(r)
     #             'ireg'      : Ireg,         #Experimental intensities extrapolated to q=0
-
-    name = os.path.basename(filepath)
-
-    results = {
-        'dmax'      : R[-1],        #Dmax
-        'TE'        : TE_out,       #Total estimate
-        'rg'        : rg,           #Real space Rg
-        'rger'      : rger,         #Real space rg error
-        'i0'        : i0,           #Real space I0
-        'i0er'      : i0er,         #Real space I0 error
-        'q_rg'      : q_rg,         #Reciprocal space Rg
-        'q_i0'      : q_i0,         #Reciprocal space I0
-        'out'       : outfile,      #Full contents of the outfile, for writing later
-        'quality'   : quality,      #Quality of GNOM out file
-        'chisq'     : Actual_DISCRP,#DISCRIP, chi squared
-        'oscil'     : Actual_OSCILL,#Oscillation of solution
-        'stabil'    : Actual_STABIL,#Stability of solution
-        'sysdev'    : Actual_SYSDEV,#Systematic deviation of solution
-        'positv'    : Actual_POSITV,#Relative norm of the positive part of P(r)
-        'valcen'    : Actual_VALCEN,#Validity of the chosen interval in real space
-        'smooth'    : Actual_SMOOTH,#Smoothness of the chosen interval? -1 indicates no real value, for versions of GNOM < 5.0 (ATSAS <2.8)
-        'filename'  : name,         #GNOM filename
-        'algorithm' : 'GNOM'        #Lets us know what algorithm was used to find the IFT
-    }
+    R, P, Perr = pr.T
+    qshort, Jexp, Jerr, Jreg = data[:, :4].T
+    qfull = np.concatenate((extrap[:, 0], qshort))
+    Ireg = np.concatenate((extrap[:, 1], data[:, 4]))
+
+    results.update({
+        'dmax': R[-1] if R.size else None,  # Dmax
+        'out': outfile,  # Full contents of the outfile, for writing later
+        'filename': os.path.basename(filepath),  # GNOM filename
+        'algorithm': 'GNOM',  # Lets us know what algorithm was used to find the IFT
+    })
 
     return IFTM(R, P, Perr, qshort, Jexp, Jerr, Jreg, qfull, Ireg, results)
 
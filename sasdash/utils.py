@@ -1,22 +1,33 @@
 from __future__ import print_function, division, absolute_import
 
-import os.path
+import os
 import shlex
 import subprocess
+import threading
+import multiprocessing
 from io import open
+from copy import deepcopy
 from itertools import groupby
 from typing import Union
 from difflib import SequenceMatcher
-from functools import reduce
+from functools import reduce, lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 from ruamel.yaml import YAML
+# round-trip mode keeps comments and order of written files
 yaml = YAML(typ='rt')
+# files are read with the (C-based if available) safe loader
+_safe_yaml = YAML(typ='safe')
 
+# parsed YAML files, {path: ((mtime_ns, size), data)}
+_yaml_cache = {}
+_yaml_cache_lock = threading.Lock()
 
-def parse_yaml(yaml_file):
+
+def _load_yaml(yaml_file):
     try:
         with open(yaml_file, 'r', encoding='utf-8') as fstream:
-            info = yaml.load(fstream)
+            info = _safe_yaml.load(fstream)
     # except yaml.scanner.ScannerError as err:  # syntax error: empty fields
     except Exception as err:
         print(err)
@@ -26,9 +37,45 @@ def parse_yaml(yaml_file):
     return info
 
 
+def parse_yaml(yaml_file):
+    """Return content of YAML file. Files are parsed again only if their
+    mtime or size changed, the returned data is a copy which can be
+    modified."""
+    try:
+        stat = os.stat(yaml_file)
+        state = stat.st_mtime_ns, stat.st_size
+    except OSError:
+        state = None
+    if state is None:
+        return _load_yaml(yaml_file)  # print error as before
+    with _yaml_cache_lock:
+        entry = _yaml_cache.get(yaml_file)
+    if entry is None or entry[0] != state:
+        entry = state, _load_yaml(yaml_file)
+        with _yaml_cache_lock:
+            _yaml_cache[yaml_file] = entry
+    return deepcopy(entry[1])
+
+
 def dump_yaml(data, yaml_file):
+    """Write data to YAML file. Comments and order of keys of an existing
+    file are kept if `data` is a dict."""
+    if isinstance(data, dict) and os.path.exists(yaml_file):
+        try:
+            with open(yaml_file, 'r', encoding='utf-8') as fstream:
+                curr_data = yaml.load(fstream)
+        except Exception:
+            curr_data = None
+        if isinstance(curr_data, dict):
+            for key in list(curr_data):
+                if key not in data:
+                    del curr_data[key]
+            curr_data.update(data)
+            data = curr_data
     with open(yaml_file, 'w', encoding='utf-8') as fstream:
         yaml.dump(data, fstream)
+    with _yaml_cache_lock:
+        _yaml_cache.pop(yaml_file, None)
 
 
 def to_basic_type(string: str) -> Union[bool, int, float, str]:
@@ -79,6 +126,34 @@ def run_system_command(command_string, shell=False):
     return unicodify(output)
 
 
+def get_mp_context():
+    """Return multiprocessing context of worker processes.
+
+    Forking the server copies locks held by its other threads (e.g.
+    prefetching and watching), which may deadlock the children, so
+    workers are started by a fork server, or spawned where it is not
+    available.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+@lru_cache()
+def get_process_pool(max_workers=None):
+    """Return process pool shared by the whole application, see
+    `get_mp_context`.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        number of worker processes (the default is None, which is the
+        number of CPUs).
+    """
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=get_mp_context())
+
+
 def str2bool(param):
     """Cast bool string to real bool type"""
     if param.lower() in ('true', 'yes', 't', 'y', '1'):
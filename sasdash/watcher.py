@@ -0,0 +1,275 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+# seconds between scans of the polling watcher
+DEFAULT_POLL_INTERVAL = 2.0
+# changes are reported once no more events come within this time (s)
+DEFAULT_DEBOUNCE = 0.5
+# but at most this time (s) after the first change, e.g. while frames are
+# written continuously
+DEFAULT_MAX_DELAY = 5.0
+
+# inotify(7) flags
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+               | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+# filesystems whose changes made by other hosts are not seen by inotify
+NETWORK_FILESYSTEMS = frozenset((
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', 'ncpfs', 'lustre',
+    'gpfs', 'beegfs', 'ceph', 'glusterfs', 'fuse.glusterfs', 'fuse.sshfs',
+    'fuse.cephfs', 'fuse.beegfs', 'panfs', '9p',
+))
+_MOUNTS_FILE = '/proc/mounts'
+
+
+def _unescape_mount(field):
+    # spaces, tabs etc. are octal escaped in /proc/mounts, e.g. '\040'
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+
+def get_filesystem_type(path, mounts_file=_MOUNTS_FILE):
+    """Return type of filesystem holding `path` (e.g. 'ext4', 'nfs4'), or
+    None if unknown, e.g. on other platforms than Linux."""
+    path = os.path.realpath(path)
+    best_mount, fs_type = '', None
+    try:
+        with open(mounts_file, 'r') as fstream:
+            for line in fstream:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = _unescape_mount(fields[1])
+                if (path == mount_point or path.startswith(
+                        mount_point.rstrip('/') + '/')) and len(
+                            mount_point) >= len(best_mount):
+                    best_mount, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+
+def is_network_filesystem(path):
+    """Return whether `path` is on a network filesystem (see
+    `NETWORK_FILESYSTEMS`), where inotify misses writes of other hosts."""
+    return get_filesystem_type(path) in NETWORK_FILESYSTEMS
+
+
+class _PollingBackend(object):
+    """Detect changes of directories by comparing their mtime."""
+
+    def __init__(self, interval=DEFAULT_POLL_INTERVAL):
+        self._interval = interval
+        self._mtimes = {}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def add(self, path):
+        if path not in self._mtimes:
+            self._mtimes[path] = self._mtime(path)
+
+    def remove(self, path):
+        self._mtimes.pop(path, None)
+
+    def wait(self, timeout=None):
+        time.sleep(self._interval if timeout is None
+                   else min(timeout, self._interval))
+        changed = set()
+        for path, mtime in list(self._mtimes.items()):
+            curr_mtime = self._mtime(path)
+            if curr_mtime != mtime and path in self._mtimes:
+                self._mtimes[path] = curr_mtime
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self._mtimes.clear()
+
+
+class _InotifyBackend(object):
+    """Receive changes of directories from inotify(7) on Linux."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._paths = {}  # wd: path
+        self._wds = {}  # path: wd
+
+    def add(self, path):
+        if path in self._wds:
+            return
+        wd = self._add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                print('Too many watched directories, raise '
+                      'fs.inotify.max_user_watches to watch {}'.format(path))
+            return  # removed meanwhile or not readable
+        self._paths[wd] = path
+        self._wds[path] = wd
+
+    def remove(self, path):
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            self._paths.pop(wd, None)
+            self._rm_watch(self._fd, wd)
+
+    def wait(self, timeout=None):
+        """Return changed directories, or None if events were lost."""
+        if timeout is None:
+            timeout = DEFAULT_POLL_INTERVAL  # to notice `stop`
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            buf = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size + length
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            path = self._paths.get(wd)
+            if path is None:
+                continue
+            changed.add(path)
+            if mask & _IN_IGNORED:
+                # directory removed, a new one with same path is watched
+                # again by `add`
+                self._paths.pop(wd, None)
+                self._wds.pop(path, None)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class DirectoryWatcher(object):
+    """Watch directories in a background thread and report changed ones.
+
+    inotify is used on Linux, other platforms fall back to polling the
+    mtime of all directories. inotify only sees changes made through the
+    local kernel, so network filesystems (see `is_network_filesystem`)
+    need polling. Changes are gathered until no more come
+    within `debounce` seconds (but at most for `max_delay` seconds), then
+    `callback(paths)` is called with the set of changed directories, or
+    with None if events were lost and any directory may have changed.
+
+    Parameters
+    ----------
+    callback : callable
+    poll_interval : float, optional
+        seconds between scans of polling watcher.
+    debounce : float, optional
+        seconds to wait for further changes.
+    max_delay : float, optional
+        maximum seconds to gather changes.
+    use_inotify : bool, optional
+        set False to poll, e.g. for network filesystems.
+    """
+
+    def __init__(self, callback, poll_interval=DEFAULT_POLL_INTERVAL,
+                 debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY,
+                 use_inotify=True):
+        self._callback = callback
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._backend = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._backend = _InotifyBackend()
+            except (OSError, AttributeError, TypeError) as err:
+                print('inotify is not available ({}), poll instead'.format(
+                    err))
+        if self._backend is None:
+            self._backend = _PollingBackend(poll_interval)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def polling(self):
+        return isinstance(self._backend, _PollingBackend)
+
+    def watch(self, paths):
+        """Add directories to watch, e.g. newly created ones."""
+        with self._lock:
+            for path in paths:
+                self._backend.add(path)
+
+    def unwatch(self, paths):
+        with self._lock:
+            for path in paths:
+                self._backend.remove(path)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='sasdash-watcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._backend.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            changed = self._backend.wait()
+            if not changed and changed is not None:
+                continue
+            # gather changes until directories settle
+            deadline = time.time() + self._max_delay
+            while changed is not None and time.time() < deadline:
+                more = self._backend.wait(self._debounce)
+                if more is None:
+                    changed = None
+                elif more:
+                    changed |= more
+                else:
+                    break
+            try:
+                self._callback(changed)
+            except Exception as err:
+                print('Failed to process changes of {}: {}'.format(
+                    changed, err))
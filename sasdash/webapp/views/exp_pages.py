@@ -15,6 +15,13 @@ from sasdash.base import REGISTERED_LAYOUTS, DOWNLOADABLE, SUBFOLDER, sort_seq
 from ..forms import (ExperimentSettingsForm, ExperimentSetupForm,
                      LayoutConfigCheckbox, SampleInfoForm)
 
+# runs per page of experiment cards and run list
+RUNS_PER_PAGE = 50
+MAX_RUNS_PER_PAGE = 1000
+_QUERY_ARGS = ('page', 'per_page', 'sort', 'order')
+# route arguments, never setup fields to filter
+_ROUTE_ARGS = ('project', 'experiment')
+
 exp_pages = Blueprint(
     'exp_pages',
     __name__,
@@ -42,6 +49,32 @@ def experiment_settings():
     )
 
 
+def _get_run_query():
+    """Return page, runs per page and keyword arguments of
+    `warehouse.query_runs` from request arguments: `page`, `per_page`,
+    `sort` (setup field), `order` ('asc' or 'desc'), and other arguments
+    as filters on setup fields, e.g. `?sample=lysozyme`."""
+    args = request.args
+    try:
+        page = max(int(args.get('page', 1)), 1)
+        per_page = min(max(int(args.get('per_page', RUNS_PER_PAGE)), 1),
+                       MAX_RUNS_PER_PAGE)
+    except ValueError:
+        page, per_page = 1, RUNS_PER_PAGE
+    query = {
+        'filters': {
+            key: val
+            for key, val in args.items()
+            if key not in _QUERY_ARGS + _ROUTE_ARGS and val
+        },
+        'sort_by': args.get('sort') or None,
+        'descending': args.get('order') == 'desc',
+        'offset': (page - 1) * per_page,
+        'limit': per_page,
+    }
+    return page, per_page, query
+
+
 @exp_pages.route('/exp_cards')
 @exp_pages.route('/exp_pages')
 @exp_pages.route('/exp_pages/<string:project>', defaults={'experiment': None})
@@ -55,33 +88,76 @@ def show_exp_cards(project: str = None, experiment: str = None):
             return "Sorry. No projects found."
         else:
             prj = all_projects[0]
+    else:
+        prj = project
 
     if experiment is None:
         all_experiments = warehouse.get_name_experiments(prj)
+    else:
+        all_experiments = [experiment]
 
+    # only one page of runs of each experiment is rendered
+    page, per_page, query = _get_run_query()
     exp_run_list = []
     for exp in all_experiments:
+        total, runs = warehouse.query_runs(prj, exp, **query)
         exp_dict = {
             'name': exp,
             'description': warehouse.get_parameter(prj, exp, 'description'),
+            'total': total,
+            'page': page,
+            'n_pages': max(-(-total // per_page), 1),
         }
-        setup_files = warehouse.get_all_setup(prj, exp)
         per_dict_list = [{
             'project': prj,
             'experiment': exp,
-            'run': os.path.basename(os.path.dirname(filepath))
-        } for filepath in setup_files]
-        run_setup_list = [parse_yaml(filepath) for filepath in setup_files]
-        run_table_list=enumerate(zip(per_dict_list, run_setup_list))
+            'run': setup['run'],
+        } for setup in runs]
+        run_table_list = enumerate(zip(per_dict_list, runs),
+                                   start=query['offset'])
         exp_run_list.append((exp_dict, run_table_list))
 
     return render_template(
         'exp_cards.html',
         project=prj,
         exp_run_list=exp_run_list,
+        query_args={
+            key: val
+            for key, val in request.args.items()
+            if key not in ('page', ) + _ROUTE_ARGS
+        },
+        sort_by=query['sort_by'],
+        descending=query['descending'],
     )
 
 
+@exp_pages.route('/api/runs/<string:project>/<string:experiment>')
+def list_runs(project: str, experiment: str):
+    """Return a page of runs of experiment with their setup as JSON, see
+    `_get_run_query` for arguments."""
+    if (project not in warehouse.get_name_projects()
+            or experiment not in warehouse.get_name_experiments(project)):
+        return jsonify({'error': 'experiment not found'}), 404
+    page, per_page, query = _get_run_query()
+    total, runs = warehouse.query_runs(project, experiment, **query)
+    for setup in runs:
+        setup['url'] = url_for(
+            '.individual_page',
+            project=project,
+            experiment=experiment,
+            run=setup['run'],
+        )
+    return jsonify({
+        'project': project,
+        'experiment': experiment,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'n_pages': max(-(-total // per_page), 1),
+        'runs': runs,
+    })
+
+
 @exp_pages.route(
     '/exp_pages/<string:experiment>/<string:run>',
     defaults={'project': None},
@@ -123,7 +199,7 @@ def individual_page(project: str, experiment: str, run: str):
             if key not in ('csrf_token', 'submit', 'custom_params'):
                 key = key.lower().replace(' ', '_')
                 exp_setup[key] = to_basic_type(value)
-        dump_yaml(exp_setup, setup_file)
+        warehouse.set_setup(project, experiment, run, exp_setup)
         return redirect(url_for('.individual_page', **prj_exp_run))
 
     if (layouts_checkbox.generate.data
@@ -0,0 +1,166 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import glob
+import threading
+
+import numpy as np
+
+from sasdash.saslib import sasio
+from sasdash.cache import ProfileDiskCache, MemoryCache, ImageStore
+from sasdash.cache import cache_path
+
+
+def _write_dat(filepath, scale=1.0):
+    q = np.linspace(0.01, 0.3, 50)
+    with open(filepath, 'w') as fstream:
+        for row in zip(q, scale * np.exp(-q), 0.01 * np.ones_like(q)):
+            fstream.write('{:.8E}   {:.8E}   {:.8E}\n'.format(*row))
+
+
+def _counting_loader(calls):
+    def loader(filepath):
+        calls.append(os.path.basename(filepath))
+        return sasio.load_dat(filepath)
+    return loader
+
+
+def test_profile_pack_round_trip(tmp_path):
+    data_dir = tmp_path / 'Subtracted'
+    data_dir.mkdir()
+    filepaths = [str(data_dir / 'f{}.dat'.format(idx)) for idx in range(3)]
+    for idx, filepath in enumerate(filepaths):
+        _write_dat(filepath, idx + 1.0)
+
+    calls = []
+    cache = ProfileDiskCache()
+    first = cache.load(filepaths, _counting_loader(calls))
+    assert calls == ['f0.dat', 'f1.dat', 'f2.dat']
+    pack_path = cache_path(str(data_dir))
+    assert os.path.exists(pack_path + '.json')
+
+    # a new cache instance reads the pack, nothing is parsed
+    second = ProfileDiskCache().load(filepaths, _counting_loader(calls))
+    assert len(calls) == 3
+    for sasm, cached in zip(first, second):
+        for field in ('q', 'i', 'err'):
+            np.testing.assert_array_equal(getattr(cached, field),
+                                          getattr(sasm, field))
+        assert cached.parameters == sasm.parameters
+
+    # a rewritten file is parsed again, the others come from the pack
+    _write_dat(filepaths[1], 10.0)
+    stat = os.stat(filepaths[1])
+    os.utime(filepaths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = ProfileDiskCache().load(filepaths, _counting_loader(calls))
+    assert calls[3:] == ['f1.dat']
+    np.testing.assert_allclose(third[1].i, 10.0 * np.exp(-third[1].q),
+                               rtol=1e-8)
+    # only data of the current pack is kept
+    assert len(glob.glob(glob.escape(pack_path) + '.*.npy')) == 1
+
+    # chunked loading from the updated pack
+    chunks = list(ProfileDiskCache().iter_load(
+        filepaths, _counting_loader(calls), chunk_size=2, start=1))
+    assert len(calls) == 4
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    np.testing.assert_array_equal(chunks[0][0].i, third[1].i)
+
+
+def test_memory_cache_lru_eviction_by_bytes():
+    cache = MemoryCache(max_bytes=3000)
+    for key in 'abc':
+        cache.put(key, np.zeros(100))  # 800 bytes each
+    assert cache.nbytes == 2400
+    assert cache.get('a') is not None  # 'b' is least recently used now
+    cache.put('d', np.zeros(100))
+    assert 'b' not in cache and all(key in cache for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+
+    # a large value evicts as many entries as needed, oldest first
+    cache.put('e', np.zeros(200))
+    assert len(cache) == 2 and 'd' in cache and 'e' in cache
+    assert cache.nbytes == 2400
+    # values larger than the budget are not stored
+    cache.put('f', np.zeros(1000))
+    assert 'f' not in cache and cache.nbytes <= cache.max_bytes
+    # explicit sizes count instead of measured ones
+    cache.put('g', object(), nbytes=3000)
+    assert len(cache) == 1 and 'g' in cache and cache.nbytes == 3000
+
+
+def test_memory_cache_version_invalidation():
+    cache = MemoryCache()
+    cache.put(('profiles', 'run_a'), [1], version=1)
+    cache.put(('profiles', 'run_b'), [2], version=1)
+    assert cache.get(('profiles', 'run_a'), version=1) == [1]
+    # another version (e.g. new mtime of the data directory) drops it
+    assert cache.get(('profiles', 'run_a'), version=2) is None
+    assert ('profiles', 'run_a') not in cache
+    calls = []
+    value = cache.get_or_compute(('profiles', 'run_a'),
+                                 lambda: calls.append(1) or [3], version=2)
+    assert value == [3] and calls == [1]
+    assert cache.get_or_compute(('profiles', 'run_a'),
+                                lambda: calls.append(1) or [4],
+                                version=2) == [3]
+    assert calls == [1]
+
+    cache.invalidate(lambda key: key[1] == 'run_b')
+    assert ('profiles', 'run_b') not in cache
+    stats = cache.stats()
+    assert stats['invalidations'] == 2 and stats['entries'] == 1
+    cache.invalidate()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_image_store_shared_writers(tmp_path):
+    filepaths = []
+    for idx in range(40):
+        filepath = tmp_path / 'img_{:03d}.tif'.format(idx)
+        filepath.write_text(u'x')
+        filepaths.append(str(filepath))
+    base_path = cache_path(str(tmp_path))
+
+    def loader(filepath):
+        return np.full((4, 5), float(filepath[-7:-4]))
+
+    def stats_func(image):
+        return {'max': float(image.max())}
+
+    # separate stores, like stores of processes sharing the files, each
+    # with its own copy of the index
+    errors = []
+
+    def write(offset):
+        store = ImageStore(base_path, 'tag', stats_func)
+        for idx in range(len(filepaths)):
+            filepath = filepaths[(idx * 7 + offset) % len(filepaths)]
+            if store.get(filepath, loader)[0, 0] != float(filepath[-7:-4]):
+                errors.append(filepath)
+        store.flush()
+
+    writers = [threading.Thread(target=write, args=(offset, ))
+               for offset in (0, 3)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert not errors
+
+    def fail(filepath):
+        raise AssertionError('{} decoded again'.format(filepath))
+
+    store = ImageStore(base_path, 'tag', stats_func)
+    assert len(store) == 40
+    for idx, filepath in enumerate(filepaths):
+        image = store.get(filepath, fail)
+        np.testing.assert_array_equal(image, np.full((4, 5), idx))
+        assert not image.flags.writeable
+        assert store.get_stats(filepath, fail) == {'max': idx}
+
+    # a changed tag starts a new stack
+    other = ImageStore(base_path, 'other tag', stats_func)
+    assert len(other) == 0
+    assert other.get(filepaths[1], loader)[0, 0] == 1
+    assert len(glob.glob(glob.escape(base_path) + '.*.images')) == 1
@@ -0,0 +1,70 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import glob
+
+import numpy as np
+from scipy.spatial.distance import squareform
+
+from sasdash.saslib import sasio
+from sasdash.saslib.cormap import CorMapStore, calc_cormap_heatmap
+from sasdash.saslib.cormap import longest_run
+from sasdash.saslib.cormap import longest_run_pvalues, parse_datcmp_log
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'cormap')
+
+
+def _enumerate_pvalues(n):
+    """Pr(longest run >= C) by enumerating all 2**n sign patterns."""
+    signs = (np.arange(2**n)[:, None] >> np.arange(n)) & 1
+    runs = longest_run(signs - 0.5)
+    return np.array([np.mean(runs >= c) for c in range(n + 1)])
+
+
+def test_longest_run():
+    diff = np.array([[1, 2, -1, -2, -3, 4], [-1, 1, -1, 1, -1, 1]])
+    np.testing.assert_array_equal(longest_run(diff), [3, 1])
+
+
+def test_longest_run_pvalues_enumeration():
+    for n in range(1, 15):
+        np.testing.assert_allclose(longest_run_pvalues(n),
+                                   _enumerate_pvalues(n), atol=1e-12)
+
+
+def test_cormap_heatmap_datcmp_fixture():
+    """Compare with the table in datcmp output format of the fixture
+    frames (16 points each). datcmp was not available to produce it, its
+    values are computed independently by enumerating all 2**16 sign
+    patterns and printed with the precision of datcmp."""
+    with open(os.path.join(DATA_DIR, 'datcmp.txt')) as fstream:
+        pair_frames, c_values, p_values, adjp_values = parse_datcmp_log(
+            fstream.read())
+    frame_files = sorted(glob.glob(os.path.join(DATA_DIR, 'frame_*.dat')))
+    intensity = np.stack([sasio.load_dat(each).i for each in frame_files])
+    assert len(pair_frames) == len(frame_files) * (len(frame_files) - 1) // 2
+
+    heatmap = calc_cormap_heatmap(intensity, adjust='bonferroni')
+    eye_matrix = np.eye(len(frame_files))
+    np.testing.assert_array_equal(heatmap['C'], squareform(c_values))
+    np.testing.assert_allclose(heatmap['Pr(>C)'],
+                               squareform(p_values) + eye_matrix, atol=1e-6)
+    np.testing.assert_allclose(heatmap['adj Pr(>C)'],
+                               squareform(adjp_values) + eye_matrix,
+                               atol=1e-6)
+
+
+def test_cormap_store_recomputes_changed_frames():
+    rng = np.random.RandomState(0)
+    intensity = rng.normal(size=(4, 30))
+    keys = [('frame_%d.dat' % idx, 1, 240) for idx in range(4)]
+    store = CorMapStore()
+    assert store.update(intensity, keys) == 4
+    assert store.update(intensity, keys) == 0
+
+    # frame 2 rewritten in place: same name, new mtime
+    intensity[2] = rng.normal(size=30)
+    keys[2] = ('frame_2.dat', 2, 240)
+    assert store.update(intensity, keys) == 1
+    np.testing.assert_array_equal(
+        store.c_matrix, calc_cormap_heatmap(intensity)['C'])
@@ -0,0 +1,63 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+
+import numpy as np
+import pytest
+
+from sasdash.datamodel import Experiment
+
+RG, I0 = 25.0, 1000.0
+
+
+def _write_dat(filepath, q, intensity, err):
+    with open(filepath, 'w') as fstream:
+        fstream.write('### HEADER:\n\n### DATA:\n\n')
+        for row in zip(q, intensity, err):
+            fstream.write('{:.8E}   {:.8E}   {:.8E}\n'.format(*row))
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    """Experiment with run 'run_a' of 6 subtracted frames."""
+    run_dir = tmp_path / 'run_a'
+    (run_dir / 'Subtracted').mkdir(parents=True)
+    (run_dir / 'setup.yml').write_text(u'')
+    q = np.linspace(0.005, 0.3, 150)
+    rng = np.random.RandomState(0)
+    for idx, scale in enumerate([0.2, 0.5, 1.0, 0.8, 0.4, 0.1]):
+        intensity = scale * I0 * np.exp(-(q * RG)**2 / 3.0) + 0.5
+        err = 0.01 * intensity + 0.05
+        _write_dat(str(run_dir / 'Subtracted' / 'f{:04d}.dat'.format(idx)), q,
+                   intensity + err * rng.randn(q.size), err)
+    return Experiment({'root_path': str(tmp_path)}, name='exp')
+
+
+def test_guinier_series_keys_are_file_names(experiment):
+    names = experiment.get_file_names('run_a', 'subtracted_files')
+    results = experiment.get_guinier_series('run_a')
+    assert results['keys'] == names == [
+        'f{:04d}.dat'.format(idx) for idx in range(6)]
+    np.testing.assert_allclose(results['rg'][1:5], RG, rtol=0.05)
+    # served from the store, keyed by file states
+    assert experiment.get_guinier_series('run_a')['keys'] == names
+
+
+class _RecordingPrefetcher(object):
+    def __init__(self):
+        self.keys = []
+
+    def submit(self, key, func, priority=0):
+        self.keys.append(key)
+        return True
+
+
+def test_prefetch_keys_of_experiments_sharing_run_names(experiment,
+                                                         tmp_path):
+    run_dir = tmp_path / 'run_a'
+    (run_dir / 'config.yml').write_text(u'layouts: [sasprofile]\n')
+    other = Experiment({'root_path': str(tmp_path)}, name='exp')
+    prefetcher = _RecordingPrefetcher()
+    assert experiment.prefetch(prefetcher) == 1
+    assert other.prefetch(prefetcher) == 1
+    assert len(set(prefetcher.keys)) == 2
@@ -0,0 +1,43 @@
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+from sasdash.saslib.measurement import ProfileSeries
+from sasdash.dashboard.layouts.downsample import downsample_series
+from sasdash.dashboard.layouts.downsample import downsample_curves
+
+
+def test_downsample_curves_mixed_grids():
+    x_list = [np.linspace(0.01, 0.3, 500), np.linspace(0.02, 0.5, 300)]
+    y_list = [np.exp(-x) for x in x_list]
+    err_list = [0.1 * y for y in y_list]
+    reduced = downsample_curves(x_list, y_list, err_list, budget=200)
+    assert list(reduced['frames']) == [0, 1]
+    assert reduced['envelope'] is None
+    for x, each_x, each_y, each_err in zip(x_list, reduced['x'],
+                                           reduced['y'], reduced['err']):
+        assert each_x.size == each_y.size == each_err.size <= 100
+        assert np.all(np.isin(each_x, x))
+        np.testing.assert_allclose(each_y, np.exp(-each_x))
+
+
+def test_downsample_curves_xlim_and_frames():
+    x_list = [np.linspace(0.01, 0.3, 50 + idx) for idx in range(10)]
+    y_list = [np.ones_like(x) for x in x_list]
+    reduced = downsample_curves(x_list, y_list, xlim=(0.1, 0.2),
+                                max_frames=4)
+    assert len(reduced['frames']) == len(reduced['x']) == 4
+    assert reduced['err'] is None
+    for each_x in reduced['x']:
+        # one more point kept on each side of the range
+        assert np.sum(each_x < 0.1) <= 1 and np.sum(each_x > 0.2) <= 1
+
+
+def test_downsample_series_empty():
+    series = ProfileSeries.from_sasm_list([])
+    reduced = downsample_series(series.q, series.i, series.err)
+    assert reduced['frames'].size == 0
+    assert reduced['x'] == reduced['y'] == reduced['err'] == []
+    assert reduced['envelope'] is None
+    reduced = downsample_series(np.empty(0), np.empty((3, 0)))
+    assert reduced['frames'].size == 0 and reduced['err'] is None
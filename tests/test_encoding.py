@@ -0,0 +1,76 @@
+from __future__ import print_function, division, absolute_import
+
+import json
+import base64
+
+import numpy as np
+import pytest
+
+from sasdash.dashboard.layouts import encoding
+
+
+def _to_json(figure):
+    # numpy arrays are sent as lists, as by the JSON encoder of Dash
+    return json.loads(json.dumps(
+        figure, default=lambda obj: obj.tolist()))
+
+
+def _figure():
+    x = np.linspace(0.01, 0.3, 100)
+    return {
+        'data': [{
+            'x': x,
+            'y': np.exp(-x),
+            'type': 'line',
+            'name': 'frame_0.dat',
+        }, {
+            'z': np.arange(12, dtype=float).reshape(3, 4),
+            'type': 'heatmap',
+        }],
+        'layout': {'height': 500},
+    }
+
+
+@pytest.fixture
+def plotlyjs_version(monkeypatch):
+    def set_version(version, enabled=True):
+        monkeypatch.setattr(encoding, 'BINARY_ARRAYS', enabled)
+        monkeypatch.setattr(encoding, 'get_plotlyjs_version',
+                            lambda: version)
+    return set_version
+
+
+def test_plain_lists_by_default():
+    assert not encoding.BINARY_ARRAYS
+    figure = _to_json(encoding.encode_figure(_figure()))
+    line, heatmap = figure['data']
+    assert isinstance(line['x'], list) and len(line['x']) == 100
+    assert heatmap['z'][2] == [8.0, 9.0, 10.0, 11.0]
+    assert figure['layout'] == {'height': 500}
+
+
+def test_plain_lists_with_old_plotlyjs(plotlyjs_version):
+    plotlyjs_version((1, 58))
+    assert not encoding.binary_arrays_enabled()
+    figure = _to_json(encoding.encode_figure(_figure()))
+    assert isinstance(figure['data'][0]['y'], list)
+
+
+def test_typed_arrays(plotlyjs_version):
+    plotlyjs_version((2, 35))
+    assert encoding.binary_arrays_enabled()
+    figure = _to_json(encoding.encode_figure(_figure()))
+    line, heatmap = figure['data']
+    assert set(line['x']) == {'dtype', 'bdata', 'shape'}
+    assert line['x']['dtype'] == 'f4' and line['x']['shape'] == '100'
+    decoded = np.frombuffer(base64.b64decode(line['y']['bdata']), '<f4')
+    np.testing.assert_allclose(decoded, np.exp(-np.linspace(0.01, 0.3, 100)),
+                               rtol=1e-6)
+    assert line['name'] == 'frame_0.dat'
+    # small arrays are kept as lists
+    assert heatmap['z'][0] == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_typed_arrays_need_opt_in(plotlyjs_version):
+    plotlyjs_version((2, 35), enabled=False)
+    assert not encoding.binary_arrays_enabled()
@@ -0,0 +1,48 @@
+from __future__ import print_function, division, absolute_import
+
+import json
+
+from sasdash.dashboard.layouts import figure_cache
+
+
+class _FakeWarehouse(object):
+    def __init__(self):
+        self.run_version = (1, 1, 1)
+        self.states = [('f0.dat', 10, 100), ('f1.dat', 10, 100)]
+
+    def get_run_version(self, project, experiment, run):
+        return self.run_version
+
+    def get_file_states(self, project, experiment, run, file_type):
+        assert file_type == 'subtracted_files'
+        return list(self.states)
+
+
+def test_memoize_figure_versions(monkeypatch):
+    fake = _FakeWarehouse()
+    monkeypatch.setattr(figure_cache, 'warehouse', fake)
+    figure_cache.clear_figure_cache()
+    calls = []
+
+    @figure_cache.memoize_figure
+    def callback(value, info_json):
+        calls.append(value)
+        return {'data': [value]}
+
+    info = json.dumps({'project': 'p', 'experiment': 'e', 'run': 'r'})
+    assert callback(1, info) == {'data': [1]}
+    callback(1, info)
+    assert calls == [1]
+    callback(2, info)
+    assert calls == [1, 2]
+
+    # frame rewritten in place: directory mtimes stay the same
+    fake.states[1] = ('f1.dat', 20, 100)
+    callback(1, info)
+    assert calls == [1, 2, 1]
+    callback(1, info)
+    assert calls == [1, 2, 1]
+
+    fake.run_version = (2, 1, 1)
+    callback(1, info)
+    assert calls == [1, 2, 1, 1]
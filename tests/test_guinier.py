@@ -0,0 +1,161 @@
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+from sasdash.saslib.guinier import fit_guinier, autorg
+from sasdash.saslib.guinier import DEFAULT_QRG_MAX, GuinierSeries
+
+RG, I0 = 25.0, 1000.0
+
+
+def _guinier_profile(q, noise=0.01, seed=0):
+    intensity = I0 * np.exp(-(q * RG)**2 / 3.0)
+    err = noise * intensity + 0.05
+    rng = np.random.RandomState(seed)
+    return intensity + err * rng.randn(q.size), err
+
+
+def _polyfit(q, intensity, err):
+    (k, b), cov = np.polyfit(q**2, np.log(intensity), 1, w=intensity / err,
+                             cov='unscaled')
+    rg = np.sqrt(-3.0 * k)
+    return {
+        'rg': rg,
+        'rg_err': 1.5 / rg * np.sqrt(cov[0, 0]),
+        'i0': np.exp(b),
+        'i0_err': np.exp(b) * np.sqrt(cov[1, 1]),
+    }
+
+
+def test_fit_guinier_matches_polyfit():
+    q = np.linspace(0.005, 1.3 / RG, 40)
+    intensity, err = _guinier_profile(q)
+    result = fit_guinier(q, intensity, err, 3, 35)
+    expected = _polyfit(q[3:35], intensity[3:35], err[3:35])
+    for key, val in expected.items():
+        np.testing.assert_allclose(result[key], val, rtol=1e-8)
+    assert result['n_points'] == 32
+    np.testing.assert_allclose(result['rg'], RG, rtol=0.02)
+    np.testing.assert_allclose(result['qrg_max'], q[34] * result['rg'])
+
+
+def test_fit_guinier_many_profiles_and_ranges():
+    q = np.linspace(0.005, 1.3 / RG, 40)
+    profiles = [_guinier_profile(q, seed=seed) for seed in range(3)]
+    intensity = np.stack([each[0] for each in profiles])
+    err = np.stack([each[1] for each in profiles])
+    result = fit_guinier(q, intensity, err, [0, 5, 10], [20, 30, 40])
+    for idx, (start, stop) in enumerate([(0, 20), (5, 30), (10, 40)]):
+        expected = _polyfit(q[start:stop], intensity[idx, start:stop],
+                            err[idx, start:stop])
+        for key, val in expected.items():
+            np.testing.assert_allclose(result[key][idx], val, rtol=1e-8)
+
+
+def test_fit_guinier_degenerate():
+    q = np.linspace(0.005, 1.3 / RG, 40)
+    intensity, err = _guinier_profile(q)
+    # a single point does not define a line
+    assert np.isnan(fit_guinier(q, intensity, err, 5, 6)['rg'])
+
+    # non-positive intensities are left out of the fit
+    bad = intensity.copy()
+    bad[[4, 7, 9]] = [0.0, -1.0, np.nan]
+    valid = np.isfinite(bad) & (bad > 0)
+    result = fit_guinier(q, bad, err)
+    expected = _polyfit(q[valid], bad[valid], err[valid])
+    for key, val in expected.items():
+        np.testing.assert_allclose(result[key], val, rtol=1e-8)
+    assert result['n_points'] == 37
+
+    # only one valid point left
+    bad = np.full_like(intensity, -1.0)
+    bad[3] = 10.0
+    result = fit_guinier(q, bad, err)
+    assert np.isnan(result['rg']) and np.isnan(result['i0'])
+
+
+def _upturn_profile():
+    """Guinier profile with aggregates upturning the first points and a
+    rising background beyond the Guinier range."""
+    q = np.linspace(0.004, 0.3, 300)
+    intensity = (I0 * np.exp(-(q * RG)**2 / 3.0)
+                 + 1e5 * np.exp(-(q * 800.0)**2 / 3.0)
+                 + 5.0 * (q / 0.05)**4)
+    err = 0.01 * intensity + 0.05
+    rng = np.random.RandomState(0)
+    return q, intensity + err * rng.randn(q.size), err
+
+
+def test_autorg_skips_upturns():
+    q, intensity, err = _upturn_profile()
+    result = autorg(q, intensity, err)
+    np.testing.assert_allclose(result['rg'], RG, rtol=0.02)
+    np.testing.assert_allclose(result['i0'], I0, rtol=0.02)
+    # aggregates add more than 10 % to the first two points
+    assert result['qmin_idx'] >= 2
+    assert result['qrg_max'] < DEFAULT_QRG_MAX
+    assert q[result['qmax_idx'] - 1] * RG < DEFAULT_QRG_MAX
+    fit = fit_guinier(q, intensity, err, result['qmin_idx'],
+                      result['qmax_idx'])
+    for key in ('rg', 'rg_err', 'i0', 'i0_err', 'qrg_min', 'qrg_max'):
+        np.testing.assert_allclose(result[key], fit[key], rtol=1e-10)
+
+
+def test_autorg_max_points():
+    q, intensity, err = _upturn_profile()
+    # as limited by the q range slider of the Guinier page
+    result = autorg(q, intensity, err, max_points=30)
+    assert result['qmax_idx'] <= 30
+    np.testing.assert_allclose(result['rg'], RG, rtol=0.05)
+    assert autorg(q, intensity, err, max_points=9) is None
+
+
+def _elution(n_frames=12):
+    """Frames of a SEC-SAXS peak of constant Rg."""
+    q = np.linspace(0.005, 0.3, 200)
+    scale = np.exp(-0.5 * ((np.arange(n_frames) - 7.0) / 2.5)**2) + 0.05
+    rng = np.random.RandomState(1)
+    intensity = (scale[:, None] * I0 * np.exp(-(q * RG)**2 / 3.0)
+                 + 0.5)
+    err = 0.01 * intensity + 0.05
+    return q, intensity + err * rng.randn(*intensity.shape), err
+
+
+def _assert_same_results(results, expected):
+    assert results['keys'] == expected['keys']
+    assert results['q_range'] == expected['q_range']
+    for key in ('rg', 'rg_err', 'i0', 'i0_err', 'r_squared',
+                'total_intensity'):
+        np.testing.assert_allclose(results[key], expected[key],
+                                   rtol=1e-10)
+
+
+def test_guinier_series_append_matches_refit():
+    q, intensity, err = _elution()
+    names = ['frame_{:02d}.dat'.format(idx) for idx in range(len(intensity))]
+    expected = GuinierSeries()
+    expected.update(q, intensity, err, names)
+    expected = expected.get_results()
+    assert expected['q_range'] is not None
+
+    # frames arriving one by one, the strongest one (and the range) last
+    # changes at frame 7
+    series = GuinierSeries()
+    for idx in range(len(intensity)):
+        base = series
+        series = series.copy()
+        n_new = series.update(q, intensity[idx], err[idx],
+                              names[idx:idx + 1])
+        assert n_new == 1
+        assert len(base) == idx
+    _assert_same_results(series.get_results(), expected)
+    np.testing.assert_allclose(series.get_results()['rg'][4:10], RG,
+                               rtol=0.05)
+
+    # fixed range, appended in chunks
+    fixed = GuinierSeries(*expected['q_range'])
+    for start in range(0, len(intensity), 5):
+        fixed.update(q, intensity[start:start + 5], err[start:start + 5],
+                     names[start:start + 5])
+    _assert_same_results(fixed.get_results(), expected)
@@ -0,0 +1,26 @@
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import pytest
+
+from sasdash.saslib.image import RadialIntegrator, AzimuthalIntegrator
+
+
+@pytest.mark.parametrize('mask_scale', [None, 1.0, 0.5])
+def test_integrate_stack_matches_integrate(mask_scale):
+    rng = np.random.RandomState(0)
+    shape = (40, 60)
+    mask = None
+    if mask_scale is not None:
+        mask = (rng.rand(*shape) > 0.2) * mask_scale
+    integrator = RadialIntegrator(shape, (10, 25), mask)
+    imgs = rng.rand(5, *shape)
+    np.testing.assert_allclose(
+        integrator.integrate_stack(imgs),
+        np.stack([integrator.integrate(img) for img in imgs]))
+
+
+def test_azimuthal_integrator_requires_geometry():
+    with pytest.raises(ValueError):
+        AzimuthalIntegrator((40, 60), (10, 25), sample_distance=1500.0,
+                            wavelength=1.0)
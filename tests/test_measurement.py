@@ -0,0 +1,44 @@
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import pytest
+
+from sasdash.saslib.measurement import SASM, ProfileSeries
+from sasdash.saslib.measurement import DataNotCompatible
+
+
+def _sasm(q, scale=1.0, filename=None):
+    q = np.asarray(q, dtype=float)
+    return SASM(q, scale * np.exp(-q), 0.1 * np.ones_like(q),
+                filename=filename)
+
+
+def test_from_sasm_list_stacks_profiles():
+    q = np.linspace(0.01, 0.3, 50)
+    sasm_list = [_sasm(q, scale, 'frame_%d.dat' % idx)
+                 for idx, scale in enumerate((1.0, 2.0, 3.0))]
+    series = ProfileSeries.from_sasm_list(sasm_list)
+    assert series.n_frames == 3
+    assert series.n_q == 50
+    np.testing.assert_array_equal(series.q, q)
+    np.testing.assert_allclose(series.i[2], 3.0 * np.exp(-q))
+    assert series.filenames == ['frame_0.dat', 'frame_1.dat', 'frame_2.dat']
+
+
+def test_from_sasm_list_mixed_length_raises():
+    sasm_list = [_sasm(np.linspace(0.01, 0.3, 50)),
+                 _sasm(np.linspace(0.01, 0.3, 40))]
+    with pytest.raises(DataNotCompatible):
+        ProfileSeries.from_sasm_list(sasm_list)
+
+
+def test_from_sasm_list_mixed_values_raises():
+    sasm_list = [_sasm(np.linspace(0.01, 0.3, 50)),
+                 _sasm(np.linspace(0.02, 0.31, 50))]
+    with pytest.raises(DataNotCompatible):
+        ProfileSeries.from_sasm_list(sasm_list)
+
+
+def test_from_sasm_list_empty():
+    series = ProfileSeries.from_sasm_list([])
+    assert series.n_frames == 0
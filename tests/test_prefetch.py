@@ -0,0 +1,38 @@
+from __future__ import print_function, division, absolute_import
+
+import threading
+
+from sasdash.prefetch import Prefetcher
+
+
+def test_prefetcher_dedupe_and_priority():
+    prefetcher = Prefetcher(max_workers=1, max_queue_size=4)
+    started, release = threading.Event(), threading.Event()
+    done = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    # keep the only worker busy while tasks are queued
+    assert prefetcher.submit('block', block)
+    assert started.wait(5)
+    assert prefetcher.submit('low', lambda: done.append('low'), priority=2)
+    assert prefetcher.submit('high', lambda: done.append('high'), priority=0)
+    assert prefetcher.submit('mid-1', lambda: done.append('mid-1'), 1)
+    # pending key is not queued again
+    assert prefetcher.submit('low', lambda: done.append('low again'), 0)
+    assert prefetcher.submit('mid-2', lambda: done.append('mid-2'), 1)
+    # queue is full
+    assert not prefetcher.submit('dropped', lambda: done.append('dropped'))
+    release.set()
+    prefetcher.join()
+
+    assert done == ['high', 'mid-1', 'mid-2', 'low']
+    stats = prefetcher.stats()
+    assert stats == {'submitted': 5, 'dropped': 1, 'done': 5, 'failed': 0,
+                     'pending': 0}
+    # done keys can be queued again
+    assert prefetcher.submit('low', lambda: done.append('low'))
+    prefetcher.join()
+    assert done[-1] == 'low'
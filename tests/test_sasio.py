@@ -0,0 +1,145 @@
+from __future__ import print_function, division, absolute_import
+
+import os
+import re
+
+import numpy as np
+import pytest
+
+from sasdash.saslib import sasio
+
+_HEADER = 'sample buffer subtracted\n  q  I(q)  Error\n'
+_ROWS = ''.join(
+    '{:.6e} {:.6e} {:.6e}\n'.format(q, 100.0 * np.exp(-q), 0.1 * q)
+    for q in np.linspace(0.01, 0.3, 20))
+
+
+def _check_dat(tmp_path, text, n_points=None):
+    filepath = tmp_path / 'profile.dat'
+    filepath.write_bytes(text.encode('utf-8'))
+    sasm = sasio.load_dat(str(filepath))
+    q, i, err = sasio._load_dat_lines(str(filepath))
+    np.testing.assert_array_equal(sasm.q, q)
+    np.testing.assert_array_equal(sasm.i, i)
+    np.testing.assert_array_equal(sasm.err, err)
+    if n_points is not None:
+        assert len(sasm.q) == n_points
+    return sasm
+
+
+def test_load_dat_with_header(tmp_path):
+    _check_dat(tmp_path, _HEADER + _ROWS + '\n# footer\n', 20)
+
+
+def test_load_dat_without_header(tmp_path):
+    _check_dat(tmp_path, _ROWS, 20)
+    _check_dat(tmp_path, _ROWS.rstrip('\n'), 20)
+
+
+@pytest.mark.parametrize('inserted', ['\n', '# comment\n', '  \n'])
+def test_load_dat_line_inside_block(tmp_path, inserted):
+    rows = _ROWS.splitlines(True)
+    _check_dat(tmp_path, _HEADER + ''.join(rows[:5] + [inserted] + rows[5:]),
+               20)
+
+
+def test_load_dat_ragged_rows(tmp_path):
+    rows = _ROWS.splitlines(True)
+    # 4 + 2 fields as many as 3 + 3, only the field count of rows tells
+    ragged = ['1.000000e-02 9.900000e+00 3.000000e-02 5.000000e+00\n',
+              '2.000000e-02 8.000000e+00\n']
+    sasm = _check_dat(tmp_path, _HEADER + ''.join(rows[:3] + ragged + rows[3:]),
+                      21)
+    assert 9.9 in sasm.i and 8.0 not in sasm.i
+    # a short row only
+    _check_dat(tmp_path, ''.join(rows[:3] + ragged[1:] + rows[3:]), 20)
+
+
+def test_load_dat_crlf(tmp_path):
+    _check_dat(tmp_path, (_HEADER + _ROWS).replace('\n', '\r\n'), 20)
+
+
+@pytest.mark.parametrize('text', ['', '\n', _HEADER])
+def test_load_dat_empty(tmp_path, text):
+    _check_dat(tmp_path, text, 0)
+
+
+GNOM_OUT = os.path.join(os.path.dirname(__file__), 'data', 'gnom',
+                        'sphere.out')
+
+# line patterns of the former regex parser, each line is tried against all
+_TWO_COL = re.compile(r'\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s*$')
+_THREE_COL = re.compile(r'\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s*$')
+_FIVE_COL = re.compile(r'\s*\d*[.]\d*[+eE-]*\d+\s+-?\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s+\d*[.]\d*[+eE-]*\d+\s*$')
+
+
+def _load_out_regex(filepath):
+    """Reference: the regex parser `load_out` replaced."""
+    qfull, qshort, jexp, jerr, jreg, ireg = [], [], [], [], [], []
+    r, pr, perr = [], [], []
+    results = {}
+    with open(filepath) as fstream:
+        for line in fstream:
+            if _TWO_COL.match(line):
+                found = [float(val) for val in line.split()]
+                qfull.append(found[0])
+                ireg.append(found[1])
+            elif _THREE_COL.match(line):
+                found = [float(val) for val in line.split()]
+                r.append(found[0])
+                pr.append(found[1])
+                perr.append(found[2])
+            elif _FIVE_COL.match(line):
+                found = [float(val) for val in line.split()]
+                qfull.append(found[0])
+                qshort.append(found[0])
+                jexp.append(found[1])
+                jerr.append(found[2])
+                jreg.append(found[3])
+                ireg.append(found[4])
+            else:
+                sasio._parse_out_results(line, results)
+    return {
+        'r': r, 'pr': pr, 'error': perr, 'q_orig': qshort, 'i_orig': jexp,
+        'err_orig': jerr, 'i_fit': jreg, 'q_extrap': qfull,
+        'i_extrap': ireg,
+    }, results
+
+
+def test_load_out_matches_regex_parser():
+    iftm = sasio.load_out(GNOM_OUT)
+    arrays, results = _load_out_regex(GNOM_OUT)
+    for name, expected in arrays.items():
+        assert len(expected) > 0
+        np.testing.assert_array_equal(getattr(iftm, name), expected)
+    for key in ('TE', 'quality', 'rg', 'rger', 'i0', 'i0er', 'q_rg', 'q_i0',
+                'chisq', 'oscil', 'stabil', 'sysdev', 'positv', 'valcen',
+                'smooth'):
+        assert iftm.get_parameter(key) == results[key]
+    assert (iftm.get_parameter('rg'), iftm.get_parameter('i0')) == (15.47,
+                                                                     5810.0)
+    assert (iftm.get_parameter('q_rg'), iftm.get_parameter('q_i0')) == (
+        15.49, 5812.0)
+    assert iftm.get_parameter('TE') == 0.893
+    assert iftm.get_parameter('quality') == 'AN EXCELLENT  solution'
+    assert iftm.get_parameter('dmax') == 40.0
+
+
+def test_load_out_raw_and_missing_sections(tmp_path):
+    assert sasio.load_out(GNOM_OUT).get_parameter('out') is None
+    with open(GNOM_OUT) as fstream:
+        lines = fstream.readlines()
+    assert sasio.load_out(GNOM_OUT, keep_raw=True).get_parameter(
+        'out') == lines
+
+    # only the P(r) block, e.g. a truncated file
+    start = next(idx for idx, line in enumerate(lines)
+                 if 'P(R)' in line)
+    filepath = tmp_path / 'pr_only.out'
+    filepath.write_text(u''.join(lines[start:]))
+    iftm = sasio.load_out(str(filepath))
+    for key in ('TE', 'quality', 'rg', 'rger', 'i0', 'i0er', 'q_rg', 'q_i0',
+                'chisq', 'smooth'):
+        assert iftm.get_parameter(key) is None
+    assert iftm.q_orig.size == iftm.q_extrap.size == 0
+    assert iftm.r.size == 31 and iftm.get_parameter('dmax') == 40.0